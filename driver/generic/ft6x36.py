@@ -17,6 +17,11 @@
 # The number of presses is in touch.presses, touch.points[0] and points[1]
 # hold the positions. LVGL is not (yet) multi-touch, so all it sees is the
 # position in points[0].
+#
+# If the INT pin of the FT6X36 is connected, pass it as irq, so a touch and
+# its release wake the lv_utils event loop (running or started later) to read
+# them right away. With lv.INDEV_MODE.EVENT, LVGL reads the touch only then,
+# so a moving touch isn't followed.
 
 
 import lvgl as lv
@@ -25,7 +30,7 @@ from machine import I2C, Pin
 class ft6x36:
 
     def __init__(self, i2c_dev=0, sda=21, scl=22, freq=400000, addr=0x38, width=-1, height=-1, 
-                 inv_x=False, inv_y=False, swap_xy=False):
+                 inv_x=False, inv_y=False, swap_xy=False, irq=None):
 
         if not lv.is_initialized():
             lv.init()
@@ -51,6 +56,11 @@ class ft6x36:
         self.indev_drv.set_type(lv.INDEV_TYPE.POINTER)
         self.indev_drv.set_read_cb(self.callback)
 
+        if irq is not None:
+            import lv_utils
+            lv_utils.event_loop.connect_wake_pin(Pin(irq, Pin.IN), self.indev_drv,
+                                                 Pin.IRQ_FALLING | Pin.IRQ_RISING)
+
     def callback(self, driver, data):
 
         def get_point(offset):
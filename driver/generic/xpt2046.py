@@ -102,11 +102,12 @@ class Xpt2046(Xpt2046_hw):
         # switch SPI back to spiRate
         if self.spiRate: self.spi.init(baudrate=self.spiRate)
 
-    def __init__(self,spi,spiRate=24_000_000,spiPrereadCb=None,**kw):
+    def __init__(self,spi,spiRate=24_000_000,spiPrereadCb=None,irq=None,**kw):
         '''XPT2046 touchscreen driver for LVGL; cf. documentation of :obj:`Xpt2046_hw` for the meaning of parameters being passed.
 
         *spiPrereadCb*: call this before reading from SPI; used to block until DMA transfer is complete (when sharing SPI bus).
         *spiRate*: the SPI bus must set to low frequency (1MHz) when reading from the XPT2046; when *spiRate* is given, the bus will be switched back to this frequency when XPT2046 is done reading. The default 24MHz targets St77xx display chips which operate at that frequency and come often with XPT2046-based touchscreen.
+        *irq*: PENIRQ pin (GPIO number or machine.Pin instance); when given, a touch and its release wake the lv_utils event loop (running or started later) so they're read right away. In the default lv.INDEV_MODE.TIMER, LVGL also polls the touch; with lv.INDEV_MODE.EVENT it's only read on these wakes, so a moving touch isn't followed.
         '''
         super().__init__(spi=spi,**kw)
         self.spiRate=spiRate
@@ -118,3 +119,8 @@ class Xpt2046(Xpt2046_hw):
         self.indev_drv = lv.indev_create()
         self.indev_drv.set_type(lv.INDEV_TYPE.POINTER)
         self.indev_drv.set_read_cb(self.indev_drv_read_cb)
+
+        if irq is not None:
+            import lv_utils
+            irq=(machine.Pin(irq,machine.Pin.IN) if isinstance(irq,int) else irq)
+            lv_utils.event_loop.connect_wake_pin(irq,self.indev_drv,machine.Pin.IRQ_FALLING|machine.Pin.IRQ_RISING)
@@ -1,8 +1,12 @@
 # LVGL indev driver for evdev mouse device
 # (for the unix micropython port)
+#
+# With asynchronous=True, the device is read by an asyncio task, which wakes
+# the lv_utils event loop (if it's running) so the input is handled right away.
 
 import ustruct
 import select
+import array
 import lvgl as lv
 
 # Default crosshair cursor
@@ -19,11 +23,17 @@ class crosshair_cursor:
         self.cursor_hor.add_style(self.cursor_style, lv.PART.MAIN)
         self.cursor_ver = lv.line(self.scr)
         self.cursor_ver.add_style(self.cursor_style, lv.PART.MAIN)
+        # Packed lv_point_precise_t arrays (x, y, x, y; int32 without LV_USE_FLOAT), updated in place.
+        # The lines keep pointers to them, so they must stay referenced
+        self.points_hor = array.array('i', [0, 0, self.hor_res, 0])
+        self.points_ver = array.array('i', [0, 0, 0, self.ver_res])
 
     def __call__(self, data):
         # print("%d : %d:%d" % (data.state, data.point.x, data.point.y))
-        self.cursor_hor.set_points([{'x':0,'y':data.point.y},{'x':self.hor_res,'y':data.point.y}],2)
-        self.cursor_ver.set_points([{'y':0,'x':data.point.x},{'y':self.ver_res,'x':data.point.x}],2)
+        self.points_hor[1] = self.points_hor[3] = data.point.y
+        self.points_ver[0] = self.points_ver[2] = data.point.x
+        self.cursor_hor.set_points(self.points_hor, 2)
+        self.cursor_ver.set_points(self.points_ver, 2)
 
     def delete(self):
         self.cursor_hor.delete()
@@ -31,12 +41,13 @@ class crosshair_cursor:
 
 # evdev driver for mouse
 class mouse_indev:
-    def __init__(self, scr=None, cursor=None, device='/dev/input/mice'):
+    def __init__(self, scr=None, cursor=None, device='/dev/input/mice', asynchronous=False):
 
         # Open evdev and initialize members
         self.evdev = open(device, 'rb')
         self.poll = select.poll()
         self.poll.register(self.evdev.fileno())
+        self.packets = [] if asynchronous else None
         self.scr = scr if scr else lv.scr_act()
         self.cursor = cursor if cursor else crosshair_cursor(self.scr)
         self.hor_res = self.scr.get_width()
@@ -47,14 +58,35 @@ class mouse_indev:
         self.indev.set_type(lv.INDEV_TYPE.POINTER)
         self.indev.set_read_cb(self.mouse_read)
 
+        if asynchronous:
+            import asyncio
+            self.reader = asyncio.create_task(self.async_read())
+
+    async def async_read(self):
+        import asyncio
+        import lv_utils
+        stream = asyncio.StreamReader(self.evdev)
+        while True:
+            self.packets.append(await stream.readexactly(3))
+            if lv_utils.event_loop.is_running():
+                lv_utils.event_loop.current_instance().wake(self.indev)
+
     def mouse_read(self, indev, data) -> int:
         
-        # Check if there is input to be read from evdev
-        if not self.poll.poll()[0][1] & select.POLLIN:
-            return 0
+        if self.packets is None:
+            # Check if there is input to be read from evdev
+            if not self.poll.poll()[0][1] & select.POLLIN:
+                return 0
+            packet = self.evdev.read(3)
+        else:
+            # Take the packets read by async_read, one per call
+            if not self.packets:
+                return 0
+            packet = self.packets.pop(0)
+            data.continue_reading = len(self.packets) > 0
 
         # Read and parse evdev mouse data
-        mouse_data = ustruct.unpack('bbb',self.evdev.read(3))
+        mouse_data = ustruct.unpack('bbb',packet)
 
         # Data is relative, update coordinates
         data.point.x += mouse_data[1]
@@ -74,6 +106,8 @@ class mouse_indev:
         return 0
 
     def delete(self):
+        if self.packets is not None:
+            self.reader.cancel()
         self.evdev.close()
         if self.cursor and hasattr(self.cursor, 'delete'):
             self.cursor.delete()
@@ -10,13 +10,19 @@
 from __future__ import print_function
 import collections
 import sys
-import copy
-from functools import lru_cache
+from functools import lru_cache, wraps
 import json
 import os
+import hashlib
+import pickle
+import io
+import zlib
+import time
+import tracemalloc
 
 
 def memoize(func):
+    @wraps(func)
     @lru_cache(maxsize=1000000)
     def memoized(*args, **kwargs):
         return func(*args, **kwargs)
@@ -24,6 +30,75 @@ def memoize(func):
     return memoized
 
 
+# A hashable key of the structure of a C AST, equal for equal ASTs wherever they come from.
+# AST nodes are only equal to themselves, so memoize misses on copies and on equal types that
+# are declared more than once. Without declnames, the declared names are left out of the key.
+
+
+def type_key(ast, declnames=True):
+    if isinstance(ast, (list, tuple)):
+        return tuple(type_key(item, declnames) for item in ast)
+    if not isinstance(ast, c_ast.Node):
+        return ast
+    attrs = tuple(
+        type_key(getattr(ast, attr), declnames)
+        for attr in ast.attr_names
+        if declnames
+        or not (attr == "declname" or (attr == "name" and isinstance(ast, c_ast.Decl)))
+    )
+    children = tuple(
+        (name, type_key(child, declnames)) for name, child in ast.children()
+    )
+    return (type(ast).__name__, attrs, children)
+
+
+# The structural keys of the AST nodes passed to memoize_types and function_prototype, by node id.
+# Each entry holds its node, so the id can't be reused while it is cached. Copies made by
+# the generator are looked up only once, so the oldest entries are dropped past a bound
+
+
+ast_type_keys = {True: collections.OrderedDict(), False: collections.OrderedDict()}
+ast_type_keys_size = 1024
+
+
+def cached_type_key(ast, declnames=True):
+    if not isinstance(ast, c_ast.Node):
+        return type_key(ast, declnames)
+    keys = ast_type_keys[declnames]
+    entry = keys.get(id(ast))
+    if entry is not None:
+        return entry[1]
+    key = type_key(ast, declnames)
+    keys[id(ast)] = (ast, key)
+    if len(keys) > ast_type_keys_size:
+        keys.popitem(last=False)
+    return key
+
+
+# Like memoize, but AST arguments are looked up by their structure.
+# Results are shared by equal arguments, so they must not be changed by the callers
+
+
+def memoize_types(func, maxsize=1000000):
+    cache = collections.OrderedDict()
+
+    @wraps(func)
+    def memoized(*args, **kwargs):
+        key = (
+            tuple(cached_type_key(arg) for arg in args),
+            tuple(sorted(kwargs.items())),
+        )
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        result = cache[key] = func(*args, **kwargs)
+        if len(cache) > maxsize:
+            cache.popitem(last=False)
+        return result
+
+    return memoized
+
+
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
@@ -35,12 +110,14 @@ from sys import argv
 from argparse import ArgumentParser
 import subprocess
 import re
+import fnmatch
 from os.path import dirname, abspath
 from os.path import commonprefix
 
 script_path = dirname(abspath(__file__))
 sys.path.insert(0, "%s/../pycparser" % script_path)
 from pycparser import c_parser, c_ast, c_generator
+from pycparser import __version__ as pycparser_version
 
 #
 # Argument parsing
@@ -103,13 +180,236 @@ argParser.add_argument(
     metavar="<MetaData File Name>",
     action="store",
 )
+argParser.add_argument(
+    "-C",
+    "--cache-dir",
+    dest="cache_dir",
+    help="Optional directory for caching the parsed ASTs of the last runs",
+    metavar="<Cache Directory>",
+    action="store",
+)
+argParser.add_argument(
+    "-S",
+    "--shards",
+    dest="shards",
+    help="Optional number of C files to split the module definitions into, for parallel compilation",
+    metavar="<Number of Shards>",
+    action="store",
+    type=int,
+)
+argParser.add_argument(
+    "-SP",
+    "--shard-prefix",
+    dest="shard_prefix",
+    help="Path prefix of the shared header, shard C files and shard manifest. Required with --shards",
+    metavar="<Shard Path Prefix>",
+    action="store",
+)
+argParser.add_argument(
+    "-R",
+    "--runtime",
+    dest="runtime",
+    help="Emit the runtime helpers into the module (embedded), or once into their own C file that several modules can share (shared)",
+    choices=["embedded", "shared"],
+    action="store",
+)
+argParser.add_argument(
+    "-RP",
+    "--runtime-prefix",
+    dest="runtime_prefix",
+    help="Path prefix of the runtime header and C file, next to the module C file. Required with --runtime=shared",
+    metavar="<Runtime Path Prefix>",
+    action="store",
+)
+argParser.add_argument(
+    "-P",
+    "--profile",
+    dest="profile",
+    help="Report time, call counts and peak memory per generation phase to stderr, and optionally save them as JSON",
+    metavar="<Profile JSON File>",
+    action="store",
+    nargs="?",
+    const="",
+)
+argParser.add_argument(
+    "-A",
+    "--allowlist",
+    dest="allowlist",
+    help="Only generate bindings used by the application. Either a JSON allowlist, or Python files (or directories) to scan for module usage",
+    metavar="<Allowlist File or Directory>",
+    action="append",
+)
+argParser.add_argument(
+    "-AR",
+    "--allowlist-report",
+    dest="allowlist_report",
+    help="Optional JSON file to save the bindings dropped by --allowlist to",
+    metavar="<Report File Name>",
+    action="store",
+)
+argParser.add_argument(
+    "--no-fast-call",
+    dest="fast_call",
+    help="Call all functions through the variable arguments entry point, instead of fixed arity entry points for functions with up to 3 arguments",
+    action="store_false",
+)
+argParser.add_argument(
+    "--reuse-callback-args",
+    dest="reuse_callback_args",
+    help="Reuse the objects for the arguments of callbacks matching this name pattern between calls, instead of creating new ones on every call, for callbacks that don't keep references to their arguments (flush_cb and read_cb by default). Can be given multiple times",
+    metavar="<Callback Name Pattern>",
+    action="append",
+)
+argParser.add_argument(
+    "--retain-callback-args",
+    dest="retain_callback_args",
+    help="Create new objects for the arguments of callbacks matching this name pattern on every call, even when they match --reuse-callback-args. Can be given multiple times",
+    metavar="<Callback Name Pattern>",
+    action="append",
+)
+argParser.add_argument(
+    "--flatten-enums",
+    dest="flatten_enums",
+    help="Also add the members of the int enums matching this name pattern to the module, as int constants named like the C constants without the prefix (EVENT_CLICKED for EVENT.CLICKED). Can be given multiple times",
+    metavar="<Enum Name Pattern>",
+    action="append",
+)
 argParser.add_argument("input", nargs="+")
-argParser.set_defaults(include=[], define=[], ep=None, json=None, input=[])
+argParser.set_defaults(
+    include=[],
+    define=[],
+    ep=None,
+    json=None,
+    cache_dir=None,
+    shards=None,
+    shard_prefix=None,
+    runtime="embedded",
+    runtime_prefix=None,
+    profile=None,
+    allowlist=None,
+    allowlist_report=None,
+    fast_call=True,
+    reuse_callback_args=["lv_display_t_flush_cb", "lv_indev_t_read_cb"],
+    retain_callback_args=[],
+    flatten_enums=[],
+    input=[],
+)
 args = argParser.parse_args()
 
+if args.shards is not None:
+    if args.shards < 1:
+        argParser.error("--shards must be a positive number")
+    if not args.shard_prefix:
+        argParser.error("--shards requires --shard-prefix")
+
+if args.runtime == "shared" and not args.runtime_prefix:
+    argParser.error("--runtime=shared requires --runtime-prefix")
+
 module_name = args.module_name
 module_prefix = args.module_prefix if args.module_prefix else args.module_name
 
+#
+# Profiling
+# Generation is split into sequential phases, each started by begin_phase.
+# Time and peak memory are measured per phase, and functions decorated with
+# "profiled" also count their calls and accumulate their time.
+# Nested (recursive) calls are counted but their time is only accumulated once.
+# Without --profile, begin_phase does nothing and functions are not wrapped.
+#
+
+profile_enabled = args.profile is not None
+profile_phases = []
+profile_functions = collections.OrderedDict()
+profile_start = time.perf_counter()
+current_phase = None
+
+
+def profiled(func, name=None):
+    if not profile_enabled:
+        return func
+    stats = profile_functions.setdefault(
+        name or func.__name__, {"calls": 0, "time": 0.0, "depth": 0}
+    )
+
+    def wrapper(*args, **kwargs):
+        stats["calls"] += 1
+        if stats["depth"]:
+            return func(*args, **kwargs)
+        stats["depth"] += 1
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats["time"] += time.perf_counter() - start
+            stats["depth"] -= 1
+
+    wrapper.__name__ = func.__name__
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def end_phase():
+    global current_phase
+    if current_phase is None:
+        return
+    current_phase["time"] = time.perf_counter() - current_phase["time"]
+    current_phase["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    profile_phases.append(current_phase)
+    current_phase = None
+
+
+def begin_phase(name):
+    global current_phase
+    if not profile_enabled:
+        return
+    end_phase()
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    current_phase = {"name": name, "time": time.perf_counter()}
+
+
+def end_profile():
+    if not profile_enabled:
+        return
+    end_phase()
+    profile = collections.OrderedDict()
+    profile["total_time"] = time.perf_counter() - profile_start
+    profile["peak_memory"] = max(phase["peak_memory"] for phase in profile_phases)
+    profile["phases"] = profile_phases
+    profile["functions"] = collections.OrderedDict(
+        (name, {"calls": stats["calls"], "time": stats["time"]})
+        for name, stats in sorted(
+            profile_functions.items(), key=lambda item: -item[1]["time"]
+        )
+    )
+    tracemalloc.stop()
+
+    eprint("%-28s %10s %14s" % ("Phase", "Time [s]", "Peak [KiB]"))
+    for phase in profile["phases"]:
+        eprint(
+            "%-28s %10.3f %14d"
+            % (phase["name"], phase["time"], phase["peak_memory"] // 1024)
+        )
+    eprint(
+        "%-28s %10.3f %14d"
+        % ("total", profile["total_time"], profile["peak_memory"] // 1024)
+    )
+    eprint()
+    eprint("%-28s %10s %14s" % ("Function", "Time [s]", "Calls"))
+    for name, stats in profile["functions"].items():
+        eprint("%-28s %10.3f %14d" % (name, stats["time"], stats["calls"]))
+
+    if args.profile:
+        with open(args.profile, "w") as profile_file:
+            json.dump(profile, profile_file, indent=4)
+
+
+if profile_enabled:
+    # Memory tracing slows down generation, so it's only enabled when profiling
+    tracemalloc.start()
+
+begin_phase("preprocess")
+
 #
 # C proceprocessing, if needed, or just read the input files.
 #
@@ -134,7 +434,26 @@ else:
 #
 
 
-@memoize
+# Copy an AST before changing it. Only the nodes and their lists are copied, the names and
+# coordinates are shared with the original, which makes it much faster than copy.deepcopy
+
+
+@profiled
+def copy_ast(ast):
+    def copy_node(node):
+        if isinstance(node, list):
+            return [copy_node(item) for item in node]
+        if not isinstance(node, c_ast.Node):
+            return node
+        new_node = object.__new__(type(node))
+        for slot in node.__slots__:
+            if slot != "__weakref__":
+                setattr(new_node, slot, copy_node(getattr(node, slot)))
+        return new_node
+
+    return copy_node(ast)
+
+
 def remove_declname(ast):
     if hasattr(ast, "declname"):
         ast.declname = None
@@ -146,7 +465,6 @@ def remove_declname(ast):
         remove_declname(child)
 
 
-@memoize
 def add_default_declname(ast, name):
     if hasattr(ast, "declname"):
         if ast.declname == None:
@@ -159,7 +477,6 @@ def add_default_declname(ast, name):
         add_default_declname(child, name)
 
 
-@memoize
 def convert_array_to_ptr(ast):
     if hasattr(ast, "type") and isinstance(ast.type, c_ast.ArrayDecl):
         ast.type = c_ast.PtrDecl(
@@ -172,7 +489,6 @@ def convert_array_to_ptr(ast):
         convert_array_to_ptr(child)
 
 
-@memoize
 def remove_quals(ast):
     if hasattr(ast, "quals"):
         ast.quals = []
@@ -188,7 +504,6 @@ def remove_quals(ast):
             remove_quals(child)
 
 
-@memoize
 def remove_explicit_struct(ast):
     if isinstance(ast, c_ast.TypeDecl) and isinstance(ast.type, c_ast.Struct):
         explicit_struct_name = ast.type.name
@@ -207,12 +522,13 @@ def remove_explicit_struct(ast):
         remove_explicit_struct(child)
 
 
-@memoize
+@profiled
+@memoize_types
 def get_type(arg, **kwargs):
     if isinstance(arg, str):
         return arg
     remove_quals_arg = "remove_quals" in kwargs and kwargs["remove_quals"]
-    arg_ast = copy.deepcopy(arg)
+    arg_ast = copy_ast(arg)
     remove_explicit_struct(arg_ast)
     if remove_quals_arg:
         remove_quals(arg_ast)
@@ -241,7 +557,6 @@ def get_name(type):
         return gen.visit(type)
 
 
-@memoize
 def remove_arg_names(ast):
     if isinstance(ast, c_ast.TypeDecl):
         ast.declname = None
@@ -255,17 +570,24 @@ def remove_arg_names(ast):
             remove_arg_names(param)
 
 
-# Create a function prototype AST from a function AST
-@memoize
+# Function prototype strings, by the structure of the function type without its names
+function_prototypes = {}
+
+
+# Create a function prototype string from a function AST
+@profiled
 def function_prototype(func):
-    bare_func = copy.deepcopy(func)
-    remove_declname(bare_func)
+    key = cached_type_key(func.type, declnames=False)
+    if key not in function_prototypes:
+        bare_func = copy_ast(func)
+        remove_declname(bare_func)
 
-    ptr_decl = c_ast.PtrDecl(quals=[], type=bare_func.type)
+        ptr_decl = c_ast.PtrDecl(quals=[], type=bare_func.type)
 
-    func_proto = c_ast.Typename(name=None, quals=[], align=[], type=ptr_decl)
+        func_proto = c_ast.Typename(name=None, quals=[], align=[], type=ptr_decl)
 
-    return func_proto
+        function_prototypes[key] = gen.visit(func_proto)
+    return function_prototypes[key]
 
 
 #
@@ -431,9 +753,102 @@ callback_metadata = collections.OrderedDict()
 
 func_prototypes = {}
 
+begin_phase("parse")
+
 parser = c_parser.CParser()
 gen = c_generator.CGenerator()
-ast = parser.parse(s, filename="<none>")
+
+#
+# Parsed AST cache.
+# The key covers everything the AST depends on: the preprocessed input, the
+# preprocessor arguments and the generator itself (this script and pycparser).
+#
+
+
+def get_generator_version():
+    with open(abspath(__file__), "rb") as f:
+        script_digest = hashlib.sha256(f.read()).hexdigest()
+    return "%s-pycparser-%s" % (script_digest, pycparser_version)
+
+
+def get_ast_cache_path(cache_dir, source):
+    key = hashlib.sha256()
+    for part in [get_generator_version(), source] + [
+        "-D%s" % define for define in args.define
+    ] + ["-I%s" % inc for inc in args.include]:
+        key.update(part.encode())
+        key.update(b"\0")
+    return os.path.join(cache_dir, "%s.ast.pickle" % key.hexdigest())
+
+
+# Deep AST nodes need more than the default recursion limit when (un)pickled.
+# The limit is raised only while pickling, so the generator itself still fails early on runaway recursion
+
+
+def with_pickle_recursion_limit(func, *args):
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 10000))
+    try:
+        return func(*args)
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+# The number of ASTs kept in the cache directory. Each configuration or LVGL version makes a new
+# entry, so the least recently used ones are removed when a new one is written
+ast_cache_entries = 8
+
+
+def load_cached_ast(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            ast = with_pickle_recursion_limit(pickle.load, f)
+        os.utime(cache_path)
+        return ast
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+
+def prune_ast_cache(cache_dir):
+    # Concurrent builds may prune the same entries, so the ones already removed are skipped
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".ast.pickle"):
+            try:
+                path = os.path.join(cache_dir, name)
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+    for mtime, path in sorted(entries, reverse=True)[ast_cache_entries:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def store_cached_ast(cache_path, ast):
+    # Write to a temporary file first, so concurrent builds never see a partial cache entry
+    tmp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            with_pickle_recursion_limit(pickle.dump, ast, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+        prune_ast_cache(os.path.dirname(cache_path))
+    except OSError as e:
+        eprint("Could not write AST cache %s: %s" % (cache_path, e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+ast = None
+if args.cache_dir:
+    ast_cache_path = get_ast_cache_path(args.cache_dir, s)
+    ast = load_cached_ast(ast_cache_path)
+if ast is None:
+    ast = parser.parse(s, filename="<none>")
+    if args.cache_dir:
+        store_cached_ast(ast_cache_path, ast)
 
 if args.json is not None:
     with open(args.json, "r") as f:
@@ -444,6 +859,8 @@ if args.json is not None:
 else:
     lvgl_json = None
 
+begin_phase("analyze")
+
 # *************** Fix ***********************************
 # this is a fix for structures not getting populated properly from
 # forward declarations. pycparser doesn't make the connection between
@@ -583,12 +1000,22 @@ def get_ctor(obj_name):
 
 def get_methods(obj_name):
     global funcs
-    return [
+    methods = [
         func
         for func in funcs
         if is_method_of(func.name, obj_name)
         and (not func.name == ctor_name_from_obj_name(obj_name))
     ]
+    if allowlist_members is None:
+        return methods
+    allowed_methods = []
+    for method in methods:
+        method_name = method_name_from_func_name(method.name)
+        if is_member_allowed(method_name):
+            allowed_methods.append(method)
+        else:
+            drop_binding("methods", "%s.%s" % (obj_name, method_name), method)
+    return allowed_methods
 
 
 @memoize
@@ -691,6 +1118,156 @@ parent_obj_names = {
 }
 parent_obj_names[base_obj_name] = None
 
+#
+# Allowlist (dead binding elimination)
+# The allowlist holds the names the application uses from the module (objects, functions, enums,
+# structs, globals and constants) and the member names it uses (methods of objects and structs).
+# It's either a JSON file: a list of names, or {"names": [...], "members": [...]},
+# or it's collected by scanning Python sources for module attributes ("lv.label") and for any
+# attribute access ("btn.set_size"). Without "members" in the JSON, all members are allowed.
+# Only allowed names and their closure are generated: parent objects, enums of objects, and
+# structs and callbacks needed by generated functions.
+#
+
+allowlist_names = None  # None means everything is allowed
+allowlist_members = None
+
+dropped_bindings = collections.OrderedDict(
+    (kind, collections.OrderedDict())
+    for kind in [
+        "objects",
+        "methods",
+        "functions",
+        "enums",
+        "structs",
+        "globals",
+        "int_constants",
+    ]
+)
+
+# Estimated ROM used by a single binding on a 32 bit target: its globals/locals table entry
+# (mp_rom_map_elem_t) and, for functions, its function object.
+# Qstrs are estimated separately: string, null terminator, length and hash.
+# Code of the dropped wrappers is not included.
+
+binding_rom_size = {
+    "objects": 8,
+    "methods": 8 + 16,
+    "functions": 8 + 16,
+    "enums": 8,
+    "structs": 8,
+    "globals": 8,
+    "int_constants": 8,
+}
+
+
+def scan_allowlist_source(source, names, members):
+    aliases = set(
+        re.findall(r"^\s*import\s+%s\s+as\s+(\w+)" % module_name, source, re.MULTILINE)
+    )
+    if re.search(r"^\s*import\s+%s\s*$" % module_name, source, re.MULTILINE):
+        aliases.add(module_name)
+    for alias in aliases:
+        names.update(re.findall(r"\b%s\.([A-Za-z_]\w*)" % alias, source))
+    for imported in re.findall(
+        r"^\s*from\s+%s\s+import\s+\(?([\w\s,]+)" % module_name, source, re.MULTILINE
+    ):
+        names.update(name.split()[0] for name in imported.split(",") if name.strip())
+    members.update(re.findall(r"\.([A-Za-z_]\w*)", source))
+
+
+def load_allowlist(paths):
+    names = set()
+    members = set()
+    all_members = False
+    for path in paths:
+        if path.endswith(".json"):
+            with open(path, "r") as f:
+                allowlist = json.load(f)
+            if isinstance(allowlist, dict):
+                names.update(allowlist.get("names", []))
+                if "members" in allowlist:
+                    members.update(allowlist["members"])
+                else:
+                    all_members = True
+            else:
+                names.update(allowlist)
+                all_members = True
+            continue
+        if os.path.isdir(path):
+            sources = [
+                os.path.join(dir_path, file_name)
+                for dir_path, dir_names, file_names in os.walk(path)
+                for file_name in sorted(file_names)
+                if file_name.endswith(".py")
+            ]
+        else:
+            sources = [path]
+        for source_path in sources:
+            with open(source_path, "r") as f:
+                scan_allowlist_source(f.read(), names, members)
+    return names, None if all_members else members
+
+
+def is_name_allowed(name):
+    return allowlist_names is None or sanitize(name) in allowlist_names
+
+
+def is_member_allowed(name):
+    return allowlist_members is None or sanitize(name) in allowlist_members
+
+
+# C functions dropped as methods are not reported again as module functions
+dropped_funcs = set()
+
+
+def drop_binding(kind, name, func=None):
+    dropped_bindings[kind][name] = True
+    if func:
+        dropped_funcs.add(func.name)
+
+
+def report_dropped_bindings():
+    report = collections.OrderedDict()
+    rom_size = 0
+    qstrs = set()
+    for kind, names in dropped_bindings.items():
+        report[kind] = list(names.keys())
+        rom_size += binding_rom_size[kind] * len(names)
+        qstrs.update(name.split(".")[-1] for name in names)
+    rom_size += sum(len(qstr) + 3 for qstr in qstrs)
+    report["estimated_rom_saved"] = rom_size
+
+    eprint(
+        "Allowlist dropped %s, saving about %d bytes of ROM"
+        % (
+            ", ".join(
+                "%d %s" % (len(names), kind.replace("_", " "))
+                for kind, names in dropped_bindings.items()
+            ),
+            rom_size,
+        )
+    )
+    if args.allowlist_report:
+        with open(args.allowlist_report, "w") as report_file:
+            json.dump(report, report_file, indent=4)
+
+
+if args.allowlist:
+    allowlist_names, allowlist_members = load_allowlist(args.allowlist)
+
+    # Objects need their parents, and native objects are at least converted to the base object
+    allowed_obj_names = set()
+    for obj_name in obj_names:
+        if is_name_allowed(obj_name) or obj_name == base_obj_name:
+            while obj_name and obj_name not in allowed_obj_names:
+                allowed_obj_names.add(obj_name)
+                obj_name = parent_obj_names.get(obj_name)
+    for obj_name in obj_names:
+        if obj_name not in allowed_obj_names:
+            drop_binding("objects", obj_name)
+    obj_names = [obj_name for obj_name in obj_names if obj_name in allowed_obj_names]
+
 # Populate inheritance hierarchy according to lv_ext structures
 # exts = {obj_name_from_ext_name(ext.name): ext for ext in ast.ext if hasattr(ext, 'name') and ext.name is not None and lv_ext_pattern.match(ext.name)}
 # for obj_name, ext in exts.items():
@@ -948,9 +1525,210 @@ register_int_ptr_type(
 )
 
 
+#
+# Output handling
+# By default the module is printed to stdout as a single C file.
+# When sharding, the output is collected per section and split into a shared
+# header and several C files (shards) that can be compiled in parallel.
+# Each section is placed as a whole in a single shard.
+# The module definition itself is still printed to stdout.
+#
+
+MODULE_SECTION = "module"
+
+
+class ShardedOutput(object):
+    def __init__(self):
+        self.header = io.StringIO()
+        self.sections = collections.OrderedDict()
+        self.current = self.header
+
+    def write(self, text):
+        self.current.write(text)
+
+    def flush(self):
+        pass
+
+    def set_section(self, name):
+        if name not in self.sections:
+            self.sections[name] = io.StringIO()
+        self.current = self.sections[name]
+
+
+module_output = sys.stdout
+sharded_output = ShardedOutput() if args.shards else None
+if sharded_output:
+    sys.stdout = sharded_output
+
+current_section = None
+
+
+def begin_section(name):
+    global current_section
+    previous_section = current_section
+    current_section = name
+    if sharded_output:
+        sharded_output.set_section(name)
+    return previous_section
+
+
+# Declarations needed by all shards: typedefs, macros and static inline functions.
+
+
+def print_header(*args, **kwargs):
+    print(*args, file=sharded_output.header if sharded_output else sys.stdout, **kwargs)
+
+
+# Definitions that may be referenced from other shards need an extern declaration.
+# A single C file doesn't need them.
+
+
+def declare_extern(declaration):
+    if sharded_output:
+        print("extern %s" % declaration, file=sharded_output.header)
+
+
+# With --runtime=shared, the runtime is written to its own header and C file instead of the module.
+# Their content doesn't depend on the module, so all the modules generated with the same
+# runtime prefix share them.
+
+runtime_header = io.StringIO() if args.runtime == "shared" else None
+runtime_source = io.StringIO() if args.runtime == "shared" else None
+
+
+def print_runtime_header(*args, **kwargs):
+    if runtime_header:
+        print(*args, file=runtime_header, **kwargs)
+    else:
+        print_header(*args, **kwargs)
+
+
+def print_runtime(*args, **kwargs):
+    print(*args, file=runtime_source if runtime_source else sys.stdout, **kwargs)
+
+
+def write_if_changed(path, content):
+    # Keep the timestamp of unchanged files, so they are not recompiled
+    try:
+        with open(path, "r") as f:
+            if f.read() == content:
+                return
+    except OSError:
+        pass
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def write_shards():
+    sys.stdout = module_output
+    prefix = args.shard_prefix
+    header_name = "%s.h" % os.path.basename(prefix)
+    guard = "__%s__" % re.sub(r"\W", "_", header_name).upper()
+    write_if_changed(
+        "%s.h" % prefix,
+        """#ifndef {guard}
+#define {guard}
+
+#define GENMPY_STATIC
+#define GENMPY_STATIC_DECL extern
+#define GENMPY_STATIC_INLINE
+{header}
+#endif // {guard}
+""".format(guard=guard, header=sharded_output.header.getvalue()),
+    )
+
+    # A section always goes to the same shard, so adding or removing sections
+    # doesn't move the other sections around
+    shards = [[] for i in range(args.shards)]
+    for section in sharded_output.sections:
+        if section != MODULE_SECTION:
+            shards[zlib.crc32(section.encode()) % args.shards].append(section)
+
+    manifest = collections.OrderedDict()
+    manifest["header"] = "%s.h" % prefix
+    manifest["shards"] = collections.OrderedDict()
+    for i, sections in enumerate(shards):
+        shard_path = "%s_%d.c" % (prefix, i)
+        write_if_changed(
+            shard_path,
+            """
+/*
+ * Auto-Generated file, DO NOT EDIT!
+ *
+ * {module_name} shard {i} of {count}
+ */
+
+#include "{header_name}"
+{sections}""".format(
+                module_name=module_name,
+                i=i,
+                count=args.shards,
+                header_name=header_name,
+                sections="".join(
+                    "\n/*\n * Section %s\n */\n%s"
+                    % (section, sharded_output.sections[section].getvalue())
+                    for section in sections
+                ),
+            ),
+        )
+        manifest["shards"][shard_path] = sections
+    write_if_changed("%s.json" % prefix, json.dumps(manifest, indent=4) + "\n")
+
+    print('\n#include "%s"' % header_name)
+    if MODULE_SECTION in sharded_output.sections:
+        print(sharded_output.sections[MODULE_SECTION].getvalue())
+
+
+def write_runtime():
+    prefix = args.runtime_prefix
+    header_name = "%s.h" % os.path.basename(prefix)
+    guard = "__%s__" % re.sub(r"\W", "_", header_name).upper()
+    write_if_changed(
+        "%s.h" % prefix,
+        """
+/*
+ * Auto-Generated file, DO NOT EDIT!
+ *
+ * Runtime shared by the modules generated with --runtime=shared
+ */
+
+#ifndef {guard}
+#define {guard}
+
+{mpy_includes}
+#define GENMPY_SHARED_RUNTIME
+#define GENMPY_RUNTIME
+#define GENMPY_RUNTIME_DECL extern
+#define GENMPY_RUNTIME_INLINE
+{header}
+#endif // {guard}
+""".format(
+            guard=guard,
+            mpy_includes=mpy_includes,
+            header=runtime_header.getvalue(),
+        ),
+    )
+    write_if_changed(
+        "%s.c" % prefix,
+        """
+/*
+ * Auto-Generated file, DO NOT EDIT!
+ *
+ * Runtime shared by the modules generated with --runtime=shared
+ */
+
+#include "{header_name}"
+{source}""".format(
+            header_name=header_name, source=runtime_source.getvalue()
+        ),
+    )
+
+
 #
 # Emit Header
 #
+
+begin_phase("runtime")
 headers = args.input
 for header in headers:
     if "lvgl.h" in header:
@@ -963,7 +1741,24 @@ for header in headers:
         headers.append(path)
         break
 
-print(
+mpy_includes = """/*
+ * Mpy includes
+ */
+
+#include <stdlib.h>
+#include <string.h>
+#include "py/obj.h"
+#include "py/objint.h"
+#include "py/objstr.h"
+#include "py/runtime.h"
+#include "py/binary.h"
+#include "py/objarray.h"
+#include "py/objtype.h"
+#include "py/objexcept.h"
+#include "py/gc.h"
+"""
+
+print_header(
     """
 /*
  * Auto-Generated file, DO NOT EDIT!
@@ -977,28 +1772,26 @@ print(
  * Generating Objects: {objs}
  */
 
+{mpy_includes}
 /*
- * Mpy includes
+ * {module_name} includes
  */
 
-#include <stdlib.h>
-#include <string.h>
-#include "py/obj.h"
-#include "py/objint.h"
-#include "py/objstr.h"
-#include "py/runtime.h"
-#include "py/binary.h"
-#include "py/objarray.h"
-#include "py/objtype.h"
-#include "py/objexcept.h"
+{lv_headers}
 
 /*
- * {module_name} includes
+ * Linkage of definitions shared by generated code.
+ * They are only visible in this file, unless the module is split into shards.
  */
 
-{lv_headers}
+#ifndef GENMPY_STATIC
+#define GENMPY_STATIC static
+#define GENMPY_STATIC_DECL static
+#define GENMPY_STATIC_INLINE static inline
+#endif
 """.format(
         module_name=module_name,
+        mpy_includes=mpy_includes,
         cmd_line=" ".join(argv),
         pp_cmd=pp_cmd,
         objs=", ".join(
@@ -1012,8 +1805,18 @@ print(
 # Enable objects, if supported
 #
 
+
+
+def obj_types_hash_size(obj_types_count):
+    # Keep the hash table at most half full, so probing stays short
+    hash_size = 1
+    while hash_size < 2 * obj_types_count:
+        hash_size *= 2
+    return hash_size
+
+
 if len(obj_names) > 0:
-    print(
+    print_header(
         """
 #define LV_OBJ_T {obj_type}
 
@@ -1022,26 +1825,35 @@ typedef struct mp_lv_obj_type_t {{
     const mp_obj_type_t *mp_obj_type;
 }} mp_lv_obj_type_t;
 
-static const mp_lv_obj_type_t mp_lv_{base_obj}_type;
-static const mp_lv_obj_type_t *mp_lv_obj_types[];
+GENMPY_STATIC_DECL const mp_lv_obj_type_t mp_lv_{base_obj}_type;
+GENMPY_STATIC_DECL const mp_lv_obj_type_t *mp_lv_obj_types[];
+
+// Size of the hash table that finds mp_lv_obj_types by lv_obj_class, a power of 2
+#define MP_LV_OBJ_TYPES_HASH_SIZE {obj_types_hash_size}
 
 static inline const mp_obj_type_t *get_BaseObj_type()
 {{
     return mp_lv_{base_obj}_type.mp_obj_type;
 }}
-
-MP_DEFINE_EXCEPTION(LvReferenceError, Exception)
-    """.format(obj_type=base_obj_type, base_obj=base_obj_name)
+    """.format(
+            obj_type=base_obj_type,
+            base_obj=base_obj_name,
+            obj_types_hash_size=obj_types_hash_size(len(obj_names)),
+        )
     )
+    declare_extern("const mp_obj_type_t mp_type_LvReferenceError;")
 
 #
 # Emit Mpy helper functions
 #
 
-print(
+if args.runtime == "shared":
+    print_header('\n#include "%s.h"' % os.path.basename(args.runtime_prefix))
+
+print_runtime_header(
     """
 /*
- * Helper functions
+ * Helper types and declarations
  */
 
 #ifndef GENMPY_UNUSED
@@ -1052,21 +1864,408 @@ print(
 #endif // __GNUC__
 #endif // GENMPY_UNUSED
 
+// Linkage of the runtime definitions, the same as the rest of the module unless
+// they are generated once into their own C file (--runtime=shared)
+
+#ifndef GENMPY_RUNTIME
+#define GENMPY_RUNTIME GENMPY_STATIC
+#define GENMPY_RUNTIME_DECL GENMPY_STATIC_DECL
+#define GENMPY_RUNTIME_INLINE GENMPY_STATIC_INLINE
+#endif
+
+// The runtime of LVGL objects is in the module which has them, or in the shared runtime
+
+#if defined(LV_OBJ_T) || defined(GENMPY_SHARED_RUNTIME)
+#define MP_LV_OBJ_RUNTIME (1)
+#else
+#define MP_LV_OBJ_RUNTIME (0)
+#endif
+
 // Custom function mp object
 
 typedef mp_obj_t (*mp_fun_ptr_var_t)(size_t n, const mp_obj_t *, void *ptr);
 
+// Fixed arity entry points, for functions with up to 3 arguments
+
+typedef mp_obj_t (*mp_fun_ptr_0_t)(void *ptr);
+typedef mp_obj_t (*mp_fun_ptr_1_t)(mp_obj_t, void *ptr);
+typedef mp_obj_t (*mp_fun_ptr_2_t)(mp_obj_t, mp_obj_t, void *ptr);
+typedef mp_obj_t (*mp_fun_ptr_3_t)(mp_obj_t, mp_obj_t, mp_obj_t, void *ptr);
+
+// Call counts and time of each binding function and callback, enabled with -DMP_LV_BINDING_STATS=1
+// and reported by _binding_stats(). When disabled, these macros expand to nothing
+
+#ifndef MP_LV_BINDING_STATS
+#define MP_LV_BINDING_STATS (0)
+#endif
+
+#if MP_LV_BINDING_STATS
+#include "py/mphal.h"
+
+typedef struct mp_lv_binding_stat_t {
+    uint32_t calls;
+    uint64_t us;
+} mp_lv_binding_stat_t;
+
+typedef struct mp_lv_binding_stat_entry_t {
+    const char *name;
+    mp_lv_binding_stat_t *stat;
+} mp_lv_binding_stat_entry_t;
+
+#define MP_LV_STAT_DEFINE(name) GENMPY_STATIC mp_lv_binding_stat_t name##_stat;
+#define MP_LV_STAT_DECLARE(name) GENMPY_STATIC_DECL mp_lv_binding_stat_t name##_stat;
+#define MP_LV_FUN_STAT(name) , &name##_stat
+#define MP_LV_STAT_BEGIN() mp_uint_t mp_lv_stat_start = mp_hal_ticks_us()
+#define MP_LV_STAT_END(stat) ((stat)->calls++, (stat)->us += (mp_uint_t)(mp_hal_ticks_us() - mp_lv_stat_start))
+#else
+#define MP_LV_STAT_DEFINE(name)
+#define MP_LV_STAT_DECLARE(name)
+#define MP_LV_FUN_STAT(name)
+#define MP_LV_STAT_BEGIN()
+#define MP_LV_STAT_END(stat)
+#endif
+
 typedef struct mp_lv_obj_fun_builtin_var_t {
     mp_obj_base_t base;
     mp_uint_t n_args;
-    mp_fun_ptr_var_t mp_fun;
+    union {
+        mp_fun_ptr_var_t var;
+        mp_fun_ptr_0_t _0;
+        mp_fun_ptr_1_t _1;
+        mp_fun_ptr_2_t _2;
+        mp_fun_ptr_3_t _3;
+    } mp_fun;
     void *lv_fun;
+#if MP_LV_BINDING_STATS
+    mp_lv_binding_stat_t *stat;
+#endif
 } mp_lv_obj_fun_builtin_var_t;
 
+#define MP_DEFINE_CONST_LV_FUN_OBJ_VAR(obj_name, n_args, mp_fun, lv_fun) \\
+    const mp_lv_obj_fun_builtin_var_t obj_name = \\
+        {{&mp_lv_type_fun_builtin_var}, n_args, {.var = mp_fun}, lv_fun MP_LV_FUN_STAT(obj_name)}
+
+#define MP_DEFINE_CONST_LV_FUN_OBJ_STATIC_VAR(obj_name, n_args, mp_fun, lv_fun) \\
+    const mp_lv_obj_fun_builtin_var_t obj_name = \\
+        {{&mp_lv_type_fun_builtin_static_var}, n_args, {.var = mp_fun}, lv_fun MP_LV_FUN_STAT(obj_name)}
+
+// n_args must be a literal number between 0 and 3, it selects the entry point
+
+#define MP_DEFINE_CONST_LV_FUN_OBJ_FIXED(obj_name, n_args, mp_fun, lv_fun) \\
+    const mp_lv_obj_fun_builtin_var_t obj_name = \\
+        {{&mp_lv_type_fun_builtin_fixed}, n_args, {._##n_args = mp_fun}, lv_fun MP_LV_FUN_STAT(obj_name)}
+
+#define MP_DEFINE_CONST_LV_FUN_OBJ_STATIC_FIXED(obj_name, n_args, mp_fun, lv_fun) \\
+    const mp_lv_obj_fun_builtin_var_t obj_name = \\
+        {{&mp_lv_type_fun_builtin_static_fixed}, n_args, {._##n_args = mp_fun}, lv_fun MP_LV_FUN_STAT(obj_name)}
+
+typedef struct mp_lv_struct_t
+{
+    mp_obj_base_t base;
+    void *data;
+} mp_lv_struct_t;
+
+// When LVGL memory isn't allocated on the MicroPython heap, the GC doesn't scan it and doesn't see
+// the Python objects that LVGL refers to (the Python objects of LVGL objects and the callback tables).
+// These are kept in a root table instead, until the hooks called when LVGL frees their owner release them.
+// The shared runtime doesn't see the LVGL configuration, so it must be built with -DMP_LV_PIN_REFS=1 in that case.
+
+#ifndef MP_LV_PIN_REFS
+#if !defined(GENMPY_SHARED_RUNTIME) && defined(LV_OBJ_T) && defined(LV_USE_STDLIB_MALLOC) && LV_USE_STDLIB_MALLOC != LV_STDLIB_MICROPYTHON
+#define MP_LV_PIN_REFS (1)
+#else
+#define MP_LV_PIN_REFS (0)
+#endif
+#endif
+
+#if defined(GENMPY_SHARED_RUNTIME) && defined(LV_OBJ_T) && defined(LV_USE_STDLIB_MALLOC) && LV_USE_STDLIB_MALLOC != LV_STDLIB_MICROPYTHON && !MP_LV_PIN_REFS
+#error "LVGL memory is not on the MicroPython heap, build the shared runtime and the modules with -DMP_LV_PIN_REFS=1"
+#endif
+
+// MP_LV_PINNING wraps the statements which pin and unpin these objects, compiled only in that case
+
+#if MP_LV_PIN_REFS && MP_LV_OBJ_RUNTIME
+#define MP_LV_PIN(owner, obj) mp_lv_pin(owner, obj)
+#define MP_LV_PINNING(...) __VA_ARGS__
+#else
+#define MP_LV_PIN(owner, obj)
+#define MP_LV_PINNING(...)
+#endif
+
+// Callbacks are kept in a table, where each callback kind has a slot assigned by the generator
+
+// Objects wrapping the arguments of a callback, reused between calls
+typedef struct mp_lv_callback_views_t {
+    bool busy;
+    mp_obj_t views[];
+} mp_lv_callback_views_t;
+
+typedef struct mp_lv_callback_slot_t {
+    qstr name;
+    mp_obj_t callback;
+    mp_lv_callback_views_t *views;
+} mp_lv_callback_slot_t;
+
+typedef struct mp_lv_callbacks_t {
+    mp_obj_base_t base;
+    mp_obj_t dict; // The same callbacks by name, as seen from Python. MP_OBJ_NULL until needed
+    uint16_t n_slots;
+    bool recyclable; // Created for a single callback registration, reused once its object is deleted
+    mp_lv_callback_slot_t *slots;
+#if MP_LV_PIN_REFS
+    size_t n_pins; // The number of LVGL structs holding the table, which keep it pinned
+    void *deleted_cb; // The deleted_cb replaced by the release hook of the animations holding the table
+#endif
+} mp_lv_callbacks_t;
+
+// The Python object of an LVGL object.
+// The shared runtime doesn't know the object type, and only passes the pointer around.
+
+typedef struct mp_lv_obj_t {
+    mp_obj_base_t base;
+#ifdef LV_OBJ_T
+    LV_OBJ_T *lv_obj;
+#else
+    void *lv_obj;
+#endif
+    mp_lv_callbacks_t *callbacks;
+#if MP_LV_PIN_REFS
+    mp_obj_t refs; // Arguments of its methods that LVGL keeps a pointer to, see mp_lv_keep_ref. MP_OBJ_NULL until needed
+#endif
+} mp_lv_obj_t;
+
+#if MP_LV_OBJ_RUNTIME
+
+#ifndef MP_LV_CALLBACKS_POOL_SIZE
+#define MP_LV_CALLBACKS_POOL_SIZE (32)
+#endif
+
+// Callback tables of deleted objects, set aside until they can be reused
+
+typedef struct mp_lv_callbacks_pool_t {
+    bool release_pending;
+    size_t n_free;
+    mp_lv_callbacks_t *free[MP_LV_CALLBACKS_POOL_SIZE];
+    size_t n_deleted;
+    size_t max_deleted;
+    mp_obj_t *deleted;
+} mp_lv_callbacks_pool_t;
+
+GENMPY_RUNTIME mp_lv_callbacks_pool_t *mp_lv_get_callbacks_pool(void);
+GENMPY_RUNTIME void mp_lv_set_aside(mp_lv_callbacks_pool_t *pool, mp_obj_t obj);
+GENMPY_RUNTIME void mp_lv_release_set_aside(void *arg);
+GENMPY_RUNTIME void mp_lv_deinit_roots(void);
+#if MP_LV_PIN_REFS
+GENMPY_RUNTIME void mp_lv_pin(const void *owner, mp_obj_t obj);
+GENMPY_RUNTIME mp_obj_t mp_lv_unpin(const void *owner);
+GENMPY_RUNTIME mp_obj_t mp_lv_pinned_count(void);
+GENMPY_RUNTIME bool mp_lv_pin_callbacks(void *user_data);
+GENMPY_RUNTIME void mp_lv_unpin_callbacks(void *user_data);
+GENMPY_RUNTIME void mp_lv_keep_ref(mp_obj_t obj, mp_obj_t key, mp_obj_t ref);
+GENMPY_RUNTIME mp_obj_t mp_lv_ref_key(const void *func, size_t index, size_t n, const void *const *args);
+#endif
+
+#endif // MP_LV_OBJ_RUNTIME
+
+#ifndef LV_OBJ_T
+
+typedef struct mp_lv_obj_type_t {
+    mp_obj_type_t *mp_obj_type;
+} mp_lv_obj_type_t;
+
+#endif // LV_OBJ_T
+
+typedef void *(*mp_lv_get_user_data)(void *);
+typedef void (*mp_lv_set_user_data)(void *, void *);
+
+typedef struct mp_lv_array_t
+{
+    mp_lv_struct_t base;
+    size_t element_size;
+    bool is_signed;
+    size_t len; // Number of elements, 0 when unknown
+    bool is_view; // Reused callback argument
+    mp_obj_t memview; // Memoryview reused by __dereference__ when is_view
+} mp_lv_array_t;
+
+// Field descriptors of a struct, in declaration order, found in the __FIELDS__ entry of its locals dict.
+// They initialize a struct from a dict or a tuple without going through the attr slot
+
+typedef enum {
+    MP_LV_FIELD_ATTR, // Set through the attr slot (pointers, callbacks, arrays, bitfields...)
+    MP_LV_FIELD_INT,
+    MP_LV_FIELD_ULL,
+    MP_LV_FIELD_BOOL,
+    MP_LV_FIELD_FLOAT,
+    MP_LV_FIELD_STRUCT,
+} mp_lv_field_kind_t;
+
+typedef struct mp_lv_struct_field_t {
+    qstr name;
+    uint32_t offset;
+    uint16_t size;
+    uint8_t kind;
+    const mp_obj_type_t *type; // Type of a nested struct
+} mp_lv_struct_field_t;
+
+typedef struct mp_lv_struct_fields_t {
+    mp_obj_base_t base;
+    size_t n_fields;
+    const mp_lv_struct_field_t *fields;
+} mp_lv_struct_fields_t;
+
+// Enums are constant tables of their members, sorted by name and searched by binary search,
+// instead of types with a locals dict
+
+typedef struct mp_lv_enum_t {
+    mp_obj_base_t base;
+    qstr name;
+    size_t n_members;
+    const mp_rom_map_elem_t *members;
+} mp_lv_enum_t;
+
+// Definitions shared by all generated code
+
+GENMPY_RUNTIME_DECL const mp_obj_type_t mp_lv_type_fun_builtin_var;
+GENMPY_RUNTIME_DECL const mp_obj_type_t mp_lv_type_fun_builtin_static_var;
+GENMPY_RUNTIME_DECL const mp_obj_type_t mp_lv_type_fun_builtin_fixed;
+GENMPY_RUNTIME_DECL const mp_obj_type_t mp_lv_type_fun_builtin_static_fixed;
+GENMPY_RUNTIME_DECL const mp_obj_type_t mp_lv_base_struct_type;
+GENMPY_RUNTIME_DECL const mp_obj_type_t mp_lv_struct_fields_type;
+GENMPY_RUNTIME_DECL const mp_obj_type_t mp_lv_enum_type;
+GENMPY_RUNTIME_DECL int _nesting;
+
+GENMPY_RUNTIME mp_obj_t get_native_obj(mp_obj_t mp_obj);
+GENMPY_RUNTIME mp_int_t mp_lv_obj_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags);
+GENMPY_RUNTIME mp_int_t mp_blob_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags);
+GENMPY_RUNTIME mp_obj_t cast(mp_obj_t mp_obj, const mp_obj_type_t *mp_type);
+GENMPY_RUNTIME mp_obj_t make_new_lv_struct(const mp_obj_type_t *type, size_t n_args, size_t n_kw, const mp_obj_t *args);
+GENMPY_RUNTIME mp_obj_t lv_struct_binary_op(mp_binary_op_t op, mp_obj_t lhs_in, mp_obj_t rhs_in);
+GENMPY_RUNTIME mp_obj_t lv_struct_subscr(mp_obj_t self_in, mp_obj_t index, mp_obj_t value);
+GENMPY_RUNTIME void *copy_buffer(const void *buffer, size_t size);
+GENMPY_RUNTIME mp_obj_t lv_to_mp_struct(const mp_obj_type_t *type, void *lv_struct);
+GENMPY_RUNTIME mp_obj_t mp_lv_struct_field(mp_obj_t owner, const mp_obj_type_t *type, void *field);
+GENMPY_RUNTIME void call_parent_methods(mp_obj_t obj, qstr attr, mp_obj_t *dest);
+GENMPY_RUNTIME void* mp_to_ptr(mp_obj_t self_in);
+GENMPY_RUNTIME_INLINE mp_obj_t ptr_to_mp(void *data);
+GENMPY_RUNTIME_DECL const mp_obj_type_t mp_lv_callbacks_type;
+GENMPY_RUNTIME mp_lv_callbacks_t *mp_lv_new_callbacks(void *dict);
+GENMPY_RUNTIME mp_obj_t mp_lv_callbacks_dict(mp_lv_callbacks_t *callbacks);
+GENMPY_RUNTIME mp_obj_t mp_lv_get_callback(void *user_data, qstr callback_name, size_t slot,
+     size_t n_views, mp_lv_callback_views_t **views);
+GENMPY_RUNTIME_DECL mp_obj_t *mp_lv_reuse_view;
+GENMPY_RUNTIME void *mp_lv_callback(mp_obj_t mp_callback, void *lv_callback, qstr callback_name, size_t slot,
+     void **user_data_ptr, void *containing_struct, mp_lv_get_user_data get_user_data, mp_lv_set_user_data set_user_data);
+GENMPY_RUNTIME mp_obj_t mp_lv_funcptr(const mp_lv_obj_fun_builtin_var_t *mp_fun, void *lv_fun, void *lv_callback, qstr func_name, size_t slot, void *user_data);
+GENMPY_RUNTIME mp_obj_t mp_array_from_ptr(void *lv_arr, size_t element_size, bool is_signed);
+GENMPY_RUNTIME void *mp_array_to_ptr(mp_obj_t *mp_arr, size_t element_size, bool is_signed);
+GENMPY_RUNTIME bool mp_lv_packed_array(mp_obj_t mp_arr, size_t element_size, size_t alignment, void **lv_arr);
+
+// Reuse the object created by a struct, Blob or array conversion for argument i of a callback
+
+#define MP_LV_REUSE_VIEW(views, i, conversion) \\
+    (mp_lv_reuse_view = (views)? &(views)->views[i]: NULL, mp_lv_reused_view(conversion))
+
+static inline mp_obj_t mp_lv_reused_view(mp_obj_t view)
+{
+    mp_lv_reuse_view = NULL;
+    return view;
+}
+
+GENMPY_RUNTIME mp_obj_t mp_lv_call_with_views(mp_obj_t callback, size_t n_args, const mp_obj_t *args,
+     mp_lv_callback_views_t *views);
+
+#ifdef LV_OBJ_T
+GENMPY_STATIC_DECL const mp_rom_obj_static_class_method_t cast_obj_class_method;
+GENMPY_STATIC void mp_lv_release_deleted(LV_OBJ_T *lv_obj);
+#if MP_LV_PIN_REFS
+GENMPY_STATIC void mp_lv_pin_anim(lv_anim_t *a);
+GENMPY_STATIC void mp_lv_release_timer(lv_timer_t *timer);
+GENMPY_STATIC void mp_lv_timer_called(lv_timer_t *timer);
+GENMPY_STATIC void mp_lv_release_display(lv_display_t *disp);
+GENMPY_STATIC void mp_lv_release_indev(lv_indev_t *indev);
+GENMPY_STATIC void mp_lv_pin_obj_events(LV_OBJ_T *lv_obj, bool pin);
+GENMPY_STATIC void mp_lv_pin_display_events(lv_display_t *disp, bool pin);
+GENMPY_STATIC void mp_lv_pin_indev_events(lv_indev_t *indev, bool pin);
+GENMPY_STATIC void mp_lv_release_observer(lv_observer_t *observer);
+#endif
+GENMPY_STATIC_DECL const mp_obj_fun_builtin_fixed_t lvgl_mod___init___obj;
+GENMPY_STATIC_DECL const mp_obj_fun_builtin_fixed_t lvgl_mod___del___obj;
+
+GENMPY_STATIC_INLINE LV_OBJ_T *mp_to_lv(mp_obj_t mp_obj);
+GENMPY_STATIC_INLINE mp_obj_t lv_to_mp(LV_OBJ_T *lv_obj);
+GENMPY_STATIC mp_obj_t make_new(
+    const mp_lv_obj_fun_builtin_var_t *lv_obj_var,
+    const mp_obj_type_t *type,
+    size_t n_args,
+    size_t n_kw,
+    const mp_obj_t *args);
+GENMPY_STATIC mp_obj_t mp_lv_obj_binary_op(mp_binary_op_t op, mp_obj_t lhs_in, mp_obj_t rhs_in);
+#endif // LV_OBJ_T
+
+static inline mp_obj_t convert_to_bool(bool b)
+{
+    return b? mp_const_true: mp_const_false;
+}
+
+static inline mp_obj_t convert_to_str(const char *str)
+{
+    return str? mp_obj_new_str(str, strlen(str)): mp_const_none;
+}
+
+static inline const char *convert_from_str(mp_obj_t str)
+{
+    if (str == NULL || str == mp_const_none)
+        return NULL;
+
+    if (MP_OBJ_IS_TYPE(str, &mp_type_bytearray) ||
+        MP_OBJ_IS_TYPE(str, &mp_type_memoryview)) {
+            mp_buffer_info_t buffer_info;
+            if (mp_get_buffer(str, &buffer_info, MP_BUFFER_READ)) {
+                return buffer_info.buf;
+            }
+    }
+
+    return mp_obj_str_get_str(str);
+}
+
+#define MP_ARRAY_CONVERTOR(name, size, is_signed) \
+static inline mp_obj_t mp_array_from_ ## name(void *lv_arr)\
+{\
+    return mp_array_from_ptr(lv_arr, size, is_signed);\
+}\
+static inline void *mp_array_to_ ## name(mp_obj_t mp_arr)\
+{\
+    return mp_array_to_ptr(mp_arr, size, is_signed);\
+}
+
+MP_ARRAY_CONVERTOR(u8ptr, 1, false)
+MP_ARRAY_CONVERTOR(i8ptr, 1, true)
+MP_ARRAY_CONVERTOR(u16ptr, 2, false)
+MP_ARRAY_CONVERTOR(i16ptr, 2, true)
+MP_ARRAY_CONVERTOR(u32ptr, 4, false)
+MP_ARRAY_CONVERTOR(i32ptr, 4, true)
+MP_ARRAY_CONVERTOR(u64ptr, 8, false)
+MP_ARRAY_CONVERTOR(i64ptr, 8, true)
+"""
+)
+
+begin_section("runtime")
+
+if len(obj_names) > 0:
+    print("\nMP_DEFINE_EXCEPTION(LvReferenceError, Exception)")
+
+print_runtime(
+    """
+/*
+ * Helper functions
+ */
+
 static mp_obj_t lv_fun_builtin_var_call(mp_obj_t self_in, size_t n_args, size_t n_kw, const mp_obj_t *args);
+static mp_obj_t lv_fun_builtin_fixed_call(mp_obj_t self_in, size_t n_args, size_t n_kw, const mp_obj_t *args);
 static mp_int_t mp_func_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags);
 
-GENMPY_UNUSED static MP_DEFINE_CONST_OBJ_TYPE(
+GENMPY_UNUSED GENMPY_RUNTIME MP_DEFINE_CONST_OBJ_TYPE(
     mp_lv_type_fun_builtin_var,
     MP_QSTR_function,
     MP_TYPE_FLAG_BINDS_SELF | MP_TYPE_FLAG_BUILTIN_FUN,
@@ -1075,7 +2274,7 @@ GENMPY_UNUSED static MP_DEFINE_CONST_OBJ_TYPE(
     buffer, mp_func_get_buffer
 );
 
-GENMPY_UNUSED static MP_DEFINE_CONST_OBJ_TYPE(
+GENMPY_UNUSED GENMPY_RUNTIME MP_DEFINE_CONST_OBJ_TYPE(
     mp_lv_type_fun_builtin_static_var,
     MP_QSTR_function,
     MP_TYPE_FLAG_BUILTIN_FUN,
@@ -1084,18 +2283,70 @@ GENMPY_UNUSED static MP_DEFINE_CONST_OBJ_TYPE(
     buffer, mp_func_get_buffer
 );
 
+GENMPY_UNUSED GENMPY_RUNTIME MP_DEFINE_CONST_OBJ_TYPE(
+    mp_lv_type_fun_builtin_fixed,
+    MP_QSTR_function,
+    MP_TYPE_FLAG_BINDS_SELF | MP_TYPE_FLAG_BUILTIN_FUN,
+    call, lv_fun_builtin_fixed_call,
+    unary_op, mp_obj_int_unary_op,
+    buffer, mp_func_get_buffer
+);
+
+GENMPY_UNUSED GENMPY_RUNTIME MP_DEFINE_CONST_OBJ_TYPE(
+    mp_lv_type_fun_builtin_static_fixed,
+    MP_QSTR_function,
+    MP_TYPE_FLAG_BUILTIN_FUN,
+    call, lv_fun_builtin_fixed_call,
+    unary_op, mp_obj_int_unary_op,
+    buffer, mp_func_get_buffer
+);
+
 static mp_obj_t lv_fun_builtin_var_call(mp_obj_t self_in, size_t n_args, size_t n_kw, const mp_obj_t *args) {
     assert(MP_OBJ_IS_TYPE(self_in, &mp_lv_type_fun_builtin_var) ||
            MP_OBJ_IS_TYPE(self_in, &mp_lv_type_fun_builtin_static_var));
     mp_lv_obj_fun_builtin_var_t *self = MP_OBJ_TO_PTR(self_in);
     mp_arg_check_num(n_args, n_kw, self->n_args, self->n_args, false);
-    return self->mp_fun(n_args, args, self->lv_fun);
+    MP_LV_STAT_BEGIN();
+    mp_obj_t res = self->mp_fun.var(n_args, args, self->lv_fun);
+    MP_LV_STAT_END(self->stat);
+    return res;
+}
+
+// Skip argument checking on the common path, and pass the arguments directly
+
+static mp_obj_t lv_fun_builtin_fixed_call(mp_obj_t self_in, size_t n_args, size_t n_kw, const mp_obj_t *args) {
+    assert(MP_OBJ_IS_TYPE(self_in, &mp_lv_type_fun_builtin_fixed) ||
+           MP_OBJ_IS_TYPE(self_in, &mp_lv_type_fun_builtin_static_fixed));
+    mp_lv_obj_fun_builtin_var_t *self = MP_OBJ_TO_PTR(self_in);
+    if (n_args != self->n_args || n_kw != 0) {
+        mp_arg_check_num(n_args, n_kw, self->n_args, self->n_args, false);
+    }
+    MP_LV_STAT_BEGIN();
+    mp_obj_t res;
+    switch (n_args) {
+        case 0:
+            res = self->mp_fun._0(self->lv_fun);
+            break;
+        case 1:
+            res = self->mp_fun._1(args[0], self->lv_fun);
+            break;
+        case 2:
+            res = self->mp_fun._2(args[0], args[1], self->lv_fun);
+            break;
+        default:
+            res = self->mp_fun._3(args[0], args[1], args[2], self->lv_fun);
+            break;
+    }
+    MP_LV_STAT_END(self->stat);
+    return res;
 }
 
 static mp_int_t mp_func_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags) {
     (void)flags;
     assert(MP_OBJ_IS_TYPE(self_in, &mp_lv_type_fun_builtin_var) ||
-           MP_OBJ_IS_TYPE(self_in, &mp_lv_type_fun_builtin_static_var));
+           MP_OBJ_IS_TYPE(self_in, &mp_lv_type_fun_builtin_static_var) ||
+           MP_OBJ_IS_TYPE(self_in, &mp_lv_type_fun_builtin_fixed) ||
+           MP_OBJ_IS_TYPE(self_in, &mp_lv_type_fun_builtin_static_fixed));
     mp_lv_obj_fun_builtin_var_t *self = MP_OBJ_TO_PTR(self_in);
 
     bufinfo->buf = &self->lv_fun;
@@ -1104,55 +2355,51 @@ static mp_int_t mp_func_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo,
     return 0;
 }
 
-#define MP_DEFINE_CONST_LV_FUN_OBJ_VAR(obj_name, n_args, mp_fun, lv_fun) \\
-    const mp_lv_obj_fun_builtin_var_t obj_name = \\
-        {{&mp_lv_type_fun_builtin_var}, n_args, mp_fun, lv_fun}
+// Casting
 
-#define MP_DEFINE_CONST_LV_FUN_OBJ_STATIC_VAR(obj_name, n_args, mp_fun, lv_fun) \\
-    const mp_lv_obj_fun_builtin_var_t obj_name = \\
-        {{&mp_lv_type_fun_builtin_static_var}, n_args, mp_fun, lv_fun}
+static const mp_lv_struct_t mp_lv_null_obj;
 
-// Casting
+// Instances of Python subclasses of LVGL types (class MyButton(lv.button)) hold their native object in subobj[0].
+// The recently resolved subclasses are cached by address, so method calls on their instances
+// don't walk the parents of their class again. The cache keeps these classes alive, so their address isn't reused.
 
-typedef struct mp_lv_struct_t
-{
-    mp_obj_base_t base;
-    void *data;
-} mp_lv_struct_t;
+#if MP_LV_OBJ_RUNTIME
 
-static const mp_lv_struct_t mp_lv_null_obj;
+#define MP_LV_SUBCLASS_CACHE_SIZE 4 // Power of 2, the size of mp_lv_subclasses
+MP_REGISTER_ROOT_POINTER(const mp_obj_type_t *mp_lv_subclasses[4]);
 
-#ifdef LV_OBJ_T
-static mp_int_t mp_lv_obj_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags);
-#else
-static mp_int_t mp_lv_obj_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags){ return 0; }
-#endif
+static inline const mp_obj_type_t **get_subclass_cache_entry(const mp_obj_type_t *type)
+{
+    size_t index = ((uintptr_t)type / MICROPY_BYTES_PER_GC_BLOCK) & (MP_LV_SUBCLASS_CACHE_SIZE - 1);
+    return &MP_STATE_VM(mp_lv_subclasses)[index];
+}
 
-static mp_int_t mp_blob_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags);
+#endif // MP_LV_OBJ_RUNTIME
 
-static mp_obj_t get_native_obj(mp_obj_t mp_obj)
+GENMPY_RUNTIME mp_obj_t get_native_obj(mp_obj_t mp_obj)
 {
     if (!MP_OBJ_IS_OBJ(mp_obj)) return mp_obj;
     const mp_obj_type_t *native_type = ((mp_obj_base_t*)mp_obj)->type;
     if (native_type == NULL)
         return NULL;
+#if MP_LV_OBJ_RUNTIME
+    const mp_obj_type_t **subclass = get_subclass_cache_entry(native_type);
+    if (*subclass == native_type)
+        return ((mp_obj_instance_t*)MP_OBJ_TO_PTR(mp_obj))->subobj[0];
+#endif
     if (MP_OBJ_TYPE_GET_SLOT_OR_NULL(native_type, parent) == NULL ||
         (MP_OBJ_TYPE_GET_SLOT_OR_NULL(native_type, buffer) == mp_blob_get_buffer) ||
         (MP_OBJ_TYPE_GET_SLOT_OR_NULL(native_type, buffer) == mp_lv_obj_get_buffer))
        return mp_obj;
     while (MP_OBJ_TYPE_GET_SLOT_OR_NULL(native_type, parent)) native_type = MP_OBJ_TYPE_GET_SLOT(native_type, parent);
+#if MP_LV_OBJ_RUNTIME
+    if (mp_obj_is_instance_type(((mp_obj_base_t*)mp_obj)->type) && !mp_obj_is_instance_type(native_type))
+        *subclass = ((mp_obj_base_t*)mp_obj)->type;
+#endif
     return mp_obj_cast_to_native_base(mp_obj, MP_OBJ_FROM_PTR(native_type));
 }
 
-static mp_obj_t dict_to_struct(mp_obj_t dict, const mp_obj_type_t *type);
-
-static mp_obj_t make_new_lv_struct(
-    const mp_obj_type_t *type,
-    size_t n_args,
-    size_t n_kw,
-    const mp_obj_t *args);
-
-static mp_obj_t cast(mp_obj_t mp_obj, const mp_obj_type_t *mp_type)
+GENMPY_RUNTIME mp_obj_t cast(mp_obj_t mp_obj, const mp_obj_type_t *mp_type)
 {
     mp_obj_t res = NULL;
     if (mp_obj == mp_const_none && MP_OBJ_TYPE_GET_SLOT_OR_NULL(mp_type, make_new) == &make_new_lv_struct) {
@@ -1162,9 +2409,9 @@ static mp_obj_t cast(mp_obj_t mp_obj, const mp_obj_type_t *mp_type)
         if (res){
             const mp_obj_type_t *res_type = ((mp_obj_base_t*)res)->type;
             if (res_type != mp_type){
-                if (res_type == &mp_type_dict &&
+                if ((res_type == &mp_type_dict || res_type == &mp_type_tuple) &&
                     MP_OBJ_TYPE_GET_SLOT_OR_NULL(mp_type, make_new) == &make_new_lv_struct)
-                        res = dict_to_struct(res, mp_type);
+                        res = make_new_lv_struct(mp_type, 1, 0, &res);
                 else res = NULL;
             }
         }
@@ -1175,18 +2422,29 @@ static mp_obj_t cast(mp_obj_t mp_obj, const mp_obj_type_t *mp_type)
     return res;
 }
 
+// The Python object of an LVGL object exposes the object pointer as its buffer
+
+GENMPY_RUNTIME mp_int_t mp_lv_obj_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags) {
+    (void)flags;
+    mp_lv_obj_t *self = MP_OBJ_TO_PTR(self_in);
+
+    bufinfo->buf = &self->lv_obj;
+    bufinfo->len = sizeof(self->lv_obj);
+    bufinfo->typecode = BYTEARRAY_TYPECODE;
+    return 0;
+}
+
+"""
+)
+
+print(
+    """
 // object handling
 // This section is enabled only when objects are supported
 
 #ifdef LV_OBJ_T
 
-typedef struct mp_lv_obj_t {
-    mp_obj_base_t base;
-    LV_OBJ_T *lv_obj;
-    LV_OBJ_T *callbacks;
-} mp_lv_obj_t;
-
-static inline LV_OBJ_T *mp_to_lv(mp_obj_t mp_obj)
+GENMPY_STATIC_INLINE LV_OBJ_T *mp_to_lv(mp_obj_t mp_obj)
 {
     if (mp_obj == NULL || mp_obj == mp_const_none) return NULL;
     mp_obj_t native_obj = get_native_obj(mp_obj);
@@ -1201,20 +2459,6 @@ static inline LV_OBJ_T *mp_to_lv(mp_obj_t mp_obj)
     return mp_lv_obj->lv_obj;
 }
 
-static inline LV_OBJ_T *mp_get_callbacks(mp_obj_t mp_obj)
-{
-    if (mp_obj == NULL || mp_obj == mp_const_none) return NULL;
-    mp_lv_obj_t *mp_lv_obj = MP_OBJ_TO_PTR(get_native_obj(mp_obj));
-    if (mp_lv_obj == NULL)
-        nlr_raise(
-            mp_obj_new_exception_msg(
-                &mp_type_SyntaxError, MP_ERROR_TEXT("'user_data' argument must be either a dict or None!")));
-    if (!mp_lv_obj->callbacks) mp_lv_obj->callbacks = mp_obj_new_dict(0);
-    return mp_lv_obj->callbacks;
-}
-
-static inline const mp_obj_type_t *get_BaseObj_type();
-
 static void mp_lv_delete_cb(lv_event_t * e)
 {
     LV_OBJ_T *lv_obj = e->current_target;
@@ -1223,25 +2467,64 @@ static void mp_lv_delete_cb(lv_event_t * e)
         if (self) {
             self->lv_obj = NULL;
         }
+        mp_lv_release_deleted(lv_obj);
+    }
+}
+
+// The "Delete" event callback is registered once per object, even when its Python object is replaced
+
+static bool has_delete_cb(LV_OBJ_T *lv_obj)
+{
+    uint32_t n_events = lv_obj_get_event_count(lv_obj);
+    for (uint32_t i = 0; i < n_events; i++) {
+        if (lv_event_dsc_get_cb(lv_obj_get_event_dsc(lv_obj, i)) == mp_lv_delete_cb)
+            return true;
+    }
+    return false;
+}
+
+// Find the object type of an lv_obj_class
+// mp_lv_obj_types is indexed by a hash table with open addressing, filled on first use.
+// Entries hold an mp_lv_obj_types index + 1, zero marks an empty entry.
+
+static inline size_t obj_class_hash(const lv_obj_class_t *lv_obj_class)
+{
+    return (((uint32_t)(uintptr_t)lv_obj_class * 2654435761u) >> 16) & (MP_LV_OBJ_TYPES_HASH_SIZE - 1);
+}
+
+static const mp_obj_type_t *get_obj_type(const lv_obj_class_t *lv_obj_class)
+{
+    static uint16_t obj_types_hash[MP_LV_OBJ_TYPES_HASH_SIZE];
+    static bool obj_types_hashed = false;
+
+    if (!obj_types_hashed) {
+        for (size_t index = 0; mp_lv_obj_types[index]; index++) {
+            const lv_obj_class_t *key = mp_lv_obj_types[index]->lv_obj_class;
+            if (!key) continue;
+            size_t i = obj_class_hash(key);
+            while (obj_types_hash[i] && mp_lv_obj_types[obj_types_hash[i] - 1]->lv_obj_class != key)
+                i = (i + 1) & (MP_LV_OBJ_TYPES_HASH_SIZE - 1);
+            if (!obj_types_hash[i]) obj_types_hash[i] = index + 1; // The first type of a class is used
+        }
+        obj_types_hashed = true;
     }
+
+    for (size_t i = obj_class_hash(lv_obj_class); obj_types_hash[i]; i = (i + 1) & (MP_LV_OBJ_TYPES_HASH_SIZE - 1)) {
+        const mp_lv_obj_type_t *obj_type = mp_lv_obj_types[obj_types_hash[i] - 1];
+        if (obj_type->lv_obj_class == lv_obj_class)
+            return obj_type->mp_obj_type;
+    }
+    return get_BaseObj_type();
 }
 
-static inline mp_obj_t lv_to_mp(LV_OBJ_T *lv_obj)
+GENMPY_STATIC_INLINE mp_obj_t lv_to_mp(LV_OBJ_T *lv_obj)
 {
     if (lv_obj == NULL) return mp_const_none;
     mp_lv_obj_t *self = (mp_lv_obj_t*)lv_obj->user_data;
     if (!self)
     {
         // Find the object type
-        const mp_obj_type_t *mp_obj_type = get_BaseObj_type();
-        const lv_obj_class_t *lv_obj_class = lv_obj_get_class(lv_obj);
-        const mp_lv_obj_type_t **iter = &mp_lv_obj_types[0];
-        for (; *iter; iter++) {
-            if ((*iter)->lv_obj_class == lv_obj_class) {
-                mp_obj_type = (*iter)->mp_obj_type;
-                break;
-            }
-        }
+        const mp_obj_type_t *mp_obj_type = get_obj_type(lv_obj_get_class(lv_obj));
 
         // Create the MP object
         self = m_new_obj(mp_lv_obj_t);
@@ -1253,15 +2536,15 @@ static inline mp_obj_t lv_to_mp(LV_OBJ_T *lv_obj)
 
         // Register the Python object in user_data
         lv_obj->user_data = self;
+        MP_LV_PIN(lv_obj, MP_OBJ_FROM_PTR(self));
 
         // Register a "Delete" event callback
-        lv_obj_add_event_cb(lv_obj, mp_lv_delete_cb, LV_EVENT_DELETE, NULL);
+        if (!has_delete_cb(lv_obj))
+            lv_obj_add_event_cb(lv_obj, mp_lv_delete_cb, LV_EVENT_DELETE, NULL);
     }
     return MP_OBJ_FROM_PTR(self);
 }
 
-static void* mp_to_ptr(mp_obj_t self_in);
-
 static mp_obj_t cast_obj_type(const mp_obj_type_t* type, mp_obj_t obj)
 {
     mp_lv_obj_t *self = m_new_obj(mp_lv_obj_t);
@@ -1279,7 +2562,7 @@ static mp_obj_t cast_obj(mp_obj_t type_obj, mp_obj_t obj)
     return cast_obj_type((const mp_obj_type_t *)type_obj, obj);
 }
 
-static mp_obj_t make_new(
+GENMPY_STATIC mp_obj_t make_new(
     const mp_lv_obj_fun_builtin_var_t *lv_obj_var,
     const mp_obj_type_t *type,
     size_t n_args,
@@ -1306,19 +2589,9 @@ static mp_obj_t make_new(
 }
 
 static MP_DEFINE_CONST_FUN_OBJ_2(cast_obj_obj, cast_obj);
-static MP_DEFINE_CONST_CLASSMETHOD_OBJ(cast_obj_class_method, MP_ROM_PTR(&cast_obj_obj));
+GENMPY_STATIC MP_DEFINE_CONST_CLASSMETHOD_OBJ(cast_obj_class_method, MP_ROM_PTR(&cast_obj_obj));
 
-static mp_int_t mp_lv_obj_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags) {
-    (void)flags;
-    mp_lv_obj_t *self = MP_OBJ_TO_PTR(self_in);
-
-    bufinfo->buf = &self->lv_obj;
-    bufinfo->len = sizeof(self->lv_obj);
-    bufinfo->typecode = BYTEARRAY_TYPECODE;
-    return 0;
-}
-
-static mp_obj_t mp_lv_obj_binary_op(mp_binary_op_t op, mp_obj_t lhs_in, mp_obj_t rhs_in)
+GENMPY_STATIC mp_obj_t mp_lv_obj_binary_op(mp_binary_op_t op, mp_obj_t lhs_in, mp_obj_t rhs_in)
 {
     mp_lv_obj_t *lhs = MP_OBJ_TO_PTR(lhs_in);
     mp_lv_obj_t *rhs = MP_OBJ_TO_PTR(rhs_in);
@@ -1366,6 +2639,7 @@ void mp_lv_deinit_gc()
     mp_lv_user_data = MP_STATE_VM(mp_lv_user_data) = NULL;
     mp_lv_roots_initialized = MP_STATE_VM(mp_lv_roots_initialized) = 0;
     lvgl_mod_initialized = MP_STATE_VM(lvgl_mod_initialized) = 0;
+    mp_lv_deinit_roots();
 
 }
 
@@ -1378,7 +2652,7 @@ static mp_obj_t lvgl_mod___init__(void) {
     }
     return mp_const_none;
 }
-static MP_DEFINE_CONST_FUN_OBJ_0(lvgl_mod___init___obj, lvgl_mod___init__);
+GENMPY_STATIC MP_DEFINE_CONST_FUN_OBJ_0(lvgl_mod___init___obj, lvgl_mod___init__);
 
 
 static mp_obj_t lvgl_mod___del__(void) {
@@ -1387,42 +2661,129 @@ static mp_obj_t lvgl_mod___del__(void) {
     }
     return mp_const_none;
 }
-static MP_DEFINE_CONST_FUN_OBJ_0(lvgl_mod___del___obj, lvgl_mod___del__);
-
-#else // LV_OBJ_T
+GENMPY_STATIC MP_DEFINE_CONST_FUN_OBJ_0(lvgl_mod___del___obj, lvgl_mod___del__);
 
-typedef struct mp_lv_obj_type_t {
-    mp_obj_type_t *mp_obj_type;
-} mp_lv_obj_type_t;
+// Set aside the callback tables of a deleted object, and its Python object with MP_LV_PIN_REFS,
+// to be released after the deletion
 
+GENMPY_STATIC void mp_lv_release_deleted(LV_OBJ_T *lv_obj)
+{
+    mp_lv_callbacks_pool_t *pool = mp_lv_get_callbacks_pool();
+#if MP_LV_PIN_REFS
+    mp_obj_t self = mp_lv_unpin(lv_obj);
+    if (self != MP_OBJ_NULL) mp_lv_set_aside(pool, self);
 #endif
+    uint32_t n_events = lv_obj_get_event_count(lv_obj);
+    for (uint32_t i = 0; i < n_events; i++) {
+        lv_event_dsc_t *event_dsc = lv_obj_get_event_dsc(lv_obj, i);
+        void *user_data = lv_event_dsc_get_user_data(event_dsc);
+        // Only look into user_data allocated on the heap, since it could be any pointer
+        if (!user_data || !gc_nbytes(user_data) || !MP_OBJ_IS_TYPE(MP_OBJ_FROM_PTR(user_data), &mp_lv_callbacks_type))
+            continue;
+        mp_lv_callbacks_t *callbacks = user_data;
+        MP_LV_PINNING(mp_lv_unpin_callbacks(callbacks));
+        if (!callbacks->recyclable) continue;
+        // Without MP_LV_PIN_REFS, the tables which are not set aside are freed by the GC
+        if (!MP_LV_PIN_REFS && pool->n_deleted == MP_LV_CALLBACKS_POOL_SIZE) break;
+        callbacks->recyclable = false;
+        mp_lv_set_aside(pool, MP_OBJ_FROM_PTR(callbacks));
+    }
+    if (pool->n_deleted && !pool->release_pending) {
+        pool->release_pending = lv_async_call(mp_lv_release_set_aside, NULL) == LV_RESULT_OK;
+    }
+}
 
-static inline mp_obj_t convert_to_bool(bool b)
+#if MP_LV_PIN_REFS
+
+// The hooks releasing the callback tables of the other LVGL structs, when LVGL frees them.
+// A running animation is a copy of the one started from Python, freed by LVGL when it ends or is deleted.
+// Its deleted_cb is replaced by a hook which unpins its table and calls the replaced deleted_cb.
+
+static void mp_lv_anim_deleted(lv_anim_t *a)
 {
-    return b? mp_const_true: mp_const_false;
+    mp_lv_callbacks_t *callbacks = a->user_data;
+    lv_anim_deleted_cb_t deleted_cb = callbacks->deleted_cb;
+    mp_lv_unpin_callbacks(callbacks);
+    if (deleted_cb) deleted_cb(a);
 }
 
-static inline mp_obj_t convert_to_str(const char *str)
+GENMPY_STATIC void mp_lv_pin_anim(lv_anim_t *a)
 {
-    return str? mp_obj_new_str(str, strlen(str)): mp_const_none;
+    if (!a || !mp_lv_pin_callbacks(a->user_data)) return;
+    mp_lv_callbacks_t *callbacks = a->user_data;
+    if (a->deleted_cb != mp_lv_anim_deleted) {
+        callbacks->deleted_cb = a->deleted_cb;
+        a->deleted_cb = mp_lv_anim_deleted;
+    }
 }
 
-static inline const char *convert_from_str(mp_obj_t str)
+GENMPY_STATIC void mp_lv_release_timer(lv_timer_t *timer)
 {
-    if (str == NULL || str == mp_const_none)
-        return NULL;
+    mp_lv_unpin_callbacks(lv_timer_get_user_data(timer));
+}
 
-    if (MP_OBJ_IS_TYPE(str, &mp_type_bytearray) ||
-        MP_OBJ_IS_TYPE(str, &mp_type_memoryview)) {
-            mp_buffer_info_t buffer_info;
-            if (mp_get_buffer(str, &buffer_info, MP_BUFFER_READ)) {
-                return buffer_info.buf;
-            }
-    }
+// LVGL deletes a timer once the callback of its last repeat returns, unless the callback deleted it already
 
-    return mp_obj_str_get_str(str);
+GENMPY_STATIC void mp_lv_timer_called(lv_timer_t *timer)
+{
+    lv_timer_t *next = lv_timer_get_next(NULL);
+    while (next && next != timer) next = lv_timer_get_next(next);
+    if (next && timer->repeat_count == 0 && timer->auto_delete) mp_lv_release_timer(timer);
+}
+
+// Removing event callbacks unpins the tables of all the events of their owner before the call,
+// and pins those of the remaining events again after it
+
+static inline void mp_lv_pin_event_dsc(lv_event_dsc_t *dsc, bool pin)
+{
+    void *user_data = lv_event_dsc_get_user_data(dsc);
+    if (pin) mp_lv_pin_callbacks(user_data);
+    else mp_lv_unpin_callbacks(user_data);
 }
 
+GENMPY_STATIC void mp_lv_pin_obj_events(LV_OBJ_T *lv_obj, bool pin)
+{
+    uint32_t n_events = lv_obj_get_event_count(lv_obj);
+    for (uint32_t i = 0; i < n_events; i++) mp_lv_pin_event_dsc(lv_obj_get_event_dsc(lv_obj, i), pin);
+}
+
+GENMPY_STATIC void mp_lv_pin_display_events(lv_display_t *disp, bool pin)
+{
+    uint32_t n_events = lv_display_get_event_count(disp);
+    for (uint32_t i = 0; i < n_events; i++) mp_lv_pin_event_dsc(lv_display_get_event_dsc(disp, i), pin);
+}
+
+GENMPY_STATIC void mp_lv_pin_indev_events(lv_indev_t *indev, bool pin)
+{
+    uint32_t n_events = lv_indev_get_event_count(indev);
+    for (uint32_t i = 0; i < n_events; i++) mp_lv_pin_event_dsc(lv_indev_get_event_dsc(indev, i), pin);
+}
+
+GENMPY_STATIC void mp_lv_release_display(lv_display_t *disp)
+{
+    mp_lv_unpin_callbacks(lv_display_get_user_data(disp));
+    mp_lv_pin_display_events(disp, false);
+}
+
+GENMPY_STATIC void mp_lv_release_indev(lv_indev_t *indev)
+{
+    mp_lv_unpin_callbacks(lv_indev_get_user_data(indev));
+    mp_lv_pin_indev_events(indev, false);
+}
+
+GENMPY_STATIC void mp_lv_release_observer(lv_observer_t *observer)
+{
+    mp_lv_unpin_callbacks(lv_observer_get_user_data(observer));
+}
+
+#endif // MP_LV_PIN_REFS
+
+#endif // LV_OBJ_T
+"""
+)
+
+print_runtime(
+    """
 // struct handling
 
 static mp_lv_struct_t *mp_to_lv_struct(mp_obj_t mp_obj)
@@ -1447,7 +2808,110 @@ static inline size_t get_lv_struct_size(const mp_obj_type_t *type)
     }
 }
 
-static mp_obj_t make_new_lv_struct(
+static inline const mp_lv_struct_fields_t *get_lv_struct_fields(const mp_obj_type_t *type)
+{
+    mp_obj_dict_t *self = MP_OBJ_TO_PTR(MP_OBJ_TYPE_GET_SLOT(type, locals_dict));
+    mp_map_elem_t *elem = mp_map_lookup(&self->map, MP_OBJ_NEW_QSTR(MP_QSTR___FIELDS__), MP_MAP_LOOKUP);
+    return elem? MP_OBJ_TO_PTR(elem->value): NULL;
+}
+
+static unsigned long long mp_obj_get_ull(mp_obj_t obj);
+
+static void set_struct_field(mp_obj_t mp_struct, const mp_obj_type_t *type, qstr name,
+    const mp_lv_struct_field_t *field, mp_obj_t value)
+{
+    byte *addr = field? (byte*)((mp_lv_struct_t*)MP_OBJ_TO_PTR(mp_struct))->data + field->offset: NULL;
+    unsigned long long uval;
+    switch (field? field->kind: MP_LV_FIELD_ATTR) {
+        case MP_LV_FIELD_INT:
+            uval = (unsigned long long)mp_obj_get_int(value);
+            break;
+        case MP_LV_FIELD_ULL:
+            uval = mp_obj_get_ull(value);
+            break;
+        case MP_LV_FIELD_BOOL:
+            *(bool*)addr = mp_obj_is_true(value);
+            return;
+        case MP_LV_FIELD_FLOAT:
+            if (field->size == sizeof(float)) *(float*)addr = mp_obj_get_float(value);
+            else *(double*)addr = mp_obj_get_float(value);
+            return;
+        case MP_LV_FIELD_STRUCT:
+            memcpy(addr, mp_to_lv_struct(cast(value, field->type))->data, field->size);
+            return;
+        default: {
+            mp_obj_t dest[] = {MP_OBJ_SENTINEL, value};
+            MP_OBJ_TYPE_GET_SLOT(type, attr)(mp_struct, name, dest);
+            if (dest[0]) nlr_raise(
+                mp_obj_new_exception_msg_varg(
+                    &mp_type_SyntaxError, MP_ERROR_TEXT("Cannot set field %s on struct %s!"), qstr_str(name), qstr_str(type->name)));
+            return;
+        }
+    }
+    switch (field->size) {
+        case 1: *(uint8_t*)addr = uval; break;
+        case 2: *(uint16_t*)addr = uval; break;
+        case 4: *(uint32_t*)addr = uval; break;
+        default: *(uint64_t*)addr = uval; break;
+    }
+}
+
+// Initialize the fields of a struct from a dict (by name) or a tuple (in declaration order)
+
+static void init_struct(mp_obj_t mp_struct, const mp_obj_type_t *type, mp_obj_t init)
+{
+    const mp_lv_struct_fields_t *fields = get_lv_struct_fields(type);
+    size_t n_fields = fields? fields->n_fields: 0;
+    if (MP_OBJ_IS_TYPE(init, &mp_type_tuple)) {
+        size_t len;
+        mp_obj_t *items;
+        mp_obj_tuple_get(init, &len, &items);
+        if (len > n_fields) nlr_raise(
+            mp_obj_new_exception_msg_varg(
+                &mp_type_TypeError, MP_ERROR_TEXT("Struct %s has %d fields, got %d values!"), qstr_str(type->name), (int)n_fields, (int)len));
+        for (size_t i = 0; i < len; i++) {
+            set_struct_field(mp_struct, type, fields->fields[i].name, &fields->fields[i], items[i]);
+        }
+        return;
+    }
+    mp_map_t *map = mp_obj_dict_get_map(init);
+    for (size_t i = 0; i < map->alloc; i++) {
+        if (!mp_map_slot_is_filled(map, i)) continue;
+        qstr name = mp_obj_str_get_qstr(map->table[i].key);
+        const mp_lv_struct_field_t *field = NULL;
+        for (size_t j = 0; j < n_fields; j++) {
+            if (fields->fields[j].name == name) {
+                field = &fields->fields[j];
+                break;
+            }
+        }
+        set_struct_field(mp_struct, type, name, field, map->table[i].value);
+    }
+}
+
+static void mp_lv_struct_fields_print(const mp_print_t *print,
+    mp_obj_t self_in,
+    mp_print_kind_t kind)
+{
+    mp_lv_struct_fields_t *self = MP_OBJ_TO_PTR(self_in);
+    mp_print_str(print, "struct fields (");
+    for (size_t i = 0; i < self->n_fields; i++) {
+        mp_printf(print, i? ", %q": "%q", self->fields[i].name);
+    }
+    mp_print_str(print, ")");
+}
+
+GENMPY_RUNTIME MP_DEFINE_CONST_OBJ_TYPE(
+    mp_lv_struct_fields_type,
+    MP_QSTR_StructFields,
+    MP_TYPE_FLAG_NONE,
+    print, mp_lv_struct_fields_print
+);
+
+// A struct can be created empty, as an array of count structs, as a copy of another struct,
+// or from a dict or a tuple of its field values
+
+GENMPY_RUNTIME mp_obj_t make_new_lv_struct(
     const mp_obj_type_t *type,
     size_t n_args,
     size_t n_kw,
@@ -1460,7 +2924,8 @@ static mp_obj_t make_new_lv_struct(
     size_t size = get_lv_struct_size(type);
     mp_arg_check_num(n_args, n_kw, 0, 1, false);
     mp_lv_struct_t *self = m_new_obj(mp_lv_struct_t);
-    mp_lv_struct_t *other = (n_args > 0) && (!mp_obj_is_int(args[0])) ? mp_to_lv_struct(cast(args[0], type)): NULL;
+    bool is_init = (n_args > 0) && (MP_OBJ_IS_TYPE(args[0], &mp_type_dict) || MP_OBJ_IS_TYPE(args[0], &mp_type_tuple));
+    mp_lv_struct_t *other = (n_args > 0) && (!mp_obj_is_int(args[0])) && !is_init ? mp_to_lv_struct(cast(args[0], type)): NULL;
     size_t count = (n_args > 0) && (mp_obj_is_int(args[0]))? mp_obj_get_int(args[0]): 1;
     *self = (mp_lv_struct_t){
         .base = {type},
@@ -1473,10 +2938,16 @@ static mp_obj_t make_new_lv_struct(
             memset(self->data, 0, size * count);
         }
     }
+    if (is_init) {
+        if (!self->data) nlr_raise(
+            mp_obj_new_exception_msg_varg(
+                &mp_type_TypeError, MP_ERROR_TEXT("Struct %s has no known fields!"), qstr_str(type->name)));
+        init_struct(MP_OBJ_FROM_PTR(self), type, args[0]);
+    }
     return MP_OBJ_FROM_PTR(self);
 }
 
-static mp_obj_t lv_struct_binary_op(mp_binary_op_t op, mp_obj_t lhs_in, mp_obj_t rhs_in)
+GENMPY_RUNTIME mp_obj_t lv_struct_binary_op(mp_binary_op_t op, mp_obj_t lhs_in, mp_obj_t rhs_in)
 {
     mp_lv_struct_t *lhs = MP_OBJ_TO_PTR(lhs_in);
     mp_lv_struct_t *rhs = MP_OBJ_TO_PTR(rhs_in);
@@ -1491,7 +2962,7 @@ static mp_obj_t lv_struct_binary_op(mp_binary_op_t op, mp_obj_t lhs_in, mp_obj_t
     }
 }
 
-static mp_obj_t lv_struct_subscr(mp_obj_t self_in, mp_obj_t index, mp_obj_t value)
+GENMPY_RUNTIME mp_obj_t lv_struct_subscr(mp_obj_t self_in, mp_obj_t index, mp_obj_t value)
 {
     mp_lv_struct_t *self = mp_to_lv_struct(self_in);
 
@@ -1514,23 +2985,18 @@ static mp_obj_t lv_struct_subscr(mp_obj_t self_in, mp_obj_t index, mp_obj_t valu
         return self_in;
     }
 
-    mp_lv_struct_t *element_at_index = m_new_obj(mp_lv_struct_t);
-    *element_at_index = (mp_lv_struct_t){
-        .base = {type},
-        .data = element_addr
-    };
-
     if (value != MP_OBJ_SENTINEL){
         mp_lv_struct_t *other = mp_to_lv_struct(cast(value, type));
         if ((!other) || (!other->data))
             return NULL;
-        memcpy(element_at_index->data, other->data, element_size);
+        memcpy(element_addr, other->data, element_size);
+        return mp_const_none;
     }
 
-    return MP_OBJ_FROM_PTR(element_at_index);
+    return mp_lv_struct_field(self_in, type, element_addr);
 }
 
-GENMPY_UNUSED static void *copy_buffer(const void *buffer, size_t size)
+GENMPY_UNUSED GENMPY_RUNTIME void *copy_buffer(const void *buffer, size_t size)
 {
     void *new_buffer = m_malloc(size);
     memcpy(new_buffer, buffer, size);
@@ -1539,18 +3005,76 @@ GENMPY_UNUSED static void *copy_buffer(const void *buffer, size_t size)
 
 // Reference an existing lv struct (or part of it)
 
-static mp_obj_t lv_to_mp_struct(const mp_obj_type_t *type, void *lv_struct)
+// When set, the next struct or array object is stored there, or reused if it's already there
+
+GENMPY_RUNTIME mp_obj_t *mp_lv_reuse_view = NULL;
+
+static void *new_view(const mp_obj_type_t *type, size_t size)
 {
-    if (lv_struct == NULL) return mp_const_none;
-    mp_lv_struct_t *self = m_new_obj(mp_lv_struct_t);
+    mp_obj_t *reuse = mp_lv_reuse_view;
+    mp_lv_reuse_view = NULL;
+    if (!reuse) return m_malloc(size);
+    if (*reuse == MP_OBJ_NULL || ((mp_obj_base_t*)MP_OBJ_TO_PTR(*reuse))->type != type)
+        *reuse = MP_OBJ_FROM_PTR(m_malloc0(size));
+    return MP_OBJ_TO_PTR(*reuse);
+}
+
+GENMPY_RUNTIME mp_obj_t lv_to_mp_struct(const mp_obj_type_t *type, void *lv_struct)
+{
+    if (lv_struct == NULL) {
+        mp_lv_reuse_view = NULL;
+        return mp_const_none;
+    }
+    mp_lv_struct_t *self = new_view(type, sizeof(mp_lv_struct_t));
     *self = (mp_lv_struct_t){
         .base = {type},
         .data = lv_struct
     };
-    return MP_OBJ_FROM_PTR(self);
+    return MP_OBJ_FROM_PTR(self);
+}
+
+// A struct embedded in another struct (a field or an element) is read as a view into the other struct,
+// which it keeps alive, since the GC doesn't follow pointers into the middle of an allocation.
+// The last views are cached by address, so reading the same field of the same owner again doesn't allocate.
+// A cached view keeps its owner alive until it is replaced, or until LVGL is deinitialized
+
+typedef struct mp_lv_struct_view_t
+{
+    mp_lv_struct_t base;
+    mp_obj_t owner;
+} mp_lv_struct_view_t;
+
+#if MP_LV_OBJ_RUNTIME
+
+MP_REGISTER_ROOT_POINTER(mp_obj_t mp_lv_field_views[8]);
+#define MP_LV_FIELD_VIEWS_SIZE MP_ARRAY_SIZE(MP_STATE_VM(mp_lv_field_views)) // Power of 2
+
+#endif // MP_LV_OBJ_RUNTIME
+
+GENMPY_RUNTIME mp_obj_t mp_lv_struct_field(mp_obj_t owner, const mp_obj_type_t *type, void *field)
+{
+#if MP_LV_OBJ_RUNTIME
+    MP_STATIC_ASSERT((MP_LV_FIELD_VIEWS_SIZE & (MP_LV_FIELD_VIEWS_SIZE - 1)) == 0);
+    mp_obj_t *cached = &MP_STATE_VM(mp_lv_field_views)[((uintptr_t)field / sizeof(void *)) & (MP_LV_FIELD_VIEWS_SIZE - 1)];
+    if (*cached != MP_OBJ_NULL) {
+        // The same field address can belong to another owner, when the previous one wasn't allocated by the GC
+        mp_lv_struct_view_t *cached_view = MP_OBJ_TO_PTR(*cached);
+        if (cached_view->base.base.type == type && cached_view->base.data == field && cached_view->owner == owner)
+            return *cached;
+    }
+#endif
+    mp_lv_struct_view_t *view = m_new_obj(mp_lv_struct_view_t);
+    *view = (mp_lv_struct_view_t){
+        .base = {.base = {type}, .data = field},
+        .owner = owner
+    };
+#if MP_LV_OBJ_RUNTIME
+    *cached = MP_OBJ_FROM_PTR(view);
+#endif
+    return MP_OBJ_FROM_PTR(view);
 }
 
-static void call_parent_methods(mp_obj_t obj, qstr attr, mp_obj_t *dest)
+GENMPY_RUNTIME void call_parent_methods(mp_obj_t obj, qstr attr, mp_obj_t *dest)
 {
     const mp_obj_type_t *type = mp_obj_get_type(obj);
     while (MP_OBJ_TYPE_HAS_SLOT(type, locals_dict)) {
@@ -1571,36 +3095,58 @@ static void call_parent_methods(mp_obj_t obj, qstr attr, mp_obj_t *dest)
     }
 }
 
-// Convert dict to struct
+static void mp_lv_enum_print(const mp_print_t *print,
+    mp_obj_t self_in,
+    mp_print_kind_t kind)
+{
+    mp_lv_enum_t *self = MP_OBJ_TO_PTR(self_in);
+    mp_printf(print, "enum %q", self->name);
+}
 
-static mp_obj_t dict_to_struct(mp_obj_t dict, const mp_obj_type_t *type)
+static void mp_lv_enum_attr(mp_obj_t self_in, qstr attr, mp_obj_t *dest)
 {
-    mp_obj_t mp_struct = make_new_lv_struct(type, 0, 0, NULL);
-    mp_obj_t native_dict = cast(dict, &mp_type_dict);
-    mp_map_t *map = mp_obj_dict_get_map(native_dict);
-    if (map == NULL) return mp_const_none;
-    for (uint i = 0; i < map->alloc; i++) {
-        mp_obj_t key = map->table[i].key;
-        mp_obj_t value = map->table[i].value;
-        if (key != MP_OBJ_NULL) {
-            mp_obj_t dest[] = {MP_OBJ_SENTINEL, value};
-            MP_OBJ_TYPE_GET_SLOT(type, attr)(mp_struct, mp_obj_str_get_qstr(key), dest);
-            if (dest[0]) nlr_raise(
-                mp_obj_new_exception_msg_varg(
-                    &mp_type_SyntaxError, MP_ERROR_TEXT("Cannot set field %s on struct %s!"), qstr_str(mp_obj_str_get_qstr(key)), qstr_str(type->name)));
+    if (dest[0] != MP_OBJ_NULL) return; // Members are read only
+    mp_lv_enum_t *self = MP_OBJ_TO_PTR(self_in);
+    const mp_map_elem_t *members = (const mp_map_elem_t *)self->members;
+    const char *name = NULL;
+    size_t low = 0, high = self->n_members;
+    while (low < high) {
+        size_t mid = (low + high) / 2;
+        qstr member = MP_OBJ_QSTR_VALUE(members[mid].key);
+        if (member == attr) {
+            dest[0] = members[mid].value;
+            return;
         }
+        if (!name) name = qstr_str(attr);
+        if (strcmp(name, qstr_str(member)) < 0) high = mid;
+        else low = mid + 1;
     }
-    return mp_struct;
 }
 
+GENMPY_RUNTIME MP_DEFINE_CONST_OBJ_TYPE(
+    mp_lv_enum_type,
+    MP_QSTR_Enum,
+    MP_TYPE_FLAG_NONE,
+    print, mp_lv_enum_print,
+    attr, mp_lv_enum_attr
+);
+
+// Convert dict to struct
+
 // Convert mp object to ptr
 
-static void* mp_to_ptr(mp_obj_t self_in)
+static const mp_obj_type_t mp_lv_array_type;
+
+GENMPY_RUNTIME void* mp_to_ptr(mp_obj_t self_in)
 {
     mp_buffer_info_t buffer_info;
     if (self_in == NULL || self_in == mp_const_none)
         return NULL;
 
+    // The buffer of a C array holds its elements, not the pointer
+    if (MP_OBJ_IS_TYPE(self_in, &mp_lv_array_type))
+        return ((mp_lv_struct_t*)MP_OBJ_TO_PTR(self_in))->data;
+
 //    if (MP_OBJ_IS_INT(self_in))
 //        return (void*)mp_obj_get_int(self_in);
 
@@ -1646,7 +3192,7 @@ static void mp_blob_print(const mp_print_t *print,
     mp_printf(print, "Blob");
 }
 
-static mp_int_t mp_blob_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags) {
+GENMPY_RUNTIME mp_int_t mp_blob_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags) {
     (void)flags;
     mp_lv_struct_t *self = MP_OBJ_TO_PTR(self_in);
 
@@ -1666,7 +3212,12 @@ static mp_obj_t mp_blob_cast(size_t argc, const mp_obj_t *argv)
 {
     mp_obj_t self = argv[0];
     void *ptr = mp_to_ptr(self);
-    if (argc == 1) return MP_OBJ_FROM_PTR(ptr);
+    if (argc == 1) {
+        // A callback table is seen from Python as a dict of callbacks by name
+        if (ptr && MP_OBJ_IS_TYPE(MP_OBJ_FROM_PTR(ptr), &mp_lv_callbacks_type))
+            return mp_lv_callbacks_dict(ptr);
+        return MP_OBJ_FROM_PTR(ptr);
+    }
     mp_obj_t type = argv[1];
     if (!MP_OBJ_IS_TYPE(type, &mp_type_type))
         nlr_raise(
@@ -1696,7 +3247,7 @@ static MP_DEFINE_CONST_OBJ_TYPE(
 
 static const mp_lv_struct_t mp_lv_null_obj = { {&mp_blob_type}, NULL };
 
-static inline mp_obj_t ptr_to_mp(void *data)
+GENMPY_RUNTIME_INLINE mp_obj_t ptr_to_mp(void *data)
 {
     return lv_to_mp_struct(&mp_blob_type, data);
 }
@@ -1739,14 +3290,28 @@ static mp_obj_t mp_lv_dereference(size_t argc, const mp_obj_t *argv)
     size_t size = 0;
     if (size_in == mp_const_none){
         const mp_obj_type_t *type = self->base.type;
-        size = get_lv_struct_size(type);
+        size = MP_OBJ_IS_TYPE(self_in, &mp_lv_array_type)?
+            ((mp_lv_array_t*)self)->len * ((mp_lv_array_t*)self)->element_size:
+            get_lv_struct_size(type);
     } else {
         size = (size_t)mp_obj_get_int(size_in);
     }
     if (size == 0) return mp_const_none;
+
+    // A reused callback argument reuses its memoryview as well
+    mp_lv_array_t *array = MP_OBJ_IS_TYPE(self_in, &mp_lv_array_type)? (mp_lv_array_t*)self: NULL;
+    if (array && array->is_view && array->memview != MP_OBJ_NULL) {
+        mp_obj_array_t *view = MP_OBJ_TO_PTR(array->memview);
+        view->items = self->data;
+        view->len = size;
+        view->free = 0;
+        return array->memview;
+    }
+
     mp_obj_array_t *view = MP_OBJ_TO_PTR(mp_obj_new_memoryview(BYTEARRAY_TYPECODE,
         size, self->data));
     view->typecode |= 0x80; // used to indicate writable buffer
+    if (array && array->is_view) array->memview = MP_OBJ_FROM_PTR(view);
     return MP_OBJ_FROM_PTR(view);
 }
 
@@ -1754,49 +3319,368 @@ static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(mp_lv_dereference_obj, 1, 2, mp_lv_de
 
 // Callback function handling
 // Callback is either a callable object or a pointer. If it's a callable object, set user_data to the callback.
-// Multiple callbacks are kept per object/struct using a dict that associate callback name with callback object
-// In case of an lv_obj_t, user_data is mp_lv_obj_t which contains a member "callbacks" for that dict.
-// In case of a struct, user_data is a pointer to that dict directly
+// Multiple callbacks are kept per object/struct in a table (mp_lv_callbacks_t), where each callback kind has a slot
+// assigned by the generator, so a callback is found by its slot without a dict lookup.
+// In case of an lv_obj_t, user_data is mp_lv_obj_t which contains a member "callbacks" for that table.
+// In case of a struct, user_data is a pointer to that table directly.
+// A dict given as user_data from Python is kept in the table, and callbacks are also stored in it by name.
+// Casting a user_data Blob that points to a table returns that dict.
+
+GENMPY_RUNTIME MP_DEFINE_CONST_OBJ_TYPE(
+    mp_lv_callbacks_type,
+    MP_QSTR_callbacks,
+    MP_TYPE_FLAG_NONE
+);
+
+// The callback tables created for event callbacks are reused when their object is deleted.
+// They are set aside by the "Delete" event, and released together by a single async call after the deletion,
+// since the other "Delete" event callbacks of the object still use them.
+// A released table keeps its slots, and the objects wrapping callback arguments of each slot.
+// With MP_LV_PIN_REFS, the Python object of the deleted object and all its event callback tables are set aside
+// and unpinned, so they stay alive until released.
 
-static mp_obj_t get_callback_dict_from_user_data(void *user_data)
+#if MP_LV_OBJ_RUNTIME
+
+MP_REGISTER_ROOT_POINTER(void *mp_lv_callbacks_pool);
+#if MP_LV_PIN_REFS
+MP_REGISTER_ROOT_POINTER(mp_obj_t mp_lv_pinned);
+#endif
+
+GENMPY_RUNTIME mp_lv_callbacks_pool_t *mp_lv_get_callbacks_pool(void)
 {
-    if (user_data){
-        mp_obj_t obj = MP_OBJ_FROM_PTR(user_data);
-#ifdef LV_OBJ_T
-        return
-            MP_OBJ_IS_TYPE(obj, &mp_type_dict)? obj: // Handle the case of dict for a struct
-            mp_get_callbacks(obj); // Handle the case of mp_lv_obj_t for an lv_obj_t
-#else
-        return obj;
+    if (!MP_STATE_VM(mp_lv_callbacks_pool))
+        MP_STATE_VM(mp_lv_callbacks_pool) = m_new0(mp_lv_callbacks_pool_t, 1);
+    return MP_STATE_VM(mp_lv_callbacks_pool);
+}
+
+#if MP_LV_PIN_REFS
+
+// Owners are at least pointer aligned, so their address divided by the pointer size is a small int
+
+static inline mp_obj_t pin_key(const void *owner)
+{
+    return MP_OBJ_NEW_SMALL_INT((uintptr_t)owner / sizeof(void *));
+}
+
+GENMPY_RUNTIME void mp_lv_pin(const void *owner, mp_obj_t obj)
+{
+    if (MP_STATE_VM(mp_lv_pinned) == MP_OBJ_NULL)
+        MP_STATE_VM(mp_lv_pinned) = mp_obj_new_dict(0);
+    mp_obj_dict_store(MP_STATE_VM(mp_lv_pinned), pin_key(owner), obj);
+}
+
+GENMPY_RUNTIME mp_obj_t mp_lv_unpin(const void *owner)
+{
+    if (MP_STATE_VM(mp_lv_pinned) == MP_OBJ_NULL) return MP_OBJ_NULL;
+    mp_map_elem_t *elem = mp_map_lookup(mp_obj_dict_get_map(MP_STATE_VM(mp_lv_pinned)), pin_key(owner),
+        MP_MAP_LOOKUP_REMOVE_IF_FOUND);
+    if (!elem) return MP_OBJ_NULL;
+    mp_obj_t obj = elem->value;
+    elem->value = MP_OBJ_NULL;
+    return obj;
+}
+
+// Return the number of callback tables and objects pinned while LVGL holds them, reported by _pinned()
+
+GENMPY_RUNTIME mp_obj_t mp_lv_pinned_count(void)
+{
+    if (MP_STATE_VM(mp_lv_pinned) == MP_OBJ_NULL) return MP_OBJ_NEW_SMALL_INT(0);
+    return mp_obj_len(MP_STATE_VM(mp_lv_pinned));
+}
+
+// A callback table is pinned by its own address while LVGL structs hold it, and counts them.
+// It's pinned when it's handed to LVGL, and unpinned by the hooks called when LVGL frees these structs:
+// the deletion of an object, display or input device, the deletion or the last run of a timer,
+// the end of an animation, the call of an async callback, the removal of an event callback or an observer.
+// Tables of other LVGL structs (groups, themes...) stay pinned until lv.deinit().
+// Tables held by structs allocated by MicroPython, such as an lv.anim_t created from Python,
+// are scanned by the GC and aren't pinned.
+
+static inline mp_lv_callbacks_t *get_pinnable_callbacks(void *user_data)
+{
+    if (!user_data || !gc_nbytes(user_data) || !MP_OBJ_IS_TYPE(MP_OBJ_FROM_PTR(user_data), &mp_lv_callbacks_type))
+        return NULL;
+    return user_data;
+}
+
+GENMPY_RUNTIME bool mp_lv_pin_callbacks(void *user_data)
+{
+    mp_lv_callbacks_t *callbacks = get_pinnable_callbacks(user_data);
+    if (!callbacks) return false;
+    callbacks->n_pins++;
+    mp_lv_pin(callbacks, MP_OBJ_FROM_PTR(callbacks));
+    return true;
+}
+
+GENMPY_RUNTIME void mp_lv_unpin_callbacks(void *user_data)
+{
+    mp_lv_callbacks_t *callbacks = get_pinnable_callbacks(user_data);
+    if (!callbacks || !callbacks->n_pins) return;
+    if (--callbacks->n_pins == 0) mp_lv_unpin(callbacks);
+}
+
+// LVGL keeps a pointer to some of the arguments of object methods: the arrays converted from Python lists
+// (the map of a buttonmatrix, the points of a line...), styles and image sources.
+// These are kept by the Python object of the LVGL object, by key, until it's deleted.
+// Styles and image sources are kept by their address, so each one is kept once.
+
+GENMPY_RUNTIME void mp_lv_keep_ref(mp_obj_t obj, mp_obj_t key, mp_obj_t ref)
+{
+    if (obj == mp_const_none) return;
+    mp_lv_obj_t *self = MP_OBJ_TO_PTR(get_native_obj(obj));
+    if (self->refs == MP_OBJ_NULL)
+        self->refs = mp_obj_new_dict(1);
+    mp_obj_dict_store(self->refs, key, ref);
+}
+
+// The key of an array converted for an argument of an LVGL function.
+// It also holds the other pointer arguments, so calling the function again replaces the array only when
+// it targets the same thing (the same chart series...)
+
+GENMPY_RUNTIME mp_obj_t mp_lv_ref_key(const void *func, size_t index, size_t n, const void *const *args)
+{
+    mp_obj_t key = mp_obj_new_tuple(n + 2, NULL);
+    size_t len;
+    mp_obj_t *items;
+    mp_obj_tuple_get(key, &len, &items);
+    items[0] = mp_obj_new_int_from_uint((uintptr_t)func);
+    items[1] = MP_OBJ_NEW_SMALL_INT(index);
+    for (size_t i = 0; i < n; i++) {
+        items[i + 2] = mp_obj_new_int_from_uint((uintptr_t)args[i]);
+    }
+    return key;
+}
+
+#endif // MP_LV_PIN_REFS
+
+GENMPY_RUNTIME void mp_lv_set_aside(mp_lv_callbacks_pool_t *pool, mp_obj_t obj)
+{
+    if (pool->n_deleted == pool->max_deleted) {
+        size_t max_deleted = pool->max_deleted? pool->max_deleted * 2: 8;
+        pool->deleted = m_renew(mp_obj_t, pool->deleted, pool->max_deleted, max_deleted);
+        pool->max_deleted = max_deleted;
+    }
+    pool->deleted[pool->n_deleted++] = obj;
+}
+
+GENMPY_RUNTIME void mp_lv_release_set_aside(void *arg)
+{
+    (void)arg;
+    mp_lv_callbacks_pool_t *pool = mp_lv_get_callbacks_pool();
+    for (size_t i = 0; i < pool->n_deleted; i++) {
+        mp_obj_t obj = pool->deleted[i];
+        pool->deleted[i] = MP_OBJ_NULL;
+#if MP_LV_PIN_REFS
+        if (!MP_OBJ_IS_TYPE(obj, &mp_lv_callbacks_type)) {
+            // The Python object of a deleted LVGL object, which may still be referenced from Python
+            ((mp_lv_obj_t *)MP_OBJ_TO_PTR(obj))->refs = MP_OBJ_NULL;
+            continue;
+        }
+#endif
+        if (pool->n_free == MP_LV_CALLBACKS_POOL_SIZE || !MP_OBJ_IS_TYPE(obj, &mp_lv_callbacks_type)) continue;
+        mp_lv_callbacks_t *callbacks = MP_OBJ_TO_PTR(obj);
+        callbacks->dict = MP_OBJ_NULL;
+        for (size_t j = 0; j < callbacks->n_slots; j++) {
+            mp_lv_callback_slot_t *entry = &callbacks->slots[j];
+            entry->callback = MP_OBJ_NULL;
+            if (entry->views && entry->views->busy) entry->views = NULL;
+        }
+        pool->free[pool->n_free++] = callbacks;
+    }
+    pool->n_deleted = 0;
+    pool->release_pending = false;
+}
+
+GENMPY_RUNTIME void mp_lv_deinit_roots(void)
+{
+    MP_STATE_VM(mp_lv_callbacks_pool) = NULL;
+#if MP_LV_PIN_REFS
+    MP_STATE_VM(mp_lv_pinned) = MP_OBJ_NULL;
+#endif
+    memset(MP_STATE_VM(mp_lv_subclasses), 0, sizeof(MP_STATE_VM(mp_lv_subclasses)));
+    memset(MP_STATE_VM(mp_lv_field_views), 0, sizeof(MP_STATE_VM(mp_lv_field_views)));
+}
+
+#endif // MP_LV_OBJ_RUNTIME
+
+GENMPY_RUNTIME mp_lv_callbacks_t *mp_lv_new_callbacks(void *dict)
+{
+    mp_lv_callbacks_t *callbacks = NULL;
+#if MP_LV_OBJ_RUNTIME
+    mp_lv_callbacks_pool_t *pool = MP_STATE_VM(mp_lv_callbacks_pool);
+    if (pool && pool->n_free) {
+        callbacks = pool->free[--pool->n_free];
+        pool->free[pool->n_free] = NULL;
+        callbacks->dict = dict? MP_OBJ_FROM_PTR(dict): MP_OBJ_NULL;
+        return callbacks;
+    }
 #endif
+    callbacks = m_new_obj(mp_lv_callbacks_t);
+    *callbacks = (mp_lv_callbacks_t){
+        .base = {&mp_lv_callbacks_type},
+        .dict = dict? MP_OBJ_FROM_PTR(dict): MP_OBJ_NULL,
+        .n_slots = 0,
+        .recyclable = false,
+        .slots = NULL,
+    };
+    return callbacks;
+}
+
+GENMPY_RUNTIME mp_obj_t mp_lv_callbacks_dict(mp_lv_callbacks_t *callbacks)
+{
+    if (callbacks->dict == MP_OBJ_NULL) {
+        callbacks->dict = mp_obj_new_dict(callbacks->n_slots);
+        for (size_t i = 0; i < callbacks->n_slots; i++) {
+            if (callbacks->slots[i].callback != MP_OBJ_NULL)
+                mp_obj_dict_store(callbacks->dict, MP_OBJ_NEW_QSTR(callbacks->slots[i].name), callbacks->slots[i].callback);
+        }
+    }
+    return callbacks->dict;
+}
+
+static inline mp_lv_callbacks_t *mp_get_callbacks(mp_obj_t mp_obj)
+{
+    if (mp_obj == NULL || mp_obj == mp_const_none) return NULL;
+    mp_lv_obj_t *mp_lv_obj = MP_OBJ_TO_PTR(get_native_obj(mp_obj));
+    if (mp_lv_obj == NULL)
+        nlr_raise(
+            mp_obj_new_exception_msg(
+                &mp_type_SyntaxError, MP_ERROR_TEXT("'user_data' argument must be either a dict or None!")));
+    if (!mp_lv_obj->callbacks) mp_lv_obj->callbacks = mp_lv_new_callbacks(NULL);
+    return mp_lv_obj->callbacks;
+}
+
+static mp_lv_callbacks_t *get_callbacks_from_user_data(void *user_data)
+{
+    mp_obj_t obj = MP_OBJ_FROM_PTR(user_data);
+    if (!MP_OBJ_IS_TYPE(obj, &mp_lv_callbacks_type))
+        return mp_get_callbacks(obj); // Handle the case of mp_lv_obj_t for an lv_obj_t
+    return MP_OBJ_TO_PTR(obj);
+}
+
+static mp_lv_callback_slot_t *find_callback_slot(mp_lv_callbacks_t *callbacks, qstr callback_name, size_t slot)
+{
+    if (slot < callbacks->n_slots && callbacks->slots[slot].name == callback_name)
+        return &callbacks->slots[slot];
+
+    // The slot is taken by another callback kind, when the same user_data is shared by several owners
+    for (size_t i = 0; i < callbacks->n_slots; i++) {
+        if (callbacks->slots[i].name == callback_name)
+            return &callbacks->slots[i];
     }
     return NULL;
 }
 
-typedef void *(*mp_lv_get_user_data)(void *);
-typedef void (*mp_lv_set_user_data)(void *, void *);
+static void store_callback(mp_lv_callbacks_t *callbacks, qstr callback_name, size_t slot, mp_obj_t mp_callback)
+{
+    mp_lv_callback_slot_t *entry = find_callback_slot(callbacks, callback_name, slot);
+    if (!entry) {
+        // Use the assigned slot if it's free, otherwise the first free slot, otherwise grow the table.
+        // The slots of a recycled table keep their name without a callback, and are free as well
+        size_t n_slots = callbacks->n_slots;
+        if (slot < n_slots && callbacks->slots[slot].callback != MP_OBJ_NULL) {
+            for (slot = 0; slot < n_slots && callbacks->slots[slot].callback != MP_OBJ_NULL; slot++);
+        }
+        if (slot >= n_slots) {
+            callbacks->slots = m_renew(mp_lv_callback_slot_t, callbacks->slots, n_slots, slot + 1);
+            memset(&callbacks->slots[n_slots], 0, (slot + 1 - n_slots) * sizeof(mp_lv_callback_slot_t));
+            callbacks->n_slots = slot + 1;
+        }
+        entry = &callbacks->slots[slot];
+        entry->name = callback_name;
+        entry->views = NULL; // Could wrap the arguments of another callback kind
+    }
+    entry->callback = mp_callback;
+    if (callbacks->dict != MP_OBJ_NULL)
+        mp_obj_dict_store(callbacks->dict, MP_OBJ_NEW_QSTR(callback_name), mp_callback);
+}
+
+// Objects wrapping the arguments are only reused when the callback isn't already running,
+// otherwise a nested call would change the arguments of the outer call.
+// They are marked busy by mp_lv_call_with_views, so a failed argument conversion doesn't leave them busy
+
+static mp_lv_callback_views_t *acquire_views(mp_lv_callback_slot_t *entry, size_t n_views)
+{
+    if (!entry->views)
+        entry->views = m_malloc0(sizeof(mp_lv_callback_views_t) + n_views * sizeof(mp_obj_t));
+    else if (entry->views->busy)
+        return NULL;
+    return entry->views;
+}
+
+// Call a callback, with the objects wrapping its arguments busy until it returns or raises
+
+GENMPY_RUNTIME mp_obj_t mp_lv_call_with_views(mp_obj_t callback, size_t n_args, const mp_obj_t *args,
+     mp_lv_callback_views_t *views)
+{
+    if (!views) return mp_call_function_n_kw(callback, n_args, 0, args);
+    views->busy = true;
+    nlr_buf_t nlr;
+    if (nlr_push(&nlr) == 0) {
+        mp_obj_t result = mp_call_function_n_kw(callback, n_args, 0, args);
+        nlr_pop();
+        views->busy = false;
+        return result;
+    }
+    views->busy = false;
+    nlr_jump(nlr.ret_val);
+}
 
-static void *mp_lv_callback(mp_obj_t mp_callback, void *lv_callback, qstr callback_name,
+GENMPY_RUNTIME mp_obj_t mp_lv_get_callback(void *user_data, qstr callback_name, size_t slot,
+     size_t n_views, mp_lv_callback_views_t **views)
+{
+    if (views) *views = NULL;
+    if (user_data) {
+        mp_obj_t obj = MP_OBJ_FROM_PTR(user_data);
+        if (MP_OBJ_IS_TYPE(obj, &mp_type_dict))
+            return mp_obj_dict_get(obj, MP_OBJ_NEW_QSTR(callback_name)); // dict set as user_data directly from Python
+
+        mp_lv_callbacks_t *callbacks = get_callbacks_from_user_data(user_data);
+        mp_lv_callback_slot_t *entry = find_callback_slot(callbacks, callback_name, slot);
+        if (entry && entry->callback != MP_OBJ_NULL) {
+            if (views && n_views) *views = acquire_views(entry, n_views);
+            return entry->callback;
+        }
+        if (callbacks->dict != MP_OBJ_NULL)
+            return mp_obj_dict_get(callbacks->dict, MP_OBJ_NEW_QSTR(callback_name));
+    }
+    nlr_raise(mp_obj_new_exception_arg1(&mp_type_KeyError, MP_OBJ_NEW_QSTR(callback_name)));
+}
+
+// containing_struct is the struct whose user_data holds the callback table, if any.
+// Its user_data is accessed by get_user_data and set_user_data when user_data_ptr is NULL.
+
+GENMPY_RUNTIME void *mp_lv_callback(mp_obj_t mp_callback, void *lv_callback, qstr callback_name, size_t slot,
      void **user_data_ptr, void *containing_struct, mp_lv_get_user_data get_user_data, mp_lv_set_user_data set_user_data)
 {
     if (lv_callback && mp_obj_is_callable(mp_callback)) {
         void *user_data = NULL;
         if (user_data_ptr) {
-            // user_data is either a dict of callbacks in case of struct, or a pointer to mp_lv_obj_t in case of lv_obj_t
-            if (! (*user_data_ptr) ) *user_data_ptr = MP_OBJ_TO_PTR(mp_obj_new_dict(0)); // if it's NULL - it's a dict for a struct
+            // user_data is either a callback table in case of struct, or a pointer to mp_lv_obj_t in case of lv_obj_t
+            // if it's NULL or a dict - replace it with a callback table for a struct
+            if (!(*user_data_ptr) || MP_OBJ_IS_TYPE(MP_OBJ_FROM_PTR(*user_data_ptr), &mp_type_dict)) {
+                mp_lv_callbacks_t *callbacks = mp_lv_new_callbacks(*user_data_ptr);
+                callbacks->recyclable = true;
+                // A table passed as a function argument is pinned by that function, if LVGL keeps it
+                MP_LV_PINNING(if (containing_struct && !gc_nbytes(containing_struct)) mp_lv_pin_callbacks(callbacks));
+                *user_data_ptr = callbacks;
+            } else if (MP_OBJ_IS_TYPE(MP_OBJ_FROM_PTR(*user_data_ptr), &mp_lv_callbacks_type)) {
+                // Shared with another registration
+                ((mp_lv_callbacks_t *)*user_data_ptr)->recyclable = false;
+            }
             user_data = *user_data_ptr;
         }
         else if (get_user_data && set_user_data) {
             user_data = get_user_data(containing_struct);
-            if (!user_data) {
-                user_data = MP_OBJ_TO_PTR(mp_obj_new_dict(0));
+            if (!user_data || MP_OBJ_IS_TYPE(MP_OBJ_FROM_PTR(user_data), &mp_type_dict)) {
+                user_data = mp_lv_new_callbacks(user_data);
+                MP_LV_PINNING(if (!gc_nbytes(containing_struct)) mp_lv_pin_callbacks(user_data));
                 set_user_data(containing_struct, user_data);
             }
         }
 
         if (user_data) {
-            mp_obj_t callbacks = get_callback_dict_from_user_data(user_data);
-            mp_obj_dict_store(callbacks, MP_OBJ_NEW_QSTR(callback_name), mp_callback);
+            store_callback(get_callbacks_from_user_data(user_data), callback_name, slot, mp_callback);
         }
         return lv_callback;
     } else {
@@ -1804,19 +3688,16 @@ static void *mp_lv_callback(mp_obj_t mp_callback, void *lv_callback, qstr callba
     }
 }
 
-static int _nesting = 0;
+GENMPY_RUNTIME int _nesting = 0;
 
 // Function pointers wrapper
 
-static mp_obj_t mp_lv_funcptr(const mp_lv_obj_fun_builtin_var_t *mp_fun, void *lv_fun, void *lv_callback, qstr func_name, void *user_data)
+GENMPY_RUNTIME mp_obj_t mp_lv_funcptr(const mp_lv_obj_fun_builtin_var_t *mp_fun, void *lv_fun, void *lv_callback, qstr func_name, size_t slot, void *user_data)
 {
     if (lv_fun == NULL)
         return mp_const_none;
-    if (lv_fun == lv_callback) {
-        mp_obj_t callbacks = get_callback_dict_from_user_data(user_data);
-        if (callbacks)
-            return mp_obj_dict_get(callbacks, MP_OBJ_NEW_QSTR(func_name));
-    }
+    if (lv_fun == lv_callback && user_data)
+        return mp_lv_get_callback(user_data, func_name, slot, 0, NULL);
     mp_lv_obj_fun_builtin_var_t *funcptr = m_new_obj(mp_lv_obj_fun_builtin_var_t);
     *funcptr = *mp_fun;
     funcptr->lv_fun = lv_fun;
@@ -1839,13 +3720,6 @@ static unsigned long long mp_obj_get_ull(mp_obj_t obj)
 
 // Array of natives
 
-typedef struct mp_lv_array_t
-{
-    mp_lv_struct_t base;
-    size_t element_size;
-    bool is_signed;
-} mp_lv_array_t;
-
 static void mp_lv_array_print(const mp_print_t *print,
     mp_obj_t self_in,
     mp_print_kind_t kind)
@@ -1853,7 +3727,127 @@ static void mp_lv_array_print(const mp_print_t *print,
     mp_lv_array_t *self = MP_OBJ_TO_PTR(self_in);
     size_t element_size = self->element_size;
     bool is_signed = self->is_signed;
-    mp_printf(print, "C Array (%sint%d[])", is_signed? "": "u", element_size*8);
+    mp_printf(print, "C Array (%sint%d[", is_signed? "": "u", element_size*8);
+    if (self->len) mp_printf(print, "%u", (unsigned)self->len);
+    mp_printf(print, "])");
+}
+
+static byte lv_array_typecode(mp_lv_array_t *self)
+{
+    switch (self->element_size) {
+        case 1: return self->is_signed? 'b': 'B';
+        case 2: return self->is_signed? 'h': 'H';
+        case 4: return self->is_signed? 'i': 'I';
+        default: return self->is_signed? 'q': 'Q';
+    }
+}
+
+// A writable, typed memoryview of len elements starting at start. Elements are not copied
+
+static mp_obj_t lv_array_view(mp_lv_array_t *self, size_t start, size_t len)
+{
+    mp_obj_array_t *view = MP_OBJ_TO_PTR(mp_obj_new_memoryview(lv_array_typecode(self),
+        len, (byte*)self->base.data + self->element_size*start));
+    view->typecode |= 0x80; // used to indicate writable buffer
+    return MP_OBJ_FROM_PTR(view);
+}
+
+static mp_obj_t lv_array_load(mp_lv_array_t *self, size_t element_index)
+{
+    union {
+        long long val;
+        unsigned long long uval;
+    } element;
+    memset(&element, 0, sizeof(element));
+    memcpy(&element, (byte*)self->base.data + self->element_size*element_index, self->element_size);
+    if (self->is_signed && self->element_size < sizeof(element)) {
+        // sign extend
+        unsigned shift = 8 * (sizeof(element) - self->element_size);
+        element.val = (long long)(element.uval << shift) >> shift;
+    }
+    return self->is_signed? mp_obj_new_int_from_ll(element.val): mp_obj_new_int_from_ull(element.uval);
+}
+
+static void lv_array_store(mp_lv_array_t *self, size_t element_index, mp_obj_t value)
+{
+    union {
+        long long val;
+        unsigned long long uval;
+    } element;
+    if (!mp_obj_is_int(value)) {
+        nlr_raise(
+            mp_obj_new_exception_msg_varg(
+                &mp_type_SyntaxError, MP_ERROR_TEXT("Value '%s' must be an integer!"), mp_obj_get_type_str(value)));
+    }
+    element.uval = mp_obj_get_ull(value);
+    memcpy((byte*)self->base.data + self->element_size*element_index, &element, self->element_size);
+}
+
+static mp_int_t lv_array_slice_index(mp_lv_array_t *self, mp_obj_t index_in, mp_int_t def)
+{
+    if (index_in == mp_const_none) return def;
+    mp_int_t index = mp_obj_get_int(index_in);
+    if (index < 0) {
+        if (!self->len) nlr_raise(
+            mp_obj_new_exception_msg(
+                &mp_type_ValueError, MP_ERROR_TEXT("Array length is unknown, slice index must not be negative!")));
+        index += self->len;
+        if (index < 0) index = 0;
+    }
+    if (self->len && (size_t)index > self->len) index = self->len;
+    return index;
+}
+
+// Slices are zero-copy memoryviews of the elements, and can be assigned from a buffer or an iterable at once.
+// When the array length is unknown, a slice must have an end index, unless it's assigned to
+
+static mp_obj_t lv_array_subscr_slice(mp_lv_array_t *self, mp_obj_t index, mp_obj_t value)
+{
+    mp_obj_t start_in, stop_in, step_in;
+    mp_obj_slice_get(index, &start_in, &stop_in, &step_in);
+    if (step_in != mp_const_none && mp_obj_get_int(step_in) != 1) {
+        nlr_raise(
+            mp_obj_new_exception_msg(
+                &mp_type_NotImplementedError, MP_ERROR_TEXT("Only slices with step=1 are supported!")));
+    }
+    mp_int_t start = lv_array_slice_index(self, start_in, 0);
+
+    if (value == MP_OBJ_SENTINEL) {
+        if (stop_in == mp_const_none && !self->len) nlr_raise(
+            mp_obj_new_exception_msg(
+                &mp_type_ValueError, MP_ERROR_TEXT("Array length is unknown, slice must have an end index!")));
+        mp_int_t stop = lv_array_slice_index(self, stop_in, self->len);
+        return lv_array_view(self, start, stop > start? stop - start: 0);
+    }
+    if (value == MP_OBJ_NULL) return MP_OBJ_NULL; // delete is not supported
+
+    // A buffer of the same element type is copied at once, anything else is converted element by element
+    mp_buffer_info_t buffer_info;
+    size_t count;
+    bool is_buffer = mp_get_buffer(value, &buffer_info, MP_BUFFER_READ) &&
+        buffer_info.typecode == lv_array_typecode(self);
+    if (is_buffer) {
+        count = buffer_info.len / self->element_size;
+    } else {
+        count = mp_obj_get_int(mp_obj_len(value));
+    }
+    mp_int_t stop = lv_array_slice_index(self, stop_in, self->len? (mp_int_t)self->len: start + count);
+    if (stop < start) stop = start;
+    if ((size_t)(stop - start) != count) nlr_raise(
+        mp_obj_new_exception_msg(
+            &mp_type_ValueError, MP_ERROR_TEXT("Slice and assigned value lengths differ!")));
+
+    if (is_buffer) {
+        memmove((byte*)self->base.data + self->element_size*start, buffer_info.buf, buffer_info.len);
+    } else {
+        mp_obj_t iter = mp_getiter(value, NULL);
+        mp_obj_t item;
+        size_t i = start;
+        while ((item = mp_iternext(iter)) != MP_OBJ_STOP_ITERATION && i < (size_t)stop) {
+            lv_array_store(self, i++, item);
+        }
+    }
+    return mp_const_none;
 }
 
 static mp_obj_t lv_array_subscr(mp_obj_t self_in, mp_obj_t index, mp_obj_t value)
@@ -1862,41 +3856,82 @@ static mp_obj_t lv_array_subscr(mp_obj_t self_in, mp_obj_t index, mp_obj_t value
 
     if ((!self) || (!self->base.data))
         return NULL;
+    if (MP_OBJ_IS_TYPE(index, &mp_type_slice))
+        return lv_array_subscr_slice(self, index, value);
     if (!mp_obj_is_int(index)) {
         nlr_raise(
             mp_obj_new_exception_msg(
                 &mp_type_SyntaxError, MP_ERROR_TEXT("Subscript index must be an integer!")));
     }
 
-    size_t element_size = self->element_size;
-    size_t element_index = mp_obj_get_int(index);
-    void *element_addr = (byte*)self->base.data + element_size*element_index;
-    bool is_signed = self->is_signed;
-    union {
-        long long val;
-        unsigned long long uval;
-    } element;
-    memset(&element, 0, sizeof(element));
+    mp_int_t element_index = mp_obj_get_int(index);
+    if (self->len) {
+        if (element_index < 0) element_index += self->len;
+        if (element_index < 0 || (size_t)element_index >= self->len) nlr_raise(
+            mp_obj_new_exception_msg(
+                &mp_type_IndexError, MP_ERROR_TEXT("Array index out of range")));
+    }
 
     if (value == MP_OBJ_NULL){
-        memset(element_addr, 0, element_size);
+        memset((byte*)self->base.data + self->element_size*element_index, 0, self->element_size);
     }
     else if (value == MP_OBJ_SENTINEL){
-        memcpy(&element, element_addr, element_size);
-        return is_signed? mp_obj_new_int_from_ll(element.val): mp_obj_new_int_from_ull(element.uval);
+        return lv_array_load(self, element_index);
     } else {
-        if (!mp_obj_is_int(value)) {
-            nlr_raise(
-                mp_obj_new_exception_msg_varg(
-                    &mp_type_SyntaxError, MP_ERROR_TEXT("Value '%s' must be an integer!"), mp_obj_get_type_str(value)));
-        }
-        element.uval = mp_obj_get_ull(value);
-        memcpy(element_addr, &element, element_size);
+        lv_array_store(self, element_index, value);
+    }
+
+    return self_in;
+}
+
+static mp_obj_t lv_array_unary_op(mp_unary_op_t op, mp_obj_t self_in)
+{
+    mp_lv_array_t *self = MP_OBJ_TO_PTR(self_in);
+    switch (op) {
+        case MP_UNARY_OP_BOOL: return mp_const_true;
+        case MP_UNARY_OP_LEN: return self->len? MP_OBJ_NEW_SMALL_INT(self->len): MP_OBJ_NULL;
+        case MP_UNARY_OP_HASH: return MP_OBJ_NEW_SMALL_INT((mp_uint_t)self_in);
+        default: return MP_OBJ_NULL;
     }
+}
+
+static mp_obj_t lv_array_getiter(mp_obj_t self_in, mp_obj_iter_buf_t *iter_buf)
+{
+    mp_lv_array_t *self = MP_OBJ_TO_PTR(self_in);
+    if (!self->len) nlr_raise(
+        mp_obj_new_exception_msg(
+            &mp_type_TypeError, MP_ERROR_TEXT("Array length is unknown, use __set_len__ or a slice!")));
+    return mp_getiter(lv_array_view(self, 0, self->len), iter_buf);
+}
+
+// The buffer of an array with a known length holds its elements, typed by element size and signedness
+
+static mp_int_t lv_array_get_buffer(mp_obj_t self_in, mp_buffer_info_t *bufinfo, mp_uint_t flags)
+{
+    (void)flags;
+    mp_lv_array_t *self = MP_OBJ_TO_PTR(self_in);
+    if (!self->len || !self->base.data) return 1;
+    bufinfo->buf = self->base.data;
+    bufinfo->len = self->len * self->element_size;
+    bufinfo->typecode = lv_array_typecode(self);
+    return 0;
+}
+
+// Set the number of elements of an array, which enables len(), iteration and the buffer protocol
 
+static mp_obj_t lv_array_set_len(mp_obj_t self_in, mp_obj_t len_in)
+{
+    mp_lv_array_t *self = MP_OBJ_TO_PTR(self_in);
+    mp_int_t len = mp_obj_get_int(len_in);
+    if (len < 0) nlr_raise(
+        mp_obj_new_exception_msg(
+            &mp_type_ValueError, MP_ERROR_TEXT("Array length must not be negative!")));
+    self->len = len;
     return self_in;
 }
 
+static MP_DEFINE_CONST_FUN_OBJ_2(lv_array_set_len_obj, lv_array_set_len);
+
 static const mp_rom_map_elem_t mp_base_struct_locals_dict_table[] = {
     { MP_ROM_QSTR(MP_QSTR___cast__), MP_ROM_PTR(&mp_lv_cast_class_method) },
     { MP_ROM_QSTR(MP_QSTR___cast_instance__), MP_ROM_PTR(&mp_lv_cast_instance_obj) },
@@ -1905,7 +3940,16 @@ static const mp_rom_map_elem_t mp_base_struct_locals_dict_table[] = {
 
 static MP_DEFINE_CONST_DICT(mp_base_struct_locals_dict, mp_base_struct_locals_dict_table);
 
-static MP_DEFINE_CONST_OBJ_TYPE(
+static const mp_rom_map_elem_t mp_lv_array_locals_dict_table[] = {
+    { MP_ROM_QSTR(MP_QSTR___cast__), MP_ROM_PTR(&mp_lv_cast_class_method) },
+    { MP_ROM_QSTR(MP_QSTR___cast_instance__), MP_ROM_PTR(&mp_lv_cast_instance_obj) },
+    { MP_ROM_QSTR(MP_QSTR___dereference__), MP_ROM_PTR(&mp_lv_dereference_obj) },
+    { MP_ROM_QSTR(MP_QSTR___set_len__), MP_ROM_PTR(&lv_array_set_len_obj) },
+};
+
+static MP_DEFINE_CONST_DICT(mp_lv_array_locals_dict, mp_lv_array_locals_dict_table);
+
+GENMPY_RUNTIME MP_DEFINE_CONST_OBJ_TYPE(
     mp_lv_base_struct_type,
     MP_QSTR_Struct,
     MP_TYPE_FLAG_NONE,
@@ -1919,30 +3963,38 @@ static MP_DEFINE_CONST_OBJ_TYPE(
 static MP_DEFINE_CONST_OBJ_TYPE(
     mp_lv_array_type,
     MP_QSTR_C_Array,
-    MP_TYPE_FLAG_NONE,
+    MP_TYPE_FLAG_ITER_IS_GETITER,
     print, mp_lv_array_print,
+    unary_op, lv_array_unary_op,
     binary_op, lv_struct_binary_op,
     subscr, lv_array_subscr,
-    buffer, mp_blob_get_buffer,
-    locals_dict, &mp_base_struct_locals_dict
+    iter, lv_array_getiter,
+    buffer, lv_array_get_buffer,
+    locals_dict, &mp_lv_array_locals_dict
 );
 
-GENMPY_UNUSED static mp_obj_t mp_array_from_ptr(void *lv_arr, size_t element_size, bool is_signed)
+GENMPY_UNUSED GENMPY_RUNTIME mp_obj_t mp_array_from_ptr(void *lv_arr, size_t element_size, bool is_signed)
 {
-    mp_lv_array_t *self = m_new_obj(mp_lv_array_t);
+    bool is_view = mp_lv_reuse_view != NULL;
+    mp_lv_array_t *self = new_view(&mp_lv_array_type, sizeof(mp_lv_array_t));
+    mp_obj_t memview = is_view? self->memview: MP_OBJ_NULL;
     *self = (mp_lv_array_t){
         { {&mp_lv_array_type}, lv_arr },
         element_size,
-        is_signed
+        is_signed,
+        0,
+        is_view,
+        memview
     };
     return MP_OBJ_FROM_PTR(self);
 }
 
-GENMPY_UNUSED static void *mp_array_to_ptr(mp_obj_t *mp_arr, size_t element_size, GENMPY_UNUSED bool is_signed)
+GENMPY_UNUSED GENMPY_RUNTIME void *mp_array_to_ptr(mp_obj_t *mp_arr, size_t element_size, GENMPY_UNUSED bool is_signed)
 {
     if (MP_OBJ_IS_STR_OR_BYTES(mp_arr) ||
         MP_OBJ_IS_TYPE(mp_arr, &mp_type_bytearray) ||
-        MP_OBJ_IS_TYPE(mp_arr, &mp_type_memoryview)){
+        MP_OBJ_IS_TYPE(mp_arr, &mp_type_memoryview) ||
+        MP_OBJ_IS_TYPE(mp_arr, &mp_lv_array_type)){
             return mp_to_ptr(mp_arr);
     }
 
@@ -1967,27 +4019,39 @@ GENMPY_UNUSED static void *mp_array_to_ptr(mp_obj_t *mp_arr, size_t element_size
         memcpy(element_addr, &element, element_size);
         element_addr += element_size;
     }
-    return lv_arr;
-}
-
-#define MP_ARRAY_CONVERTOR(name, size, is_signed) \
-GENMPY_UNUSED static mp_obj_t mp_array_from_ ## name(void *lv_arr)\
-{\
-    return mp_array_from_ptr(lv_arr, size, is_signed);\
-}\
-GENMPY_UNUSED static void *mp_array_to_ ## name(mp_obj_t mp_arr)\
-{\
-    return mp_array_to_ptr(mp_arr, size, is_signed);\
+    return lv_arr;
+}
+
+// An array of structs can also be given as a packed buffer (array.array, bytearray, bytes or memoryview)
+// laid out like the C array. It's passed by pointer, without converting each element
+
+GENMPY_UNUSED GENMPY_RUNTIME bool mp_lv_packed_array(mp_obj_t mp_arr, size_t element_size, size_t alignment, void **lv_arr)
+{
+    if (!(MP_OBJ_IS_TYPE(mp_arr, &mp_type_bytes) ||
+        MP_OBJ_IS_TYPE(mp_arr, &mp_type_bytearray) ||
+#if MICROPY_PY_ARRAY
+        MP_OBJ_IS_TYPE(mp_arr, &mp_type_array) ||
+#endif
+        MP_OBJ_IS_TYPE(mp_arr, &mp_type_memoryview))){
+            return false;
+    }
+
+    mp_buffer_info_t buffer_info;
+    mp_get_buffer_raise(mp_arr, &buffer_info, MP_BUFFER_READ);
+    if (buffer_info.len % element_size) {
+        nlr_raise(
+            mp_obj_new_exception_msg_varg(
+                &mp_type_ValueError, MP_ERROR_TEXT("Buffer size must be a multiple of the struct size (%d)!"), (int)element_size));
+    }
+    *lv_arr = buffer_info.buf;
+    if ((uintptr_t)buffer_info.buf % alignment) {
+        // Unaligned memoryview, copy it
+        *lv_arr = m_malloc(buffer_info.len);
+        memcpy(*lv_arr, buffer_info.buf, buffer_info.len);
+    }
+    return true;
 }
 
-MP_ARRAY_CONVERTOR(u8ptr, 1, false)
-MP_ARRAY_CONVERTOR(i8ptr, 1, true)
-MP_ARRAY_CONVERTOR(u16ptr, 2, false)
-MP_ARRAY_CONVERTOR(i16ptr, 2, true)
-MP_ARRAY_CONVERTOR(u32ptr, 4, false)
-MP_ARRAY_CONVERTOR(i32ptr, 4, true)
-MP_ARRAY_CONVERTOR(u64ptr, 8, false)
-MP_ARRAY_CONVERTOR(i64ptr, 8, true)
 
 """
 )
@@ -1996,7 +4060,21 @@ MP_ARRAY_CONVERTOR(i64ptr, 8, true)
 # Add regular enums with integer values
 #
 
+begin_phase("enums")
+
+# Members of the enums selected by --flatten-enums are also module int constants (lv.EVENT_CLICKED),
+# which are found with a single lookup
+
+
+def is_enum_flattened(enum_name):
+    return any(
+        fnmatch.fnmatchcase(sanitize(get_enum_name(enum_name)), pattern)
+        for pattern in args.flatten_enums
+    )
+
+
 enums = collections.OrderedDict()
+flat_constants = []
 for enum_def in enum_defs:
     # Skip stdatomic.h memory_order, no bindings needed.
     if isinstance(enum_def, c_ast.TypeDecl) and enum_def.declname == "memory_order":
@@ -2029,6 +4107,8 @@ for enum_def in enum_defs:
             member_name = "_" + member_name
         if len(enum_name) > 0 and get_enum_name(enum_name) != "ENUM":
             enum[member_name] = "MP_ROM_INT(%s)" % member.name
+            if is_enum_flattened(enum_name):
+                flat_constants.append(member.name)
         else:
             int_constants.append(member.name)
     if len(enum) > 0:
@@ -2045,8 +4125,43 @@ for enum in [
     int_constants.append("%s_%s" % (enum, next(iter(enums[enum]))))
     del enums[enum]
 
+# Flattened constants don't replace enums or other constants with the same name
+global_constant_names = set(get_enum_name(enum_name) for enum_name in enums)
+global_constant_names.update(
+    get_enum_name(int_constant) for int_constant in int_constants
+)
+for flat_constant in flat_constants:
+    if get_enum_name(flat_constant) not in global_constant_names:
+        global_constant_names.add(get_enum_name(flat_constant))
+        int_constants.append(flat_constant)
+
+# Enums are needed when used directly, or as members of a generated object
+
+
+def is_enum_allowed(enum_name):
+    return is_name_allowed(get_enum_name(enum_name)) or any(
+        is_method_of(enum_name, obj_name) for obj_name in obj_names
+    )
+
+
+if allowlist_names is not None:
+    for enum_name in list(enums.keys()):
+        if not is_enum_allowed(enum_name):
+            drop_binding("enums", get_enum_name(enum_name))
+            del enums[enum_name]
+    for int_constant in int_constants:
+        if not is_name_allowed(get_enum_name(int_constant)):
+            drop_binding("int_constants", get_enum_name(int_constant))
+    int_constants = [
+        int_constant
+        for int_constant in int_constants
+        if is_name_allowed(get_enum_name(int_constant))
+    ]
+
 # Add special string enums
 
+begin_section("constants")
+
 print(
     """
 /*
@@ -2066,11 +4181,15 @@ for enum_def in enum_defs:
     enum_name = commonprefix(member_names)
     enum_name = "_".join(enum_name.split("_")[:-1])  # remove suffix
     enum = collections.OrderedDict()
+    if enum_name and not is_enum_allowed(enum_name):
+        drop_binding("enums", get_enum_name(enum_name))
+        continue
     if enum_name:
         for member in enum_def.type.values.enumerators:
             full_name = str_enum_to_str(member.name)
             member_name = full_name[len(enum_name) + 1 :]
             print("MP_DEFINE_STR_OBJ(mp_%s, %s);" % (full_name, full_name))
+            declare_extern("const mp_obj_str_t mp_%s;" % full_name)
             enum[member_name] = "&mp_%s" % full_name
         if len(enum) > 0:
             if enum_name in enums:
@@ -2219,6 +4338,7 @@ def get_user_data(
 generated_structs = collections.OrderedDict()
 generated_struct_functions = collections.OrderedDict()
 struct_aliases = collections.OrderedDict()
+generated_struct_fields = set()
 callbacks_used_on_structs = []
 
 
@@ -2234,6 +4354,59 @@ def flatten_struct(struct_decls):
     return result
 
 
+def get_field_kind(type_name, convertor):
+    # Kind and nested struct type of a struct field, for its descriptor
+    if convertor.endswith(")mp_obj_get_int"):
+        return "MP_LV_FIELD_INT", "NULL"
+    if convertor.endswith(")mp_obj_get_ull"):
+        return "MP_LV_FIELD_ULL", "NULL"
+    if convertor == "mp_obj_is_true":
+        return "MP_LV_FIELD_BOOL", "NULL"
+    if convertor.endswith(")mp_obj_get_float"):
+        return "MP_LV_FIELD_FLOAT", "NULL"
+    if type_name in generated_structs and convertor.startswith("mp_write_"):
+        return "MP_LV_FIELD_STRUCT", "&mp_%s_type" % sanitize(type_name)
+    return "MP_LV_FIELD_ATTR", "NULL"
+
+
+def gen_struct_fields(struct_name, struct_tag, fields):
+    sanitized_struct_name = sanitize(struct_name)
+    print(
+        """
+static const mp_lv_struct_field_t mp_{sanitized_struct_name}_field_table[] = {{
+    {fields}
+}};
+
+GENMPY_STATIC const mp_lv_struct_fields_t mp_{sanitized_struct_name}_fields = {{
+    {{ &mp_lv_struct_fields_type }},
+    {n_fields},
+    mp_{sanitized_struct_name}_field_table
+}};
+""".format(
+            sanitized_struct_name=sanitized_struct_name,
+            n_fields=len(fields),
+            fields=",\n    ".join(
+                "{{ MP_QSTR_{field}, {offset}, {size}, {kind}, {type} }}".format(
+                    field=sanitize(decl.name),
+                    offset="0"
+                    if kind == "MP_LV_FIELD_ATTR"
+                    else "offsetof(%s%s, %s)" % (struct_tag, struct_name, decl.name),
+                    size="0"
+                    if kind == "MP_LV_FIELD_ATTR"
+                    else "sizeof(((%s%s*)0)->%s)"
+                    % (struct_tag, struct_name, decl.name),
+                    kind=kind,
+                    type=field_type,
+                )
+                for decl, kind, field_type in fields
+            ),
+        )
+    )
+    declare_extern("const mp_lv_struct_fields_t mp_%s_fields;" % sanitized_struct_name)
+    generated_struct_fields.add(struct_name)
+
+
+@profiled
 def try_generate_struct(struct_name, struct):
     global lv_to_mp
     global mp_to_lv
@@ -2257,8 +4430,10 @@ def try_generate_struct(struct_name, struct):
     # print('!!! %s' % flatten_struct_decls)
     write_cases = []
     read_cases = []
+    fields = []
     for decl in flatten_struct_decls:
         # print('/* ==> decl %s: %s */' % (gen.visit(decl), decl))
+        fields.append((decl, "MP_LV_FIELD_ATTR", "NULL"))
         converted = try_generate_type(decl.type)
         type_name = get_type(decl.type, remove_quals=True)
         # print('/* --> %s: %s (%s)*/' % (decl.name, type_name, mp_to_lv[type_name] if type_name in mp_to_lv else '---'))
@@ -2267,7 +4442,7 @@ def try_generate_struct(struct_name, struct):
             parent_name = struct_name
             child_name = decl.type.declname
             type_name = "%s_%s_t" % (parent_name[:-2], child_name)
-            print(
+            print_header(
                 "typedef __typeof__( (({parent}*)(0))->{child} ) {new_struct};".format(
                     parent=parent_name, child=child_name, new_struct=type_name
                 )
@@ -2323,7 +4498,7 @@ def try_generate_struct(struct_name, struct):
                 full_user_data_ptr = "&%s" % full_user_data
                 lv_callback = "%s_%s_callback" % (struct_name, func_name)
                 print(
-                    "static %s %s_%s_callback(%s);"
+                    "GENMPY_STATIC %s %s_%s_callback(%s);"
                     % (
                         get_type(arg_type.type, remove_quals=False),
                         struct_name,
@@ -2346,22 +4521,28 @@ def try_generate_struct(struct_name, struct):
                         decl, "Missing 'user_data' member in struct '%s'" % struct_name
                     )
             write_cases.append(
-                "case MP_QSTR_{field}: data->{decl_name} = {cast}mp_lv_callback(dest[1], {lv_callback} ,MP_QSTR_{struct_name}_{field}, {user_data}, NULL, NULL, NULL); break; // converting to callback {type_name}".format(
+                "case MP_QSTR_{field}: data->{decl_name} = {cast}mp_lv_callback(dest[1], {lv_callback} ,MP_QSTR_{struct_name}_{field}, {slot}, {user_data}, data, NULL, NULL); break; // converting to callback {type_name}".format(
                     struct_name=struct_name,
                     field=sanitize(decl.name),
                     decl_name=decl.name,
                     lv_callback=lv_callback,
+                    slot=get_callback_slot(
+                        "%s_%s" % (struct_name, decl.name), struct_name
+                    ),
                     user_data=full_user_data_ptr,
                     type_name=type_name,
                     cast=cast,
                 )
             )
             read_cases.append(
-                "case MP_QSTR_{field}: dest[0] = mp_lv_funcptr(&mp_{funcptr}_mpobj, {cast}data->{decl_name}, {lv_callback} ,MP_QSTR_{struct_name}_{field}, {user_data}); break; // converting from callback {type_name}".format(
+                "case MP_QSTR_{field}: dest[0] = mp_lv_funcptr(&mp_{funcptr}_mpobj, {cast}data->{decl_name}, {lv_callback} ,MP_QSTR_{struct_name}_{field}, {slot}, {user_data}); break; // converting from callback {type_name}".format(
                     struct_name=struct_name,
                     field=sanitize(decl.name),
                     decl_name=decl.name,
                     lv_callback=lv_callback,
+                    slot=get_callback_slot(
+                        "%s_%s" % (struct_name, decl.name), struct_name
+                    ),
                     funcptr=lv_to_mp_funcptr[type_name],
                     user_data=full_user_data,
                     type_name=type_name,
@@ -2401,6 +4582,8 @@ def try_generate_struct(struct_name, struct):
                     )
                 )
             else:
+                if is_writeable and not decl.bitsize:
+                    fields[-1] = (decl,) + get_field_kind(type_name, mp_to_lv_convertor)
                 if is_writeable:
                     write_cases.append(
                         "case MP_QSTR_{field}: data->{decl_name} = {cast}{convertor}(dest[1]); break; // converting to {type_name}".format(
@@ -2412,15 +4595,20 @@ def try_generate_struct(struct_name, struct):
                         )
                     )
                 read_cases.append(
-                    "case MP_QSTR_{field}: dest[0] = {convertor}({cast}data->{decl_name}); break; // converting from {type_name}".format(
+                    "case MP_QSTR_{field}: dest[0] = {convertor}({owner}{cast}data->{decl_name}); break; // converting from {type_name}".format(
                         field=sanitize(decl.name),
                         decl_name=decl.name,
                         convertor=lv_to_mp_convertor,
+                        owner="self_in, " if type_name in lv_to_mp_byref else "",
                         type_name=type_name,
                         cast=cast,
                     )
                 )
-    print(
+    struct_tag = "struct " if struct_name in structs_without_typedef.keys() else ""
+    fields = [field for field in fields if field[0].name]
+    if fields:
+        gen_struct_fields(struct_name, struct_tag, fields)
+    print_header(
         """
 /*
  * Struct {struct_name}
@@ -2442,8 +4630,15 @@ static inline mp_obj_t mp_read_ptr_{sanitized_struct_name}(void *field)
 }}
 
 #define mp_read_{sanitized_struct_name}(field) mp_read_ptr_{sanitized_struct_name}(copy_buffer(&field, sizeof({struct_tag}{struct_name})))
-#define mp_read_byref_{sanitized_struct_name}(field) mp_read_ptr_{sanitized_struct_name}(&field)
-
+#define mp_read_byref_{sanitized_struct_name}(owner, field) mp_lv_struct_field(owner, get_mp_{sanitized_struct_name}_type(), &field)
+    """.format(
+            sanitized_struct_name=sanitized_struct_name,
+            struct_name=struct_name,
+            struct_tag=struct_tag,
+        )
+    )
+    print(
+        """
 static void mp_{sanitized_struct_name}_attr(mp_obj_t self_in, qstr attr, mp_obj_t *dest)
 {{
     mp_lv_struct_t *self = MP_OBJ_TO_PTR(self_in);
@@ -2478,9 +4673,9 @@ static void mp_{sanitized_struct_name}_print(const mp_print_t *print,
     mp_printf(print, "struct {struct_name}");
 }}
 
-static const mp_obj_dict_t mp_{sanitized_struct_name}_locals_dict;
+GENMPY_STATIC_DECL const mp_obj_dict_t mp_{sanitized_struct_name}_locals_dict;
 
-static MP_DEFINE_CONST_OBJ_TYPE(
+GENMPY_STATIC MP_DEFINE_CONST_OBJ_TYPE(
     mp_{sanitized_struct_name}_type,
     MP_QSTR_{sanitized_struct_name},
     MP_TYPE_FLAG_NONE,
@@ -2493,21 +4688,23 @@ static MP_DEFINE_CONST_OBJ_TYPE(
     buffer, mp_blob_get_buffer,
     parent, &mp_lv_base_struct_type
 );
-
-static inline const mp_obj_type_t *get_mp_{sanitized_struct_name}_type()
-{{
-    return &mp_{sanitized_struct_name}_type;
-}}
     """.format(
             sanitized_struct_name=sanitized_struct_name,
             struct_name=struct_name,
-            struct_tag="struct "
-            if struct_name in structs_without_typedef.keys()
-            else "",
+            struct_tag=struct_tag,
             write_cases=";\n                ".join(write_cases),
             read_cases=";\n            ".join(read_cases),
         )
     )
+    declare_extern("const mp_obj_type_t mp_%s_type;" % sanitized_struct_name)
+    print_header(
+        """
+static inline const mp_obj_type_t *get_mp_{sanitized_struct_name}_type()
+{{
+    return &mp_{sanitized_struct_name}_type;
+}}
+    """.format(sanitized_struct_name=sanitized_struct_name)
+    )
     lv_to_mp[struct_name] = "mp_read_%s" % sanitized_struct_name
     lv_to_mp_byref[struct_name] = "mp_read_byref_%s" % sanitized_struct_name
     mp_to_lv[struct_name] = "mp_write_%s" % sanitized_struct_name
@@ -2528,6 +4725,7 @@ static inline const mp_obj_type_t *get_mp_{sanitized_struct_name}_type()
 #
 
 
+@profiled
 def try_generate_array_type(type_ast):
     arr_name = get_name(type_ast)
     if arr_name in mp_to_lv:
@@ -2568,6 +4766,16 @@ def try_generate_array_type(type_ast):
     )
     arr_to_c_convertor_name = "mp_arr_to_%s" % array_convertor_suffix
     arr_to_mp_convertor_name = "mp_arr_from_%s" % array_convertor_suffix
+    struct_tag = "struct " if element_type in structs_without_typedef.keys() else ""
+    packed_array = (
+        (
+            "void *lv_packed_arr;\n"
+            "    if (mp_lv_packed_array(mp_arr, sizeof({type}), __alignof__({type}), &lv_packed_arr))\n"
+            "        return ({type} *)lv_packed_arr;"
+        ).format(type=struct_tag + element_type)
+        if element_type in structs
+        else ""
+    )
     print(
         (
             (
@@ -2576,8 +4784,9 @@ def try_generate_array_type(type_ast):
  * Array convertors for {arr_name}
  */
 
-GENMPY_UNUSED static {struct_tag}{type} *{arr_to_c_convertor_name}(mp_obj_t mp_arr)
+GENMPY_UNUSED GENMPY_STATIC {struct_tag}{type} *{arr_to_c_convertor_name}(mp_obj_t mp_arr)
 {{
+    {packed_array}
     mp_obj_t mp_len = mp_obj_len_maybe(mp_arr);
     if (mp_len == MP_OBJ_NULL) return mp_to_ptr(mp_arr);
     mp_int_t len = mp_obj_get_int(mp_len);
@@ -2595,7 +4804,7 @@ GENMPY_UNUSED static {struct_tag}{type} *{arr_to_c_convertor_name}(mp_obj_t mp_a
             )
             + (
                 """
-GENMPY_UNUSED static mp_obj_t {arr_to_mp_convertor_name}({qualified_type} *arr)
+GENMPY_UNUSED GENMPY_STATIC mp_obj_t {arr_to_mp_convertor_name}({qualified_type} *arr)
 {{
     mp_obj_t obj_arr[{dim}];
     for (size_t i=0; i<{dim}; i++){{
@@ -2606,7 +4815,7 @@ GENMPY_UNUSED static mp_obj_t {arr_to_mp_convertor_name}({qualified_type} *arr)
 """
                 if dim
                 else """
-GENMPY_UNUSED static mp_obj_t {arr_to_mp_convertor_name}({qualified_type} *arr)
+GENMPY_UNUSED GENMPY_STATIC mp_obj_t {arr_to_mp_convertor_name}({qualified_type} *arr)
 {{
     return {lv_to_mp_ptr_convertor}((void*)arr);
 }}
@@ -2624,6 +4833,7 @@ GENMPY_UNUSED static mp_obj_t {arr_to_mp_convertor_name}({qualified_type} *arr)
             qualified_type=qualified_element_type,
             qualified_ptr_type=qualified_element_ptr_type,
             check_dim="//TODO check dim!" if dim else "",
+            packed_array=packed_array,
             mp_to_lv_convertor=mp_to_lv[element_type],
             lv_to_mp_convertor=lv_to_mp[element_type],
             mp_to_lv_ptr_convertor=mp_to_lv[element_type_ptr],
@@ -2631,6 +4841,13 @@ GENMPY_UNUSED static mp_obj_t {arr_to_mp_convertor_name}({qualified_type} *arr)
             dim=dim if dim else 1,
         )
     )
+    declare_extern(
+        "%s%s *%s(mp_obj_t mp_arr);"
+        % (struct_tag, element_type, arr_to_c_convertor_name)
+    )
+    declare_extern(
+        "mp_obj_t %s(%s *arr);" % (arr_to_mp_convertor_name, qualified_element_type)
+    )
     mp_to_lv[arr_name] = arr_to_c_convertor_name
     mp_to_lv["const %s" % arr_name] = arr_to_c_convertor_name
     lv_to_mp[arr_name] = arr_to_mp_convertor_name
@@ -2658,6 +4875,7 @@ def get_arg_name(arg):
 # print("// Typedefs: " + ", ".join(get_arg_name(t) for t in typedefs))
 
 
+@profiled
 def try_generate_type(type_ast):
     # eprint(' --> try_generate_type %s : %s' % (get_name(type_ast), gen.visit(type_ast)))
     # print('/* --> try_generate_type %s: %s */' % (get_name(type_ast), type_ast))
@@ -2712,10 +4930,10 @@ def try_generate_type(type_ast):
                 bitsize=None,
             )
             try:
-                print("#define %s NULL\n" % func_ptr_name)
+                print_header("#define %s NULL\n" % func_ptr_name)
                 gen_mp_func(func, None)
-                print(
-                    "static inline mp_obj_t mp_lv_{f}(void *func){{ return mp_lv_funcptr(&mp_{f}_mpobj, func, NULL, MP_QSTR_, NULL); }}\n".format(
+                print_header(
+                    "static inline mp_obj_t mp_lv_{f}(void *func){{ return mp_lv_funcptr(&mp_{f}_mpobj, func, NULL, MP_QSTR_, 0, NULL); }}\n".format(
                         f=func_ptr_name
                     )
                 )
@@ -2786,7 +5004,7 @@ def try_generate_type(type_ast):
 
 
 def create_helper_struct(struct_str):
-    print(struct_str)
+    print_header(struct_str)
     struct_str_ast = parser.parse(struct_str).ext[0].type
     struct_name = get_name(struct_str_ast)
     # print('/* --> %s: %s */' % (struct_name, struct_str_ast.type))
@@ -2822,8 +5040,43 @@ typedef union {
 
 generated_callbacks = collections.OrderedDict()
 
+# Each callback kind gets a slot in the callback table of its user_data.
+# Slots are numbered per owner of the user_data (a struct, a function with a user_data
+# argument or the global user_data), so the tables stay small.
+
+callback_slots = {}
+callback_slot_counts = collections.Counter()
+
+
+def get_callback_slot(callback_name, owner):
+    callback_name = sanitize(callback_name)
+    if callback_name not in callback_slots:
+        callback_slots[callback_name] = callback_slot_counts[owner]
+        callback_slot_counts[owner] += 1
+    return callback_slots[callback_name]
+
+
+def is_reusable_convertor(convertor):
+    # Conversions that create a struct, Blob or array object, which can be reused between calls
+    return (
+        convertor == "ptr_to_mp"
+        or convertor.startswith("mp_read_ptr_")
+        or convertor.startswith("mp_array_from_")
+    )
+
+
+def reuses_callback_args(func_name):
+    # Only callbacks known not to keep references to their arguments reuse them
+    name = sanitize(func_name)
+    return any(
+        fnmatch.fnmatchcase(name, pattern) for pattern in args.reuse_callback_args
+    ) and not any(
+        fnmatch.fnmatchcase(name, pattern) for pattern in args.retain_callback_args
+    )
+
 
-def build_callback_func_arg(arg, index, func, func_name=None):
+@profiled
+def build_callback_func_arg(arg, index, func, func_name=None, reuse=False):
     arg_type = get_type(arg.type, remove_quals=True)
     cast = (
         "(void*)" if isinstance(arg.type, c_ast.PtrDecl) else ""
@@ -2838,12 +5091,33 @@ def build_callback_func_arg(arg, index, func, func_name=None):
     if arg.name:
         arg_metadata["name"] = arg.name
     callback_metadata[func_name]["args"].append(arg_metadata)
+    convertor = lv_to_mp[arg_type]
+    if reuse and is_reusable_convertor(convertor):
+        return "mp_args[{i}] = MP_LV_REUSE_VIEW(views, {i}, {convertor}({cast}arg{i}));".format(
+            convertor=convertor, i=index, cast=cast
+        )
     return "mp_args[{i}] = {convertor}({cast}arg{i});".format(
-        convertor=lv_to_mp[arg_type], i=index, cast=cast
+        convertor=convertor, i=index, cast=cast
     )
 
 
-def gen_callback_func(func, func_name=None, user_data_argument=False):
+# With MP_LV_PIN_REFS, these callbacks are the last use of their table by LVGL, which releases it
+# before calling an async call, or after the last run of a timer. As (before, after) the call
+
+callback_pin_hooks = {
+    "lv_async_call_async_xcb": ("mp_lv_unpin_callbacks(arg0);", None),
+    "lv_timer_create_timer_xcb": (None, "mp_lv_timer_called(arg0);"),
+    "lv_timer_t_timer_cb": (None, "mp_lv_timer_called(arg0);"),
+}
+
+
+def callback_pin_hook(func_name, position):
+    hook = callback_pin_hooks.get(func_name, (None, None))[position]
+    return "MP_LV_PINNING(%s)\n    " % hook if hook else ""
+
+
+@profiled
+def gen_callback_func(func, func_name=None, user_data_argument=False, slot_owner=None):
     global mp_to_lv
     if func_name in generated_callbacks:
         return
@@ -2859,7 +5133,7 @@ def gen_callback_func(func, func_name=None, user_data_argument=False):
             align=[],
             storage=[],
             funcspec=[],
-            type=copy.deepcopy(arg.type),
+            type=copy_ast(arg.type),
             init=None,
             bitsize=None,
         )
@@ -2916,6 +5190,15 @@ def gen_callback_func(func, func_name=None, user_data_argument=False):
             )
 
     callback_metadata[func_name]["return_type"] = lv_mp_type[return_type]
+    reuse = reuses_callback_args(func_name)
+    build_args = [
+        build_callback_func_arg(arg, i, func, func_name=func_name, reuse=reuse)
+        for i, arg in enumerate(args)
+    ]
+    reuse = reuse and any("MP_LV_REUSE_VIEW" in build_arg for build_arg in build_args)
+    declare_binding_stat(
+        "%s_callback" % func_name, "mp_%s_callback" % sanitize(func_name)
+    )
     print(
         """
 /*
@@ -2923,14 +5206,17 @@ def gen_callback_func(func, func_name=None, user_data_argument=False):
  * {func_prototype}
  */
 
-GENMPY_UNUSED static {return_type} {func_name}_callback({func_args})
+GENMPY_UNUSED GENMPY_STATIC {return_type} {func_name}_callback({func_args})
 {{
+    MP_LV_STAT_BEGIN();
     mp_obj_t mp_args[{num_args}];
+    mp_lv_callback_views_t *views = NULL;
+    mp_obj_t callback = mp_lv_get_callback({user_data}, MP_QSTR_{func_name}, {slot}, {num_views}, {views});
     {build_args}
-    mp_obj_t callbacks = get_callback_dict_from_user_data({user_data});
-    _nesting++;
-    {return_value_assignment}mp_call_function_n_kw(mp_obj_dict_get(callbacks, MP_OBJ_NEW_QSTR(MP_QSTR_{func_name})) , {num_args}, 0, mp_args);
+    {before_call}_nesting++;
+    {return_value_assignment}mp_lv_call_with_views(callback, {num_args}, mp_args, views);
     _nesting--;
+    {after_call}MP_LV_STAT_END(&mp_{func_name}_callback_stat);
     return{return_value};
 }}
 """.format(
@@ -2939,13 +5225,13 @@ GENMPY_UNUSED static {return_type} {func_name}_callback({func_args})
             return_type=return_type,
             func_args=", ".join([(gen.visit(arg)) for arg in enumerated_args]),
             num_args=len(args),
-            build_args="\n    ".join(
-                [
-                    build_callback_func_arg(arg, i, func, func_name=func_name)
-                    for i, arg in enumerate(args)
-                ]
-            ),
+            build_args="\n    ".join(build_args),
+            num_views=len(args) if reuse else 0,
+            views="&views" if reuse else "NULL",
             user_data=full_user_data,
+            before_call=callback_pin_hook(func_name, 0),
+            after_call=callback_pin_hook(func_name, 1),
+            slot=get_callback_slot(func_name, slot_owner or func_name),
             return_value_assignment=""
             if return_type == "void"
             else "mp_obj_t callback_result = ",
@@ -2954,6 +5240,14 @@ GENMPY_UNUSED static {return_type} {func_name}_callback({func_args})
             else " %s(callback_result)" % mp_to_lv[return_type],
         )
     )
+    declare_extern(
+        "%s %s_callback(%s);"
+        % (
+            return_type,
+            sanitize(func_name),
+            ", ".join([(gen.visit(arg)) for arg in enumerated_args]),
+        )
+    )
     generated_callbacks[func_name] = True
 
 
@@ -2964,15 +5258,30 @@ GENMPY_UNUSED static {return_type} {func_name}_callback({func_args})
 generated_funcs = collections.OrderedDict()
 
 
-def build_mp_func_arg(arg, index, func, obj_name):
-    if isinstance(arg, c_ast.EllipsisParam):
-        raise MissingConversionException("Cannot convert ellipsis param")
-    fixed_arg = copy.deepcopy(arg)
+# Function arguments with arrays converted to pointers and default names,
+# as the C strings of their name, type and declaration
+
+
+@memoize_types
+def fix_func_arg(arg, index):
+    fixed_arg = copy_ast(arg)
     convert_array_to_ptr(fixed_arg)
     if not fixed_arg.name:
         fixed_arg.name = "arg%d" % index
         add_default_declname(fixed_arg, fixed_arg.name)
-    # print('/* --> FIXED ARG: %s */' % repr(fixed_arg))
+    return fixed_arg.name, gen.visit(fixed_arg.type), gen.visit(fixed_arg)
+
+
+def mp_arg_ref(index, fast_call):
+    # Fixed arity entry points receive their arguments as parameters, rather than in an array
+    return ("mp_arg%d" if fast_call else "mp_args[%d]") % index
+
+
+@profiled
+def build_mp_func_arg(arg, index, func, obj_name, fast_call=False):
+    if isinstance(arg, c_ast.EllipsisParam):
+        raise MissingConversionException("Cannot convert ellipsis param")
+    arg_name, arg_c_type, arg_decl = fix_func_arg(arg, index)
     callback = decl_to_callback(arg)
     args = func.type.args.params if func.type.args else []
     # print('/* --> ARG: %s */' % arg)
@@ -2990,6 +5299,7 @@ def build_mp_func_arg(arg, index, func, obj_name):
             full_user_data = None
             user_data_getter = None
             user_data_setter = None
+            containing_struct = "NULL"
             if (
                 len(args) > 0
                 and gen.visit(args[-1].type) == "void *"
@@ -2998,6 +5308,7 @@ def build_mp_func_arg(arg, index, func, obj_name):
                 callback_name = "%s_%s" % (func.name, callback_name)
                 full_user_data = "&user_data"
                 user_data_argument = True
+                slot_owner = func.name
             else:
                 first_arg = args[0]
                 struct_name = get_name(
@@ -3009,13 +5320,16 @@ def build_mp_func_arg(arg, index, func, obj_name):
                 user_data, user_data_getter, user_data_setter = get_user_data(
                     arg_type, callback_name
                 )
+                slot_owner = struct_name
                 if is_global_callback(arg_type):
                     full_user_data = "&MP_STATE_PORT(mp_lv_user_data)"
+                    slot_owner = "MP_STATE_PORT(mp_lv_user_data)"
                 else:
                     if user_data:
                         full_user_data = "&%s->%s" % (first_arg.name, user_data)
                     elif user_data_getter and user_data_setter:
                         full_user_data = "NULL"  # uses getter/setter instead
+                    containing_struct = first_arg.name
                     if index == 0:
                         raise MissingConversionException(
                             "Callback argument '%s' cannot be the first argument! We assume the first argument contains the user_data"
@@ -3027,7 +5341,9 @@ def build_mp_func_arg(arg, index, func, obj_name):
                             % gen.visit(arg)
                         )
             # eprint("--> callback_metadata= %s_%s" % (struct_name, callback_name))
-            gen_callback_func(arg_type, "%s" % callback_name, user_data_argument)
+            gen_callback_func(
+                arg_type, "%s" % callback_name, user_data_argument, slot_owner
+            )
             arg_metadata = {
                 "type": "callback",
                 "function": callback_metadata[callback_name],
@@ -3035,14 +5351,13 @@ def build_mp_func_arg(arg, index, func, obj_name):
             if arg.name:
                 arg_metadata["name"] = arg.name
             func_metadata[func.name]["args"].append(arg_metadata)
-            return "void *{arg_name} = mp_lv_callback(mp_args[{i}], &{callback_name}_callback, MP_QSTR_{callback_name}, {full_user_data}, {containing_struct}, (mp_lv_get_user_data){user_data_getter}, (mp_lv_set_user_data){user_data_setter});".format(
-                i=index,
-                arg_name=fixed_arg.name,
+            return "void *{arg_name} = mp_lv_callback({mp_arg}, &{callback_name}_callback, MP_QSTR_{callback_name}, {slot}, {full_user_data}, {containing_struct}, (mp_lv_get_user_data){user_data_getter}, (mp_lv_set_user_data){user_data_setter});".format(
+                mp_arg=mp_arg_ref(index, fast_call),
+                arg_name=arg_name,
                 callback_name=sanitize(callback_name),
+                slot=get_callback_slot(callback_name, slot_owner),
                 full_user_data=full_user_data,
-                containing_struct=first_arg.name
-                if user_data_getter and user_data_setter
-                else "NULL",
+                containing_struct=containing_struct,
                 user_data_getter=user_data_getter.name if user_data_getter else "NULL",
                 user_data_setter=user_data_setter.name if user_data_setter else "NULL",
             )
@@ -3065,29 +5380,181 @@ def build_mp_func_arg(arg, index, func, obj_name):
         arg_metadata["name"] = arg.name
     func_metadata[func.name]["args"].append(arg_metadata)
     cast = (
-        ("(%s)" % gen.visit(fixed_arg.type)) if "const" in arg.quals else ""
+        ("(%s)" % arg_c_type) if "const" in arg.quals else ""
     )  # allow conversion from non const to const, sometimes requires cast
-    return "{var} = {cast}{convertor}(mp_args[{i}]);".format(
-        var=gen.visit(fixed_arg), cast=cast, convertor=mp_to_lv[arg_type], i=index
+    return "{var} = {cast}{convertor}({mp_arg});".format(
+        var=arg_decl,
+        cast=cast,
+        convertor=mp_to_lv[arg_type],
+        mp_arg=mp_arg_ref(index, fast_call),
+    )
+
+
+# With MP_LV_PIN_REFS, the callback tables passed to these functions are pinned after the call,
+# and released from the hooks called when LVGL frees the struct which holds them.
+# The statements are formatted with the names of the arguments and their Python objects (mp_args),
+# and _res is the returned value
+
+pinned_callbacks = {
+    "lv_obj_add_event_cb": "mp_lv_pin_callbacks({3});",
+    "lv_display_add_event_cb": "mp_lv_pin_callbacks({3});",
+    "lv_indev_add_event_cb": "mp_lv_pin_callbacks({3});",
+    "lv_timer_create": "mp_lv_pin_callbacks(_res? {2}: NULL);",
+    "lv_async_call": "mp_lv_pin_callbacks(_res == LV_RESULT_OK? {1}: NULL);",
+    "lv_anim_start": "mp_lv_pin_anim(_res);",
+    "lv_subject_add_observer": "mp_lv_pin_callbacks(_res? {2}: NULL);",
+    "lv_subject_add_observer_with_target": "mp_lv_pin_callbacks(_res? {3}: NULL);",
+    # LVGL removes the observers of an object when deleting it, so the object keeps their table
+    "lv_obj_remove_event": "mp_lv_pin_obj_events({0}, true);",
+    "lv_obj_remove_event_cb": "mp_lv_pin_obj_events({0}, true);",
+    "lv_obj_remove_event_dsc": "mp_lv_pin_obj_events({0}, true);",
+    "lv_obj_remove_event_cb_with_user_data": "mp_lv_pin_obj_events({0}, true);",
+    "lv_display_delete_event": "mp_lv_pin_display_events({0}, true);",
+    "lv_display_remove_event_cb_with_user_data": "mp_lv_pin_display_events({0}, true);",
+    "lv_indev_remove_event": "mp_lv_pin_indev_events({0}, true);",
+    "lv_indev_remove_event_cb_with_user_data": "mp_lv_pin_indev_events({0}, true);",
+    "lv_subject_add_observer_obj": "if (_res && {3}) mp_lv_keep_ref({mp_args[2]}, mp_obj_new_int_from_uint((uintptr_t)_res), MP_OBJ_FROM_PTR({3}));",
+}
+
+# The tables of these functions' first argument are released before the call, which frees it or removes its events
+
+released_callbacks = {
+    "lv_timer_delete": "mp_lv_release_timer({0});",
+    "lv_display_delete": "mp_lv_release_display({0});",
+    "lv_indev_delete": "mp_lv_release_indev({0});",
+    "lv_observer_remove": "mp_lv_release_observer({0});",
+    "lv_obj_remove_event": "mp_lv_pin_obj_events({0}, false);",
+    "lv_obj_remove_event_cb": "mp_lv_pin_obj_events({0}, false);",
+    "lv_obj_remove_event_dsc": "mp_lv_pin_obj_events({0}, false);",
+    "lv_obj_remove_event_cb_with_user_data": "mp_lv_pin_obj_events({0}, false);",
+    "lv_display_delete_event": "mp_lv_pin_display_events({0}, false);",
+    "lv_display_remove_event_cb_with_user_data": "mp_lv_pin_display_events({0}, false);",
+    "lv_indev_remove_event": "mp_lv_pin_indev_events({0}, false);",
+    "lv_indev_remove_event_cb_with_user_data": "mp_lv_pin_indev_events({0}, false);",
+}
+
+
+def has_pin_hooks(func):
+    return func.name in pinned_callbacks or func.name in released_callbacks
+
+
+def pin_hook(hooks, func, arg_names, fast_call):
+    if func.name not in hooks:
+        return ""
+    mp_args = [mp_arg_ref(i, fast_call) for i in range(len(arg_names))]
+    return "\n    MP_LV_PINNING(%s)" % hooks[func.name].format(
+        *arg_names, mp_args=mp_args
+    )
+
+
+# Arguments of methods of LVGL objects which LVGL may keep a pointer to, kept by the Python object
+# of the LVGL object with MP_LV_PIN_REFS: arrays converted from Python lists, styles and image sources
+
+kept_arg_types = ["lv_style_t *", "const void *"]
+
+
+def keep_converted_refs(args, arg_names, fast_call):
+    if (
+        not args
+        or mp_to_lv.get(get_type(args[0].type, remove_quals=True)) != "mp_to_lv"
+    ):
+        return ""
+    pointer_args = [
+        i
+        for i, arg in enumerate(args)
+        if i > 0
+        and hasattr(arg, "type")
+        and isinstance(arg.type, (c_ast.PtrDecl, c_ast.ArrayDecl))
+    ]
+    arrays = [
+        i
+        for i in pointer_args
+        if (mp_to_lv.get(get_type(args[i].type, remove_quals=True)) or "").startswith(
+            ("mp_arr_to_", "mp_array_to_")
+        )
+    ]
+    # An array is replaced when the function is called again with the same other pointer arguments
+    other_args = [
+        arg_names[i]
+        for i in pointer_args
+        if i not in arrays and gen.visit(args[i].type) not in kept_arg_types
+    ]
+    other_args_ref = (
+        "((const void *[]){%s})" % ", ".join(other_args) if other_args else "NULL"
     )
+    statements = [
+        "mp_lv_keep_ref({obj}, mp_lv_ref_key(lv_func_ptr, {index}, {n}, {others}), MP_OBJ_FROM_PTR({name}));".format(
+            obj=mp_arg_ref(0, fast_call),
+            index=i,
+            n=len(other_args),
+            others=other_args_ref,
+            name=arg_names[i],
+        )
+        for i in arrays
+    ] + [
+        "mp_lv_keep_ref({obj}, mp_obj_new_int_from_uint((uintptr_t){name}), {mp_arg});".format(
+            obj=mp_arg_ref(0, fast_call),
+            name=arg_names[i],
+            mp_arg=mp_arg_ref(i, fast_call),
+        )
+        for i in pointer_args
+        if i not in arrays and gen.visit(args[i].type) in kept_arg_types
+    ]
+    return "".join("\n    MP_LV_PINNING(%s)" % statement for statement in statements)
+
+
+# Functions with up to this number of arguments get a fixed arity entry point,
+# called without building an arguments array and checking its size
+
+MAX_FAST_CALL_ARGS = 3
+
+
+def is_fast_call(param_count):
+    return args.fast_call and param_count <= MAX_FAST_CALL_ARGS
+
+
+# Functions and callbacks counted by _binding_stats() when MP_LV_BINDING_STATS is enabled,
+# as (name, stat variable prefix)
+
+binding_stats = []
+
+
+def declare_binding_stat(name, prefix):
+    binding_stats.append((name, prefix))
+    print("MP_LV_STAT_DEFINE(%s)" % prefix)
+    if sharded_output:
+        print("MP_LV_STAT_DECLARE(%s)" % prefix, file=sharded_output.header)
 
 
 def emit_func_obj(func_obj_name, func_name, param_count, func_ptr, is_static):
+    if is_fast_call(param_count):
+        builtin_macro = (
+            "MP_DEFINE_CONST_LV_FUN_OBJ_STATIC_FIXED"
+            if is_static
+            else "MP_DEFINE_CONST_LV_FUN_OBJ_FIXED"
+        )
+    else:
+        builtin_macro = (
+            "MP_DEFINE_CONST_LV_FUN_OBJ_STATIC_VAR"
+            if is_static
+            else "MP_DEFINE_CONST_LV_FUN_OBJ_VAR"
+        )
+    declare_binding_stat(func_obj_name, "mp_%s_mpobj" % func_obj_name)
     print(
         """
-static {builtin_macro}(mp_{func_obj_name}_mpobj, {param_count}, mp_{func_name}, {func_ptr});
+GENMPY_STATIC {builtin_macro}(mp_{func_obj_name}_mpobj, {param_count}, mp_{func_name}, {func_ptr});
     """.format(
             func_obj_name=func_obj_name,
             func_name=func_name,
             func_ptr=func_ptr,
             param_count=param_count,
-            builtin_macro="MP_DEFINE_CONST_LV_FUN_OBJ_STATIC_VAR"
-            if is_static
-            else "MP_DEFINE_CONST_LV_FUN_OBJ_VAR",
+            builtin_macro=builtin_macro,
         )
     )
+    declare_extern("const mp_lv_obj_fun_builtin_var_t mp_%s_mpobj;" % func_obj_name)
 
 
+@profiled
 def gen_mp_func(func, obj_name):
     # print('/* gen_mp_func: %s : %s */' % (obj_name, func))
     if func.name in generated_funcs:
@@ -3115,8 +5582,8 @@ def gen_mp_func(func, obj_name):
         param_count = len(args)
 
     # If func prototype matches an already generated func, reuse it and only emit func obj that points to it.
-    prototype_str = gen.visit(function_prototype(func))
-    if prototype_str in func_prototypes:
+    prototype_str = function_prototype(func)
+    if prototype_str in func_prototypes and not has_pin_hooks(func):
         original_func = func_prototypes[prototype_str]
         if generated_funcs[original_func.name] == True:
             print("/* Reusing %s for %s */" % (original_func.name, func.name))
@@ -3133,7 +5600,9 @@ def gen_mp_func(func, obj_name):
             func_metadata[func.name]["args"] = func_metadata[original_func.name]["args"]
             generated_funcs[func.name] = True  # completed generating the function
             return
-    func_prototypes[prototype_str] = func
+    # The pin hooks are specific to the function, so other functions can't reuse it
+    if not has_pin_hooks(func):
+        func_prototypes[prototype_str] = func
 
     # user_data argument must be handled first, if it exists
     try:
@@ -3177,6 +5646,26 @@ def gen_mp_func(func, obj_name):
             type=lv_to_mp[return_type], cast=cast
         )
         func_metadata[func.name]["return_type"] = lv_mp_type[return_type]
+    fast_call = is_fast_call(param_count)
+    if fast_call:
+        mp_func_params = ", ".join(
+            ["mp_obj_t mp_arg%d" % i for i in range(param_count)]
+            + ["void *lv_func_ptr"]
+        )
+    else:
+        mp_func_params = "size_t mp_n_args, const mp_obj_t *mp_args, void *lv_func_ptr"
+    build_args = [
+        build_mp_func_arg(arg, i, func, obj_name, fast_call)
+        for i, arg in enumerated_args
+        if isinstance(arg, c_ast.EllipsisParam)
+        or (not isinstance(arg.type, c_ast.TypeDecl))
+        or (not isinstance(arg.type.type, c_ast.IdentifierType))
+        or "void" not in arg.type.type.names
+    ]  # Handle the case of 'void' param which should be ignored
+    send_args = [
+        (arg.name if (hasattr(arg, "name") and arg.name) else ("arg%d" % i))
+        for i, arg in enumerate(args)
+    ]
     print(
         """
 /*
@@ -3184,10 +5673,10 @@ def gen_mp_func(func, obj_name):
  * {print_func}
  */
 
-static mp_obj_t mp_{func}(size_t mp_n_args, const mp_obj_t *mp_args, void *lv_func_ptr)
+GENMPY_STATIC mp_obj_t mp_{func}({mp_func_params})
 {{
-    {build_args}
-    {build_result}(({func_ptr})lv_func_ptr)({send_args});
+    {build_args}{release_callbacks}
+    {build_result}(({func_ptr})lv_func_ptr)({send_args});{pin_callbacks}{keep_refs}
     return {build_return_value};
 }}
 
@@ -3196,27 +5685,18 @@ static mp_obj_t mp_{func}(size_t mp_n_args, const mp_obj_t *mp_args, void *lv_fu
             func=func.name,
             func_ptr=prototype_str,
             print_func=gen.visit(func),
-            build_args="\n    ".join(
-                [
-                    build_mp_func_arg(arg, i, func, obj_name)
-                    for i, arg in enumerated_args
-                    if isinstance(arg, c_ast.EllipsisParam)
-                    or (not isinstance(arg.type, c_ast.TypeDecl))
-                    or (not isinstance(arg.type.type, c_ast.IdentifierType))
-                    or "void" not in arg.type.type.names
-                ]
-            ),  # Handle the case of 'void' param which should be ignored
-            send_args=", ".join(
-                [
-                    (arg.name if (hasattr(arg, "name") and arg.name) else ("arg%d" % i))
-                    for i, arg in enumerate(args)
-                ]
-            ),
+            mp_func_params=mp_func_params,
+            build_args="\n    ".join(build_args),
+            send_args=", ".join(send_args),
             build_result=build_result,
+            release_callbacks=pin_hook(released_callbacks, func, send_args, fast_call),
+            pin_callbacks=pin_hook(pinned_callbacks, func, send_args, fast_call),
+            keep_refs=keep_converted_refs(args, send_args, fast_call),
             build_return_value=build_return_value,
         )
     )
 
+    declare_extern("mp_obj_t mp_%s(%s);" % (func.name, mp_func_params))
     emit_func_obj(
         func.name,
         func.name,
@@ -3283,26 +5763,12 @@ def gen_obj_methods(obj_name):
         obj_metadata[obj_name]["members"].update(
             obj_metadata[parent_obj_names[obj_name]]["members"]
         )
-    # add enum members
-    enum_members = [
-        "{{ MP_ROM_QSTR(MP_QSTR_{enum_member}), MP_ROM_PTR({enum_member_value}) }}".format(
-            enum_member=sanitize(get_enum_member_name(enum_member_name)),
-            enum_member_value=get_enum_value(obj_name, enum_member_name),
-        )
-        for enum_member_name in get_enum_members(obj_name)
-    ]
-    obj_metadata[obj_name]["members"].update(
-        {
-            get_enum_member_name(enum_member_name): {"type": "enum_member"}
-            for enum_member_name in get_enum_members(obj_name)
-        }
-    )
     # add enums that match object name
     obj_enums = [
         enum_name for enum_name in enums.keys() if is_method_of(enum_name, obj_name)
     ]
     enum_types = [
-        "{{ MP_ROM_QSTR(MP_QSTR_{name}), MP_ROM_PTR(&mp_lv_{enum}_type_base) }}".format(
+        "{{ MP_ROM_QSTR(MP_QSTR_{name}), MP_ROM_PTR(&mp_lv_{enum}_enum) }}".format(
             name=sanitize(method_name_from_func_name(enum_name)), enum=enum_name
         )
         for enum_name in obj_enums
@@ -3318,9 +5784,10 @@ def gen_obj_methods(obj_name):
             obj_metadata[enum_name]
         )
         enum_referenced[enum_name] = True
-    return members + parent_members + enum_members + enum_types + helper_members
+    return members + parent_members + enum_types + helper_members
 
 
+@profiled
 def gen_obj(obj_name):
     # eprint('Generating object %s...' % obj_name)
     is_obj = has_ctor(obj_name)
@@ -3379,7 +5846,7 @@ static void {obj}_print(const mp_print_t *print,
 
 {ctor}
 
-static MP_DEFINE_CONST_OBJ_TYPE(
+GENMPY_STATIC MP_DEFINE_CONST_OBJ_TYPE(
     mp_lv_{obj}_type_base,
     MP_QSTR_{obj},
     MP_TYPE_FLAG_NONE,
@@ -3392,7 +5859,7 @@ static MP_DEFINE_CONST_OBJ_TYPE(
     locals_dict, &{obj}_locals_dict
 );
 
-GENMPY_UNUSED static const mp_lv_obj_type_t mp_lv_{obj}_type = {{
+GENMPY_UNUSED GENMPY_STATIC const mp_lv_obj_type_t mp_lv_{obj}_type = {{
 #ifdef LV_OBJ_T
     .lv_obj_class = {lv_class},
 #endif
@@ -3414,14 +5881,67 @@ GENMPY_UNUSED static const mp_lv_obj_type_t mp_lv_{obj}_type = {{
             lv_class="&lv_%s_class" % obj_name if is_obj else "NULL",
         )
     )
+    declare_extern("const mp_obj_type_t mp_lv_%s_type_base;" % sanitize(obj_name))
+    declare_extern("const mp_lv_obj_type_t mp_lv_%s_type;" % sanitize(obj_name))
+
+
+@profiled
+def gen_enum(enum_name):
+    obj_metadata[enum_name] = {
+        "members": collections.OrderedDict(
+            (get_enum_member_name(enum_member_name), {"type": "enum_member"})
+            for enum_member_name in get_enum_members(enum_name)
+        )
+    }
+
+    # Members are sorted by name, the order mp_lv_enum_type searches them in
+    enum_members = sorted(
+        (sanitize(get_enum_member_name(enum_member_name)), enum_member_name)
+        for enum_member_name in get_enum_members(enum_name)
+    )
+
+    print(
+        """
+/*
+ * {module_name} {enum} enum definitions
+ */
+
+static const mp_rom_map_elem_t mp_lv_{enum}_members[] = {{
+    {members}
+}};
+
+GENMPY_STATIC const mp_lv_enum_t mp_lv_{enum}_enum = {{
+    {{ &mp_lv_enum_type }},
+    MP_QSTR_{name},
+    MP_ARRAY_SIZE(mp_lv_{enum}_members),
+    mp_lv_{enum}_members
+}};
+    """.format(
+            module_name=module_name,
+            enum=sanitize(enum_name),
+            name=sanitize(get_enum_name(enum_name)),
+            members=",\n    ".join(
+                "{{ MP_ROM_QSTR(MP_QSTR_{enum_member}), MP_ROM_PTR({enum_member_value}) }}".format(
+                    enum_member=enum_member,
+                    enum_member_value=get_enum_value(enum_name, enum_member_name),
+                )
+                for enum_member, enum_member_name in enum_members
+            ),
+        )
+    )
+    declare_extern("const mp_lv_enum_t mp_lv_%s_enum;" % sanitize(enum_name))
 
 
 #
 # Generate Enum objects
 #
 
+begin_phase("objects")
+
+begin_section("enums")
+
 for enum_name in list(enums.keys()):
-    gen_obj(enum_name)
+    gen_enum(enum_name)
 
 #
 # Generate all other objects. Generate parent objects first
@@ -3435,6 +5955,7 @@ for obj_name in obj_names:
     )
 
     while parent_obj_name != None and parent_obj_name not in generated_obj_names:
+        begin_section("obj_%s" % parent_obj_name)
         gen_obj(parent_obj_name)
         generated_obj_names[parent_obj_name] = True
         parent_obj_name = (
@@ -3445,6 +5966,7 @@ for obj_name in obj_names:
 
     if obj_name not in generated_obj_names:
         # eprint("--> gen obj %s" % obj_name)
+        begin_section("obj_%s" % obj_name)
         gen_obj(obj_name)
         generated_obj_names[obj_name] = True
 
@@ -3455,6 +5977,15 @@ for obj_name in obj_names:
 # Otherwise we will not know of all the structs when generating struct-functions
 #
 
+begin_phase("structs")
+
+
+def is_struct_function_allowed(func, struct_name):
+    return (
+        struct_name in generated_structs
+        or is_name_allowed(simplify_identifier(struct_name))
+    ) and is_member_allowed(noncommon_part(func.name, struct_name))
+
 
 def try_generate_structs_from_first_argument():
     for func in funcs:
@@ -3463,6 +5994,11 @@ def try_generate_structs_from_first_argument():
         args = func.type.args.params if func.type.args else []
         if len(args) < 1:
             continue
+        if not (
+            is_name_allowed(simplify_identifier(func.name))
+            or is_struct_function_allowed(func, get_first_arg_type(func))
+        ):
+            continue
         arg_type = get_type(args[0].type, remove_quals=True)
         if arg_type not in mp_to_lv or not mp_to_lv[arg_type]:
             try:
@@ -3484,6 +6020,7 @@ def try_generate_structs_from_first_argument():
 # eprint("/* Generating globals */")
 
 
+@profiled
 def gen_global(global_name, global_type_ast):
     global_type = get_type(global_type_ast, remove_quals=True)
     generated_global = try_generate_type(global_type_ast)
@@ -3502,8 +6039,8 @@ typedef struct {{
 }} {name};
         """.format(type=wrapped_type, name=global_type)
         if global_type not in generated_structs:
-            print("/* Global struct wrapper for %s */" % wrapped_type)
-            print(custom_struct_str)
+            print_header("/* Global struct wrapper for %s */" % wrapped_type)
+            print_header(custom_struct_str)
             # eprint("%s: %s\n" % (wrapped_type, custom_struct_str))
             try_generate_struct(
                 global_type, parser.parse(custom_struct_str).ext[0].type.type
@@ -3515,7 +6052,7 @@ typedef struct {{
  * {module_name} {global_name} global definitions
  */
 
-static const mp_lv_struct_t mp_{global_name} = {{
+GENMPY_STATIC const mp_lv_struct_t mp_{global_name} = {{
     {{ &mp_{struct_name}_type }},
     ({cast}*)&{global_name}
 }};
@@ -3526,10 +6063,16 @@ static const mp_lv_struct_t mp_{global_name} = {{
             cast=gen.visit(global_type_ast),
         )
     )
+    declare_extern("const mp_lv_struct_t mp_%s;" % global_name)
 
 
+begin_section("globals")
+
 generated_globals = []
 for global_name in blobs:
+    if not is_name_allowed(simplify_identifier(global_name)):
+        drop_binding("globals", simplify_identifier(global_name))
+        continue
     try:
         gen_global(global_name, blobs[global_name])
         generated_globals.append(global_name)
@@ -3541,16 +6084,36 @@ for global_name in blobs:
 #
 
 # eprint("/* Generating struct-functions */")
+begin_section("structs")
 try_generate_structs_from_first_argument()
 
 
+@profiled
 def generate_struct_functions(struct_list):
     # print('/* List of structs: %s */' % repr(struct_list))
     for struct_name in struct_list:
         if not generated_structs[struct_name]:
             continue
         sanitized_struct_name = sanitize(struct_name)
+        previous_section = begin_section("struct_%s" % sanitized_struct_name)
         struct_funcs = get_struct_functions(struct_name)
+        if allowlist_names is not None:
+            for struct_func in struct_funcs:
+                if not is_struct_function_allowed(struct_func, struct_name):
+                    drop_binding(
+                        "methods",
+                        "%s.%s"
+                        % (
+                            simplify_identifier(struct_name),
+                            noncommon_part(struct_func.name, struct_name),
+                        ),
+                        struct_func,
+                    )
+            struct_funcs = [
+                struct_func
+                for struct_func in struct_funcs
+                if is_struct_function_allowed(struct_func, struct_name)
+            ]
         # print('/* Struct %s contains: %s */' % (struct_name, [f.name for f in struct_funcs]))
         for struct_func in struct_funcs[
             :
@@ -3570,6 +6133,11 @@ def generate_struct_functions(struct_list):
             )
         else:
             struct_size_attr = ""
+        if struct_name in generated_struct_fields:
+            struct_size_attr += (
+                "\n    { MP_ROM_QSTR(MP_QSTR___FIELDS__), MP_ROM_PTR(&mp_%s_fields) },"
+                % sanitized_struct_name
+            )
         print(
             """
 static const mp_rom_map_elem_t mp_{sanitized_struct_name}_locals_dict_table[] = {{
@@ -3577,7 +6145,7 @@ static const mp_rom_map_elem_t mp_{sanitized_struct_name}_locals_dict_table[] =
     {functions}
 }};
 
-static MP_DEFINE_CONST_DICT(mp_{sanitized_struct_name}_locals_dict, mp_{sanitized_struct_name}_locals_dict_table);
+GENMPY_STATIC MP_DEFINE_CONST_DICT(mp_{sanitized_struct_name}_locals_dict, mp_{sanitized_struct_name}_locals_dict_table);
         """.format(
                 struct_size=struct_size_attr,
                 sanitized_struct_name=sanitized_struct_name,
@@ -3594,6 +6162,7 @@ static MP_DEFINE_CONST_DICT(mp_{sanitized_struct_name}_locals_dict, mp_{sanitize
         )
 
         generated_struct_functions[struct_name] = True
+        begin_section(previous_section)
 
 
 generate_struct_functions(list(generated_structs.keys()))
@@ -3602,6 +6171,8 @@ generate_struct_functions(list(generated_structs.keys()))
 # Generate all module functions (not including method functions which were already generated)
 #
 
+begin_phase("functions")
+
 print(
     """
 /*
@@ -3614,11 +6185,37 @@ print(
 
 # eprint("/* Generating global module functions /*")
 module_funcs = [func for func in funcs if func.name not in generated_funcs]
+if allowlist_names is not None:
+    for func in module_funcs:
+        if func.name in dropped_funcs or is_name_allowed(
+            simplify_identifier(func.name)
+        ):
+            continue
+        dropped_obj_name = next(
+            (
+                obj_name
+                for obj_name in dropped_bindings["objects"]
+                if is_method_of(func.name, obj_name)
+            ),
+            None,
+        )
+        if dropped_obj_name:
+            drop_binding(
+                "methods",
+                "%s.%s" % (dropped_obj_name, method_name_from_func_name(func.name)),
+                func,
+            )
+        else:
+            drop_binding("functions", simplify_identifier(func.name), func)
+    module_funcs = [
+        func for func in module_funcs if is_name_allowed(simplify_identifier(func.name))
+    ]
 for module_func in module_funcs[
     :
 ]:  # clone list because we are changing it in the loop.
     if module_func.name in generated_funcs:
         continue  # generated_funcs could change inside the loop so need to recheck.
+    begin_section("functions_%s" % simplify_identifier(module_func.name).split("_")[0])
     try:
         gen_mp_func(module_func, None)
         # A new function can create new struct with new function structs
@@ -3650,6 +6247,8 @@ if len(functions_not_generated) > 0:
 # Generate callback functions
 #
 
+begin_phase("callbacks")
+
 # for func_typedef in func_typedefs:
 #     func = func_typedef.type.type
 #     try:
@@ -3661,10 +6260,13 @@ if len(functions_not_generated) > 0:
 #         mp_to_lv[func_name] = mp_to_lv['void *']
 
 # eprint("/* Generating callback functions */")
+begin_section("callbacks")
 for func_name, func, struct_name in callbacks_used_on_structs:
     try:
         # print('/* --> gen_callback_func %s */' % func_name)
-        gen_callback_func(func, func_name="%s_%s" % (struct_name, func_name))
+        gen_callback_func(
+            func, func_name="%s_%s" % (struct_name, func_name), slot_owner=struct_name
+        )
     except MissingConversionException as exp:
         gen_func_error(func, exp)
         # func_name = get_arg_name(func.type)
@@ -3675,7 +6277,94 @@ for func_name, func, struct_name in callbacks_used_on_structs:
 # Emit Mpy Module definition
 #
 
+begin_phase("module")
+
+# Struct types needed by generated functions are always generated, but only allowed ones are module globals
+
+if allowlist_names is not None:
+    for struct_name in generated_structs:
+        if generated_structs[struct_name] and not is_name_allowed(
+            simplify_identifier(struct_name)
+        ):
+            drop_binding("structs", simplify_identifier(struct_name))
+    for struct_name in struct_aliases:
+        if not is_name_allowed(simplify_identifier(struct_aliases[struct_name])):
+            drop_binding("structs", simplify_identifier(struct_aliases[struct_name]))
+
 # eprint("/* Generating module definition */")
+begin_section(MODULE_SECTION)
+# The counters reported by _binding_stats() are those of this module
+
+print(
+    """
+#if MP_LV_BINDING_STATS
+
+static const mp_lv_binding_stat_entry_t mp_lv_binding_stat_entries[] = {{
+    {entries}
+    {{NULL, NULL}}
+}};
+
+static int binding_stat_compare(const void *a, const void *b)
+{{
+    const mp_lv_binding_stat_t *stat_a = (*(const mp_lv_binding_stat_entry_t **)a)->stat;
+    const mp_lv_binding_stat_t *stat_b = (*(const mp_lv_binding_stat_entry_t **)b)->stat;
+    return (stat_a->us < stat_b->us) - (stat_a->us > stat_b->us);
+}}
+
+// Return a list of (name, calls, us) of the functions and callbacks called since the last reset,
+// sorted by their total time
+
+static mp_obj_t mp_lv_binding_stats(void)
+{{
+    size_t n = 0;
+    for (const mp_lv_binding_stat_entry_t *entry = mp_lv_binding_stat_entries; entry->name; entry++) {{
+        if (entry->stat->calls) n++;
+    }}
+    const mp_lv_binding_stat_entry_t **called = m_new(const mp_lv_binding_stat_entry_t *, n);
+    n = 0;
+    for (const mp_lv_binding_stat_entry_t *entry = mp_lv_binding_stat_entries; entry->name; entry++) {{
+        if (entry->stat->calls) called[n++] = entry;
+    }}
+    qsort(called, n, sizeof(called[0]), binding_stat_compare);
+    mp_obj_t list = mp_obj_new_list(0, NULL);
+    for (size_t i = 0; i < n; i++) {{
+        mp_obj_t items[] = {{
+            mp_obj_new_str(called[i]->name, strlen(called[i]->name)),
+            mp_obj_new_int_from_uint(called[i]->stat->calls),
+            mp_obj_new_int_from_ull(called[i]->stat->us),
+        }};
+        mp_obj_list_append(list, mp_obj_new_tuple(3, items));
+    }}
+    m_del(const mp_lv_binding_stat_entry_t *, called, n);
+    return list;
+}}
+static MP_DEFINE_CONST_FUN_OBJ_0(mp_lv_binding_stats_obj, mp_lv_binding_stats);
+
+static mp_obj_t mp_lv_binding_stats_reset(void)
+{{
+    for (const mp_lv_binding_stat_entry_t *entry = mp_lv_binding_stat_entries; entry->name; entry++) {{
+        entry->stat->calls = 0;
+        entry->stat->us = 0;
+    }}
+    return mp_const_none;
+}}
+static MP_DEFINE_CONST_FUN_OBJ_0(mp_lv_binding_stats_reset_obj, mp_lv_binding_stats_reset);
+
+#endif // MP_LV_BINDING_STATS
+
+#if MP_LV_PIN_REFS && MP_LV_OBJ_RUNTIME
+
+static MP_DEFINE_CONST_FUN_OBJ_0(mp_lv_pinned_count_obj, mp_lv_pinned_count);
+
+#endif // MP_LV_PIN_REFS && MP_LV_OBJ_RUNTIME
+
+""".format(
+        entries="".join(
+            '{"%s", &%s_stat},\n    ' % (name, prefix) for name, prefix in binding_stats
+        )
+    )
+)
+
 print(
     """
 
@@ -3685,8 +6374,10 @@ print(
 
 static const mp_rom_map_elem_t {module_name}_globals_table[] = {{
     {{ MP_ROM_QSTR(MP_QSTR___name__), MP_ROM_QSTR(MP_QSTR_{module_name}) }},
+#ifdef LV_OBJ_T
     {{ MP_ROM_QSTR(MP_QSTR___init__), MP_ROM_PTR(&lvgl_mod___init___obj) }},
     {{ MP_ROM_QSTR(MP_QSTR___del__), MP_ROM_PTR(&lvgl_mod___del___obj) }},
+#endif // LV_OBJ_T
     {objects}
     {functions}
     {enums}
@@ -3697,6 +6388,13 @@ static const mp_rom_map_elem_t {module_name}_globals_table[] = {{
 #ifdef LV_OBJ_T
     {{ MP_ROM_QSTR(MP_QSTR_LvReferenceError), MP_ROM_PTR(&mp_type_LvReferenceError) }},
 #endif // LV_OBJ_T
+#if MP_LV_BINDING_STATS
+    {{ MP_ROM_QSTR(MP_QSTR__binding_stats), MP_ROM_PTR(&mp_lv_binding_stats_obj) }},
+    {{ MP_ROM_QSTR(MP_QSTR__binding_stats_reset), MP_ROM_PTR(&mp_lv_binding_stats_reset_obj) }},
+#endif // MP_LV_BINDING_STATS
+#if MP_LV_PIN_REFS && MP_LV_OBJ_RUNTIME
+    {{ MP_ROM_QSTR(MP_QSTR__pinned), MP_ROM_PTR(&mp_lv_pinned_count_obj) }},
+#endif // MP_LV_PIN_REFS && MP_LV_OBJ_RUNTIME
 }};
 """.format(
         module_name=sanitize(module_name),
@@ -3718,7 +6416,7 @@ static const mp_rom_map_elem_t {module_name}_globals_table[] = {{
         ),
         enums="".join(
             [
-                "{{ MP_ROM_QSTR(MP_QSTR_{name}), MP_ROM_PTR(&mp_lv_{enum}_type_base) }},\n    ".format(
+                "{{ MP_ROM_QSTR(MP_QSTR_{name}), MP_ROM_PTR(&mp_lv_{enum}_enum) }},\n    ".format(
                     name=sanitize(get_enum_name(enum_name)), enum=enum_name
                 )
                 for enum_name in enums.keys()
@@ -3733,6 +6431,7 @@ static const mp_rom_map_elem_t {module_name}_globals_table[] = {{
                 )
                 for struct_name in generated_structs
                 if generated_structs[struct_name]
+                and is_name_allowed(simplify_identifier(struct_name))
             ]
         ),
         struct_aliases="".join(
@@ -3744,6 +6443,7 @@ static const mp_rom_map_elem_t {module_name}_globals_table[] = {{
                     ),
                 )
                 for struct_name in struct_aliases.keys()
+                if is_name_allowed(simplify_identifier(struct_aliases[struct_name]))
             ]
         ),
         blobs="".join(
@@ -3791,7 +6491,7 @@ MP_REGISTER_MODULE(MP_QSTR_{module_name}, mp_module_{module_name});
 if len(obj_names) > 0:
     print(
         """
-static const mp_lv_obj_type_t *mp_lv_obj_types[] = {{
+GENMPY_STATIC const mp_lv_obj_type_t *mp_lv_obj_types[] = {{
     {obj_types},
     NULL
 }};
@@ -3802,6 +6502,14 @@ static const mp_lv_obj_type_t *mp_lv_obj_types[] = {{
         )
     )
 
+begin_phase("output")
+
+if sharded_output:
+    write_shards()
+
+if args.runtime == "shared":
+    write_runtime()
+
 # Save Metadata File, if specified.
 
 if args.metadata:
@@ -3819,10 +6527,12 @@ if args.metadata:
         simplify_identifier(struct_name)
         for struct_name in generated_structs
         if struct_name in generated_structs
+        and is_name_allowed(simplify_identifier(struct_name))
     ]
     metadata["structs"] += [
         simplify_identifier(struct_aliases[struct_name])
         for struct_name in struct_aliases.keys()
+        if is_name_allowed(simplify_identifier(struct_aliases[struct_name]))
     ]
     metadata["blobs"] = [
         simplify_identifier(global_name) for global_name in generated_globals
@@ -3835,3 +6545,8 @@ if args.metadata:
 
     with open(args.metadata, "w") as metadata_file:
         json.dump(metadata, metadata_file, indent=4)
+
+if args.allowlist:
+    report_dropped_bindings()
+
+end_profile()
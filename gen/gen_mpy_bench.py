@@ -0,0 +1,229 @@
+#
+# Benchmark gen_mpy.py against the bundled LVGL headers.
+#
+# The headers are preprocessed once, the same way the build does it, and then the generator
+# is timed on the preprocessed file over several runs.
+# The peak resident memory of each run is recorded too, in KiB, where the OS reports it.
+# An additional run with --profile records the time and memory spent per generation phase.
+# Results are saved as JSON, and can be held to a time budget (in seconds) with --budget.
+#
+# Example:
+#   python3 gen/gen_mpy_bench.py -o gen_mpy_bench.json --budget 60
+#
+
+from __future__ import print_function
+import sys
+import os
+import json
+import time
+import platform
+import subprocess
+import tempfile
+import statistics
+from argparse import ArgumentParser
+
+script_path = os.path.dirname(os.path.abspath(__file__))
+binding_path = os.path.dirname(script_path)
+gen_mpy = os.path.join(script_path, "gen_mpy.py")
+
+argParser = ArgumentParser()
+argParser.add_argument(
+    "-L",
+    "--lvgl-dir",
+    dest="lvgl_dir",
+    help="LVGL directory",
+    metavar="<LVGL Path>",
+    action="store",
+)
+argParser.add_argument(
+    "-LC",
+    "--lv-conf",
+    dest="lv_conf",
+    help="lv_conf.h used for preprocessing",
+    metavar="<lv_conf.h Path>",
+    action="store",
+)
+argParser.add_argument(
+    "-E",
+    "--external-preprocessing",
+    dest="ep",
+    help="Use an already preprocessed file instead of preprocessing the LVGL headers",
+    metavar="<Preprocessed File>",
+    action="store",
+)
+argParser.add_argument(
+    "-n",
+    "--runs",
+    dest="runs",
+    help="Number of timed runs",
+    metavar="<Number of Runs>",
+    action="store",
+    type=int,
+)
+argParser.add_argument(
+    "-C",
+    "--cache",
+    dest="cache",
+    help="Time runs with a warm AST cache instead of parsing every time",
+    action="store_true",
+)
+argParser.add_argument(
+    "-o",
+    "--output",
+    dest="output",
+    help="JSON file to save the results to. Printed to stdout if not specified",
+    metavar="<Results JSON File>",
+    action="store",
+)
+argParser.add_argument(
+    "-B",
+    "--budget",
+    dest="budget",
+    help="Fail if the median run takes longer than this number of seconds",
+    metavar="<Seconds>",
+    action="store",
+    type=float,
+)
+argParser.set_defaults(
+    lvgl_dir=os.path.join(binding_path, "lvgl"),
+    lv_conf=os.path.join(binding_path, "lv_conf.h"),
+    ep=None,
+    runs=3,
+    cache=False,
+    output=None,
+    budget=None,
+)
+args = argParser.parse_args()
+
+
+def eprint(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def preprocess(pp_path):
+    # Same as the LVGL_MPY rule in micropython.mk
+    pp_cmd = [
+        os.environ.get("CC", "gcc"),
+        "-E",
+        "-DPYCPARSER",
+        "-x",
+        "c",
+        "-I",
+        os.path.join(binding_path, "stubs/include/freetype2"),
+        "-I",
+        os.path.join(binding_path, "pycparser/utils/fake_libc_include"),
+        "-I",
+        os.path.join(binding_path, "stubs/include"),
+        '-DLV_CONF_PATH="%s"' % args.lv_conf,
+        os.path.join(args.lvgl_dir, "lvgl_private.h"),
+    ]
+    with open(pp_path, "w") as pp_file:
+        subprocess.check_call(pp_cmd, stdout=pp_file)
+
+
+def run_gen_mpy(pp_path, work_dir, extra_args=[]):
+    gen_cmd = [
+        sys.executable,
+        gen_mpy,
+        "-M",
+        "lvgl",
+        "-MP",
+        "lv",
+        "-MD",
+        os.path.join(work_dir, "lv_mpy.json"),
+        "-E",
+        pp_path,
+    ]
+    if args.cache:
+        gen_cmd += ["-C", os.path.join(work_dir, "gen_cache")]
+    gen_cmd += extra_args + [os.path.join(args.lvgl_dir, "lvgl.h")]
+    with open(os.path.join(work_dir, "lv_mpy.c"), "w") as output_file:
+        start = time.perf_counter()
+        process = subprocess.Popen(gen_cmd, stdout=output_file)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            max_rss = usage.ru_maxrss
+            if sys.platform == "darwin":
+                max_rss //= 1024  # macOS reports bytes, Linux KiB
+        else:
+            process.wait()
+            max_rss = None
+        elapsed = time.perf_counter() - start
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, gen_cmd)
+    return elapsed, max_rss
+
+
+def run_benchmark(work_dir):
+    if args.ep:
+        pp_path = args.ep
+    else:
+        pp_path = os.path.join(work_dir, "lvgl.pp.c")
+        eprint("Preprocessing %s" % args.lvgl_dir)
+        preprocess(pp_path)
+
+    if args.cache:
+        eprint("Populating the AST cache")
+        run_gen_mpy(pp_path, work_dir)
+
+    times = []
+    max_rss = []
+    for i in range(args.runs):
+        run_time, run_max_rss = run_gen_mpy(pp_path, work_dir)
+        times.append(run_time)
+        max_rss.append(run_max_rss)
+        if run_max_rss is None:
+            eprint("Run %d/%d: %.3f s" % (i + 1, args.runs, run_time))
+        else:
+            eprint(
+                "Run %d/%d: %.3f s, %d KiB max RSS"
+                % (i + 1, args.runs, run_time, run_max_rss)
+            )
+
+    # Profiling slows down generation, so it's measured on a separate run
+    profile_path = os.path.join(work_dir, "profile.json")
+    run_gen_mpy(pp_path, work_dir, ["-P", profile_path])
+    with open(profile_path, "r") as profile_file:
+        profile = json.load(profile_file)
+
+    with open(os.path.join(work_dir, "lv_mpy.c"), "r") as output_file:
+        output_size = len(output_file.read())
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "input": pp_path,
+        "input_size": os.path.getsize(pp_path),
+        "output_size": output_size,
+        "cache": args.cache,
+        "runs": times,
+        "min": min(times),
+        "median": statistics.median(times),
+        "max_rss": max_rss,
+        "max_rss_peak": None if None in max_rss else max(max_rss),
+        "budget": args.budget,
+        "profile": profile,
+    }
+    return results
+
+
+if args.runs < 1:
+    argParser.error("--runs must be a positive number")
+
+with tempfile.TemporaryDirectory() as work_dir:
+    results = run_benchmark(work_dir)
+
+results_json = json.dumps(results, indent=4)
+if args.output:
+    with open(args.output, "w") as results_file:
+        results_file.write(results_json + "\n")
+else:
+    print(results_json)
+
+if args.budget is not None and results["median"] > args.budget:
+    eprint(
+        "gen_mpy.py took %.3f s (median), over the budget of %.3f s"
+        % (results["median"], args.budget)
+    )
+    sys.exit(1)
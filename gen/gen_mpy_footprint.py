@@ -0,0 +1,421 @@
+#
+# Attribute the flash footprint of the generated bindings to LVGL classes, structs, enums,
+# functions and globals.
+#
+# Joins the metadata emitted by gen_mpy.py (--metadata) with the symbols of the built firmware,
+# read from a GNU ld linker map (built with -ffunction-sections -fdata-sections, so each symbol
+# has its own section) or from "nm -S" output (or an ELF file, which is passed to nm).
+#
+# Symbols are attributed by name to the entity with the longest matching prefix, for example
+# mp_lv_label_set_text, label_locals_dict_table and mp_lv_label_type_base to the "label" class,
+# and mp_lv_area_t_type and mp_lv_area_get_width to the "area_t" struct.
+# Bytes of the generated binding code are reported as text, rodata and data, while bytes of
+# LVGL's own code attributed the same way (lv_label_set_text) are reported separately as native.
+#
+# Example:
+#   python3 gen/gen_mpy_footprint.py -MD build/lvgl/lv_mpy.json --map build/firmware.map
+#   python3 gen/gen_mpy_footprint.py -MD build/lvgl/lv_mpy.json --elf build/firmware.elf --nm-tool arm-none-eabi-nm
+#
+
+from __future__ import print_function
+import os
+import re
+import json
+import collections
+import subprocess
+from argparse import ArgumentParser
+
+argParser = ArgumentParser()
+argParser.add_argument(
+    "-MD",
+    "--metadata",
+    dest="metadata",
+    help="Metadata file emitted by gen_mpy.py",
+    metavar="<MetaData File Name>",
+    action="store",
+    required=True,
+)
+argParser.add_argument(
+    "-MP",
+    "--module_prefix",
+    dest="module_prefix",
+    help="Module prefix that starts every function name",
+    metavar="<Prefix string>",
+    action="store",
+)
+argParser.add_argument(
+    "--map",
+    dest="map",
+    help="GNU ld linker map of the firmware",
+    metavar="<Map File>",
+    action="append",
+)
+argParser.add_argument(
+    "--nm",
+    dest="nm",
+    help="Output of nm -S for the firmware or the bindings object files",
+    metavar="<nm Output File>",
+    action="append",
+)
+argParser.add_argument(
+    "--elf",
+    dest="elf",
+    help="ELF file (firmware or object file) to read the symbols from with nm",
+    metavar="<ELF File>",
+    action="append",
+)
+argParser.add_argument(
+    "--nm-tool",
+    dest="nm_tool",
+    help="nm executable used with --elf",
+    metavar="<nm Executable>",
+    action="store",
+)
+argParser.add_argument(
+    "--bindings-object",
+    dest="bindings_object",
+    help="Regex matching the object files of the generated bindings in the linker map",
+    metavar="<Regex>",
+    action="store",
+)
+argParser.add_argument(
+    "-n",
+    "--top",
+    dest="top",
+    help="Number of entries to print (0 for all)",
+    metavar="<Number of Entries>",
+    action="store",
+    type=int,
+)
+argParser.add_argument(
+    "-o",
+    "--output",
+    dest="output",
+    help="Optional JSON file to save the full report to",
+    metavar="<Report File Name>",
+    action="store",
+)
+argParser.set_defaults(
+    module_prefix="lv",
+    map=[],
+    nm=[],
+    elf=[],
+    nm_tool=os.environ.get("NM", "nm"),
+    bindings_object=r"lv_mpy?(_shard_\d+)?\.",
+    top=30,
+    output=None,
+)
+args = argParser.parse_args()
+
+if not (args.map or args.nm or args.elf):
+    argParser.error("At least one of --map, --nm or --elf is required")
+
+prefix = args.module_prefix
+upper_prefix = prefix.upper()
+
+# Symbol kinds. bss is counted with data, since it doesn't take flash but it's still a cost.
+# Longer section prefixes first.
+
+SECTION_KINDS = [
+    (".data.rel.ro.local", "rodata"),
+    (".data.rel.ro", "rodata"),
+    (".data.rel.local", "data"),
+    (".data.rel", "data"),
+    (".text", "text"),
+    (".literal", "text"),
+    (".iram", "text"),
+    (".rodata", "rodata"),
+    (".srodata", "rodata"),
+    (".data", "data"),
+    (".sdata", "data"),
+    (".bss", "data"),
+    (".sbss", "data"),
+]
+
+NM_KINDS = {"t": "text", "w": "text", "r": "rodata", "d": "data", "g": "data"}
+NM_KINDS.update({"b": "data", "s": "data", "v": "data"})
+
+# Names of generated symbols that don't start with "mp_"
+
+GENERATED_SUFFIXES = (
+    "_locals_dict",
+    "_locals_dict_table",
+    "_print",
+    "_make_new",
+    "_callback",
+    "_type_base",
+)
+
+#
+# Symbol readers. Each returns a list of (name, kind, size, is_binding).
+#
+
+
+def symbol_base_name(name):
+    # Remove compiler suffixes of local symbols (.isra.0, .constprop.0, .lto_priv.0)
+    return name.split(".")[0] if not name.startswith(".") else name
+
+
+def is_generated_name(name):
+    return (
+        name.startswith("mp_")
+        or name.endswith(GENERATED_SUFFIXES)
+        or name.startswith(upper_prefix + "_")
+    )
+
+
+def read_map(path):
+    symbols = []
+    bindings_object = re.compile(args.bindings_object)
+    section_pattern = re.compile(
+        r"^ (\.[^\s*]+)(?:\s+0x([0-9a-fA-F]+)\s+0x([0-9a-fA-F]+)\s+(.+))?$"
+    )
+    address_pattern = re.compile(r"^\s+0x([0-9a-fA-F]+)\s+0x([0-9a-fA-F]+)\s+(.+)$")
+    section = None
+    with open(path, "r") as map_file:
+        for line in map_file:
+            line = line.rstrip("\n")
+            match = section_pattern.match(line)
+            if match:
+                section = match.group(1)
+                if not match.group(2):
+                    continue  # Address and size are on the next line
+                size, object_file = match.group(3), match.group(4)
+            else:
+                match = address_pattern.match(line)
+                if not (match and section):
+                    section = None
+                    continue
+                size, object_file = match.group(2), match.group(3)
+            kind = next(
+                (
+                    (section_prefix, kind)
+                    for section_prefix, kind in SECTION_KINDS
+                    if section.startswith(section_prefix)
+                ),
+                None,
+            )
+            size = int(size, 16)
+            if kind and size > 0:
+                section_prefix, kind = kind
+                name = symbol_base_name(section[len(section_prefix) + 1 :])
+                symbols.append(
+                    (
+                        name,
+                        kind,
+                        size,
+                        bool(bindings_object.search(os.path.basename(object_file))),
+                    )
+                )
+            section = None
+    return symbols
+
+
+def parse_nm(lines):
+    symbols = []
+    nm_pattern = re.compile(r"^([0-9a-fA-F]+)\s+([0-9a-fA-F]+)\s+(\w)\s+(\S+)$")
+    for line in lines:
+        match = nm_pattern.match(line.strip())
+        if not match:
+            continue
+        kind = NM_KINDS.get(match.group(3).lower())
+        size = int(match.group(2), 16)
+        if kind and size > 0:
+            name = symbol_base_name(match.group(4))
+            symbols.append((name, kind, size, is_generated_name(name)))
+    return symbols
+
+
+def read_nm(path):
+    with open(path, "r") as nm_file:
+        return parse_nm(nm_file.readlines())
+
+
+def read_elf(path):
+    nm_output = subprocess.check_output([args.nm_tool, "-S", "--size-sort", path])
+    return parse_nm(nm_output.decode().splitlines())
+
+
+#
+# Entities and the symbol name prefixes attributed to them
+#
+
+
+class Entity(object):
+    def __init__(self, kind, name, qstrs):
+        self.kind = kind
+        self.name = name
+        self.qstrs = qstrs
+        self.sizes = collections.OrderedDict(
+            (kind, 0) for kind in ["text", "rodata", "data", "native"]
+        )
+        self.symbols = collections.OrderedDict()
+
+    def total(self):
+        return sum(self.sizes.values())
+
+    def add(self, name, kind, size, is_binding):
+        self.sizes[kind if is_binding else "native"] += size
+        self.symbols[name] = self.symbols.get(name, 0) + size
+
+    def to_json(self):
+        result = collections.OrderedDict(
+            [("kind", self.kind), ("name", self.name), ("qstrs", self.qstrs)]
+        )
+        result.update(self.sizes)
+        result["total"] = self.total()
+        result["symbols"] = self.symbols
+        return result
+
+
+def base_struct_name(struct_name):
+    return struct_name[:-2] if struct_name.endswith("_t") else struct_name
+
+
+def get_entities(metadata):
+    entities = []
+    prefixes = {}
+
+    def add_entity(kind, name, qstrs, entity_prefixes):
+        entity = Entity(kind, name, qstrs)
+        entities.append(entity)
+        for entity_prefix in entity_prefixes:
+            prefixes.setdefault(entity_prefix, entity)
+
+    objects = metadata.get("objects", {})
+    base_members = set(objects.get("obj", {}).get("members", {}).keys())
+    for obj_name, obj in objects.items():
+        members = set(obj.get("members", {}).keys())
+        if obj_name != "obj":
+            members -= base_members  # Inherited from the base object
+        add_entity(
+            "class",
+            obj_name,
+            1 + len(members),
+            [
+                "%s_%s_" % (prefix, obj_name),
+                "%s_" % obj_name,
+                "%s_%s_" % (upper_prefix, obj_name.upper()),
+                "%s_%s_%s_" % (prefix, upper_prefix, obj_name.upper()),
+            ],
+        )
+    for enum_name, enum in metadata.get("enums", {}).items():
+        add_entity(
+            "enum",
+            enum_name,
+            1 + len(enum.get("members", {})),
+            [
+                "%s_%s_" % (upper_prefix, enum_name),
+                "%s_%s_%s_" % (prefix, upper_prefix, enum_name),
+            ],
+        )
+    for struct_name in metadata.get("structs", []):
+        add_entity(
+            "struct",
+            struct_name,
+            1,
+            [
+                "%s_%s" % (prefix, struct_name),
+                struct_name,
+                "%s_%s_" % (prefix, base_struct_name(struct_name)),
+            ],
+        )
+    for func_name in metadata.get("functions", {}):
+        add_entity("function", func_name, 1, ["%s_%s" % (prefix, func_name)])
+    for blob_name in metadata.get("blobs", []):
+        add_entity("global", blob_name, 1, ["%s_%s" % (prefix, blob_name), blob_name])
+    add_entity("int constants", "", len(metadata.get("int_constants", [])), [])
+    return entities, prefixes
+
+
+def find_entity(prefixes, name):
+    # Longest prefix first. Generated symbols may add "mp_" before the C name.
+    candidates = [name[3:], name] if name.startswith("mp_") else [name]
+    for candidate in candidates:
+        for length in range(len(candidate), 0, -1):
+            entity = prefixes.get(candidate[:length])
+            if entity:
+                return entity
+    return None
+
+
+def attribute(metadata, symbols):
+    entities, prefixes = get_entities(metadata)
+    unattributed = collections.OrderedDict(
+        (kind, 0) for kind in ["text", "rodata", "data"]
+    )
+    for name, kind, size, is_binding in symbols:
+        entity = find_entity(prefixes, name)
+        if entity:
+            entity.add(name, kind, size, is_binding)
+        elif is_binding:
+            unattributed[kind] += size
+    entities.sort(key=lambda entity: (-entity.total(), -entity.qstrs))
+    return entities, unattributed
+
+
+def print_report(entities, unattributed):
+    columns = "%-14s %-32s %9s %9s %9s %9s %6s %9s"
+    print(
+        columns % ("Kind", "Name", "Text", "Rodata", "Data", "Native", "Qstrs", "Total")
+    )
+    shown = entities[: args.top] if args.top else entities
+    for entity in shown:
+        print(
+            columns
+            % (
+                (entity.kind, entity.name)
+                + tuple(entity.sizes.values())
+                + (entity.qstrs, entity.total())
+            )
+        )
+    if len(shown) < len(entities):
+        print("... %d more" % (len(entities) - len(shown)))
+    print(
+        columns
+        % (
+            "",
+            "total",
+            sum(entity.sizes["text"] for entity in entities),
+            sum(entity.sizes["rodata"] for entity in entities),
+            sum(entity.sizes["data"] for entity in entities),
+            sum(entity.sizes["native"] for entity in entities),
+            sum(entity.qstrs for entity in entities),
+            sum(entity.total() for entity in entities),
+        )
+    )
+    print(
+        columns
+        % (
+            "",
+            "runtime and unattributed",
+            unattributed["text"],
+            unattributed["rodata"],
+            unattributed["data"],
+            "",
+            "",
+            sum(unattributed.values()),
+        )
+    )
+
+
+with open(args.metadata, "r") as metadata_file:
+    metadata = json.load(metadata_file)
+
+symbols = []
+for path in args.map:
+    symbols += read_map(path)
+for path in args.nm:
+    symbols += read_nm(path)
+for path in args.elf:
+    symbols += read_elf(path)
+
+entities, unattributed = attribute(metadata, symbols)
+print_report(entities, unattributed)
+
+if args.output:
+    report = collections.OrderedDict()
+    report["entities"] = [entity.to_json() for entity in entities]
+    report["unattributed"] = unattributed
+    with open(args.output, "w") as report_file:
+        json.dump(report, report_file, indent=4)
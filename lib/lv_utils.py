@@ -26,6 +26,41 @@
 #        self.disp = ili9341(asynchronous=True)
 #        asyncio.Loop.run_forever()
 #
+# Deadline mode:
+#
+#        event_loop = lv_utils.event_loop(deadline=True)
+#
+#   Instead of waking up at a fixed frequency, sleep until LVGL's next timer is due
+#   (the time returned by lv.task_handler, up to max_delay ms). Invalidating the
+#   default display wakes the loop early. Input devices that wake the loop (see below)
+#   can be set to lv.INDEV_MODE.EVENT, so LVGL doesn't poll them.
+#
+# Input:
+#
+#        event_loop.wake_on_pin(Pin(irq_pin, Pin.IN), indev)
+#        lv_utils.event_loop.connect_wake_pin(Pin(irq_pin, Pin.IN), indev)
+#
+#   In all modes, input drivers can call wake(indev) when input is available, e.g. from a
+#   pin interrupt or when a stream is readable. The loop then runs lv.task_handler right away
+#   and reads indev in it, instead of waiting for its next wakeup. With wake_on_input=False
+#   the loop only records the time of the input in the telemetry, to compare the latency.
+#   Drivers created before the event loop use connect_wake_pin, which wakes the running loop,
+#   or the loops started later.
+#
+# Telemetry:
+#
+#        event_loop = lv_utils.event_loop(telemetry=True, telemetry_period=5000)
+#        ...
+#        print(event_loop.telemetry.stats())
+#
+#   Records the task_handler duration (min/avg/max and a histogram), the refresh-to-flush
+#   latency and the effective FPS of the default display, the input-to-flush latency, passes
+#   that could not be scheduled and skipped ticks, without allocating. With telemetry_period
+#   (ms), they are logged and reset periodically.
+#
+# In all modes the LVGL tick is advanced by the time that actually passed (time.ticks_ms),
+# so LVGL time keeps up with the wall clock when wakeups are late or skipped under load.
+#
 # MIT license; Copyright (c) 2021 Amir Gonnen
 #
 ##############################################################################
@@ -33,6 +68,7 @@
 import lvgl as lv
 import micropython
 import sys
+import time
 
 # Try standard machine.Timer, or custom timer from lv_timer, if available
 
@@ -69,8 +105,147 @@ except:
 ##############################################################################
 
 
+class loop_telemetry:
+    # task_handler durations are counted in buckets of up to 1, 2, 4, ... 128 ms, and more
+    HISTOGRAM_BUCKETS = 9
+
+    def __init__(self, period=0):
+        self.period = period
+        self.histogram = [0] * loop_telemetry.HISTOGRAM_BUCKETS
+        self.reset()
+
+    def reset(self):
+        self.start = time.ticks_ms()
+        self.passes = 0
+        self.handler_min_us = 0
+        self.handler_max_us = 0
+        self.handler_total_us = 0
+        self.handler_samples = 0
+        for i in range(loop_telemetry.HISTOGRAM_BUCKETS):
+            self.histogram[i] = 0
+        self.frames = 0
+        self.render_start = None
+        self.input_start = None
+        self.input_max_us = 0
+        self.input_total_us = 0
+        self.input_samples = 0
+        self.flush_max_us = 0
+        self.flush_total_us = 0
+        self.flush_samples = 0
+        self.overflows = 0
+        self.skipped_ticks = 0
+
+    def add_pass(self, us):
+        if not self.passes or us < self.handler_min_us:
+            self.handler_min_us = us
+        if us > self.handler_max_us:
+            self.handler_max_us = us
+        self.passes += 1
+        # Halve the totals rather than let them grow past a small int, which would allocate
+        if self.handler_total_us > 0x1FFFFFFF:
+            self.handler_total_us >>= 1
+            self.handler_samples >>= 1
+        self.handler_total_us += us
+        self.handler_samples += 1
+        bucket = 0
+        ms = us >> 10
+        while ms and bucket < loop_telemetry.HISTOGRAM_BUCKETS - 1:
+            ms >>= 1
+            bucket += 1
+        self.histogram[bucket] += 1
+        if self.period and time.ticks_diff(time.ticks_ms(), self.start) >= self.period:
+            self.log()
+            self.reset()
+
+    def render_start_cb(self, e):
+        if self.render_start is None:
+            self.render_start = time.ticks_us()
+
+    def mark_input(self):
+        # Input arrived. Can be called in Interrupt context
+        if self.input_start is None:
+            self.input_start = time.ticks_us()
+
+    def refr_ready_cb(self, e):
+        # A frame was rendered and flushed. It's the first frame that may show the last input
+        if self.render_start is None:
+            return
+        now = time.ticks_us()
+        us = time.ticks_diff(now, self.render_start)
+        self.render_start = None
+        self.frames += 1
+        if us > self.flush_max_us:
+            self.flush_max_us = us
+        if self.flush_total_us > 0x1FFFFFFF:
+            self.flush_total_us >>= 1
+            self.flush_samples >>= 1
+        self.flush_total_us += us
+        self.flush_samples += 1
+        if self.input_start is None:
+            return
+        us = time.ticks_diff(now, self.input_start)
+        self.input_start = None
+        if us > self.input_max_us:
+            self.input_max_us = us
+        if self.input_total_us > 0x1FFFFFFF:
+            self.input_total_us >>= 1
+            self.input_samples >>= 1
+        self.input_total_us += us
+        self.input_samples += 1
+
+    def handler_avg_us(self):
+        return (
+            self.handler_total_us // self.handler_samples if self.handler_samples else 0
+        )
+
+    def flush_avg_us(self):
+        return self.flush_total_us // self.flush_samples if self.flush_samples else 0
+
+    def input_avg_us(self):
+        return self.input_total_us // self.input_samples if self.input_samples else 0
+
+    def fps(self):
+        elapsed = time.ticks_diff(time.ticks_ms(), self.start)
+        return self.frames * 1000 / elapsed if elapsed > 0 else 0
+
+    def stats(self):
+        return {
+            "fps": self.fps(),
+            "passes": self.passes,
+            "handler_min_us": self.handler_min_us,
+            "handler_avg_us": self.handler_avg_us(),
+            "handler_max_us": self.handler_max_us,
+            "handler_histogram": list(self.histogram),
+            "frames": self.frames,
+            "flush_avg_us": self.flush_avg_us(),
+            "flush_max_us": self.flush_max_us,
+            "input_avg_us": self.input_avg_us(),
+            "input_max_us": self.input_max_us,
+            "overflows": self.overflows,
+            "skipped_ticks": self.skipped_ticks,
+        }
+
+    def log(self):
+        print(
+            "lv_utils: %.1f fps, task_handler %d/%d/%d us, flush %d/%d us, input %d/%d us, %d overflows, %d skipped ticks"
+            % (
+                self.fps(),
+                self.handler_min_us,
+                self.handler_avg_us(),
+                self.handler_max_us,
+                self.flush_avg_us(),
+                self.flush_max_us,
+                self.input_avg_us(),
+                self.input_max_us,
+                self.overflows,
+                self.skipped_ticks,
+            )
+        )
+
+
 class event_loop:
     _current_instance = None
+    _wake_pins = []
 
     def __init__(
         self,
@@ -80,6 +255,11 @@ class event_loop:
         refresh_cb=None,
         asynchronous=False,
         exception_sink=None,
+        deadline=False,
+        max_delay=500,
+        telemetry=False,
+        telemetry_period=0,
+        wake_on_input=True,
     ):
         if self.is_running():
             raise RuntimeError("Event loop is already running!")
@@ -95,37 +275,72 @@ class event_loop:
             exception_sink if exception_sink else self.default_exception_sink
         )
 
+        self.deadline = deadline
+        self.max_delay = max_delay
+        self.next_delay = self.delay
+        self.last_tick = time.ticks_ms()
+        self.handling = False
+        self.wake_on_input = wake_on_input
+        self.wake_indev = None
+        self.wake_pending = False
+        self.wake_pins = []
+        self.display = None
+        self.telemetry = loop_telemetry(telemetry_period) if telemetry else None
+
         self.asynchronous = asynchronous
         if self.asynchronous:
             if not asyncio_available:
                 raise RuntimeError(
                     "Cannot run asynchronous event loop. asyncio is not available!"
                 )
-            self.refresh_event = asyncio.Event()
-            self.refresh_task = asyncio.create_task(self.async_refresh())
-            self.timer_task = asyncio.create_task(self.async_timer())
+            self.init_async()
         else:
-            if Timer:
-                self.timer = Timer(timer_id)
-                self.timer.init(
-                    mode=Timer.PERIODIC, period=self.delay, callback=self.timer_cb
-                )
             self.task_handler_ref = self.task_handler  # Allocation occurs here
             self.max_scheduled = max_scheduled
             self.scheduled = 0
+            if Timer:
+                self.timer = Timer(timer_id)
+                self.timer_cb_ref = self.timer_cb
+                self.arm(self.delay)
+
+        for pin, indev, trigger in event_loop._wake_pins:
+            self.wake_on_pin(pin, indev, trigger)
 
     def init_async(self):
         self.refresh_event = asyncio.Event()
-        self.refresh_task = asyncio.create_task(self.async_refresh())
-        self.timer_task = asyncio.create_task(self.async_timer())
+        # Unlike an Event, a ThreadSafeFlag can be set in Interrupt context.
+        # Without it, wakes set an Event through micropython.schedule
+        if hasattr(asyncio, "ThreadSafeFlag"):
+            self.wake_flag = asyncio.ThreadSafeFlag()
+            self.set_wake_flag_ref = None
+        else:
+            self.wake_flag = asyncio.Event()
+            self.set_wake_flag_ref = self.set_wake_flag  # Allocation occurs here
+        self.wake_task = asyncio.create_task(self.async_wake())
+        if self.deadline:
+            self.refresh_task = asyncio.create_task(self.async_deadline())
+            self.timer_task = None
+        else:
+            self.refresh_task = asyncio.create_task(self.async_refresh())
+            self.timer_task = asyncio.create_task(self.async_timer())
+
+    def arm(self, period):
+        # In deadline mode the timer is re-armed after each pass with the time until LVGL's next timer.
+        # It stays periodic, so the loop goes on if a pass could not be scheduled.
+        self.timer.init(mode=Timer.PERIODIC, period=period, callback=self.timer_cb_ref)
 
     def deinit(self):
         if self.asynchronous:
             self.refresh_task.cancel()
-            self.timer_task.cancel()
+            if self.timer_task:
+                self.timer_task.cancel()
+            self.wake_task.cancel()
         else:
             if Timer:
                 self.timer.deinit()
+        for pin in self.wake_pins:
+            pin.irq(handler=None)
+        self.wake_pins = []
         event_loop._current_instance = None
 
     def disable(self):
@@ -143,15 +358,123 @@ class event_loop:
         return event_loop._current_instance
 
     def task_handler(self, _):
+        delay = self.delay
         try:
             if lv._nesting.value == 0:
-                lv.task_handler()
-                if self.refresh_cb:
-                    self.refresh_cb()
+                if self.deadline:
+                    delay = self.deadline_handler()
+                else:
+                    self.run_task_handler()
+                    if self.refresh_cb:
+                        self.refresh_cb()
             self.scheduled -= 1
         except Exception as e:
             if self.exception_sink:
                 self.exception_sink(e)
+        if self.deadline and delay != self.next_delay:
+            self.next_delay = delay
+            if Timer:
+                self.arm(delay)
+
+    def deadline_handler(self):
+        # Advance the tick and return the time until LVGL's next timer
+        self.advance_tick()
+        delay = self.run_task_handler()
+        if self.refresh_cb:
+            self.refresh_cb()
+        return max(1, min(delay, self.max_delay))
+
+    def run_task_handler(self):
+        # Read the input that woke the loop, and run lv.task_handler
+        if self.display is None and (self.deadline or self.telemetry):
+            self.watch_display()
+        telemetry = self.telemetry
+        if telemetry:
+            start = time.ticks_us()
+        self.handling = True
+        try:
+            indev = self.wake_indev
+            if indev:
+                self.wake_indev = None
+                indev.read()
+            delay = lv.task_handler()
+        finally:
+            self.handling = False
+        if telemetry:
+            telemetry.add_pass(time.ticks_diff(time.ticks_us(), start))
+        if self.wake_pending:
+            # Input arrived during the pass, possibly after the input device was read
+            self.wake_pending = False
+            self.wake()
+        return delay
+
+    def watch_display(self):
+        # Wake up when the default display is invalidated, e.g. by changing a widget,
+        # and record its frames in the telemetry
+        self.display = lv.display_get_default()
+        if not self.display:
+            return
+        if self.deadline:
+            self.display.add_event_cb(
+                self.invalidate_cb, lv.EVENT.INVALIDATE_AREA, None
+            )
+        if self.telemetry:
+            self.display.add_event_cb(
+                self.telemetry.render_start_cb, lv.EVENT.RENDER_START, None
+            )
+            self.display.add_event_cb(
+                self.telemetry.refr_ready_cb, lv.EVENT.REFR_READY, None
+            )
+
+    def invalidate_cb(self, e):
+        if event_loop._current_instance is self:
+            self.wake()
+
+    def wake(self, indev=None):
+        # Run a pass now instead of at the next wakeup, and read indev in it.
+        # Can be called in Interrupt context.
+        # Input during a pass runs another pass after it, other wakes are handled by that pass.
+        if indev:
+            if self.telemetry:
+                self.telemetry.mark_input()
+            if not self.wake_on_input:
+                return
+            self.wake_indev = indev
+            if self.handling:
+                self.wake_pending = True
+                return
+        elif self.handling:
+            return
+        if not self.asynchronous:
+            self.schedule()
+        elif self.set_wake_flag_ref:
+            try:
+                micropython.schedule(self.set_wake_flag_ref, 0)
+            except:
+                if self.telemetry:
+                    self.telemetry.overflows += 1
+        else:
+            self.wake_flag.set()
+
+    def set_wake_flag(self, _):
+        self.wake_flag.set()
+
+    def wake_on_pin(self, pin, indev=None, trigger=None):
+        # Wake up on an interrupt of pin, e.g. the touch interrupt output of a touch controller.
+        # The pin is disconnected by deinit
+        pin.irq(
+            handler=lambda pin: self.wake(indev),
+            trigger=trigger if trigger is not None else pin.IRQ_FALLING,
+        )
+        self.wake_pins.append(pin)
+
+    @staticmethod
+    def connect_wake_pin(pin, indev=None, trigger=None):
+        # Like wake_on_pin, for the running event loop and the ones started later,
+        # so input drivers can be created before the event loop
+        event_loop._wake_pins.append((pin, indev, trigger))
+        if event_loop.is_running():
+            event_loop.current_instance().wake_on_pin(pin, indev, trigger)
 
     def tick(self):
         self.timer_cb(None)
@@ -160,35 +483,86 @@ class event_loop:
         if sys.platform == "darwin":
             while True:
                 self.tick()
+                if self.deadline:
+                    time.sleep_ms(self.next_delay)
 
     def timer_cb(self, t):
         # Can be called in Interrupt context
+        if not self.deadline:
+            self.advance_tick()
+        self.schedule()
+
+    def advance_tick(self):
+        # Advance the tick by the time since the previous call, rather than by the nominal delay,
+        # so the time of late or skipped wakeups is caught up. Can be called in Interrupt context.
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self.last_tick)
+        if elapsed > 0:
+            self.last_tick = now
+            lv.tick_inc(elapsed)
+            if self.telemetry and not self.deadline and elapsed >= 2 * self.delay:
+                self.telemetry.skipped_ticks += elapsed // self.delay - 1
+
+    def schedule(self):
         # Use task_handler_ref since passing self.task_handler would cause allocation.
-        lv.tick_inc(self.delay)
         if self.scheduled < self.max_scheduled:
             try:
                 micropython.schedule(self.task_handler_ref, 0)
                 self.scheduled += 1
+                return
             except:
                 pass
+        if self.telemetry:
+            self.telemetry.overflows += 1
+
+    async def async_wake(self):
+        while True:
+            await self.wake_flag.wait()
+            if self.set_wake_flag_ref:
+                self.wake_flag.clear()
+            if self.deadline:
+                # Interrupt the sleep of async_deadline
+                self.refresh_task.cancel()
+            else:
+                self.refresh_event.set()
 
     async def async_refresh(self):
         while True:
             await self.refresh_event.wait()
             if lv._nesting.value == 0:
                 self.refresh_event.clear()
+                self.advance_tick()
                 try:
-                    lv.task_handler()
+                    self.run_task_handler()
                 except Exception as e:
                     if self.exception_sink:
                         self.exception_sink(e)
                 if self.refresh_cb:
                     self.refresh_cb()
 
+    async def async_deadline(self):
+        # Sleep until LVGL's next timer. async_wake wakes it early by cancelling the sleep,
+        # which doesn't allocate a task per pass like a wait with a timeout
+        delay = self.delay
+        while True:
+            try:
+                await asyncio.sleep_ms(delay)
+            except asyncio.CancelledError:
+                if event_loop._current_instance is not self:
+                    raise
+            if lv._nesting.value == 0:
+                try:
+                    delay = self.deadline_handler()
+                except Exception as e:
+                    delay = self.delay
+                    if self.exception_sink:
+                        self.exception_sink(e)
+            self.next_delay = delay
+
     async def async_timer(self):
         while True:
             await asyncio.sleep_ms(self.delay)
-            lv.tick_inc(self.delay)
+            self.advance_tick()
             self.refresh_event.set()
 
     def default_exception_sink(self, e):
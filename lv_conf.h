@@ -41,7 +41,12 @@
  * - LV_STDLIB_CUSTOM:      Implement the functions externally
  */
 
+/* LV_STDLIB_MICROPYTHON allocates LVGL memory on the MicroPython heap, which is scanned by every GC.
+ * LV_STDLIB_BUILTIN allocates it from a dedicated arena of LV_MEM_SIZE bytes, which the GC doesn't scan
+ * (e.g. make LV_MPY_ARENA_SIZE=1048576) */
+#ifndef LV_USE_STDLIB_MALLOC
 #define LV_USE_STDLIB_MALLOC    LV_STDLIB_MICROPYTHON
+#endif
 #define LV_USE_STDLIB_STRING    LV_STDLIB_BUILTIN
 #define LV_USE_STDLIB_SPRINTF   LV_STDLIB_BUILTIN
 
@@ -54,7 +59,9 @@
 
 #if LV_USE_STDLIB_MALLOC == LV_STDLIB_BUILTIN
     /** Size of memory available for `lv_malloc()` in bytes (>= 2kB) */
+    #ifndef LV_MEM_SIZE
     #define LV_MEM_SIZE (64 * 1024U)          /**< [bytes] */
+    #endif
 
     /** Size of the memory expand for `lv_malloc()` in bytes */
     #define LV_MEM_POOL_EXPAND_SIZE 0
@@ -52,6 +52,9 @@ if (DEFINED LV_CONF_DIR)
 endif()
 
 file(WRITE ${LV_MP} "")
+foreach(_shard ${LV_MP_SHARDS} ${LV_MPY_RUNTIME})
+    file(WRITE ${_shard} "")
+endforeach()
 
 target_link_libraries(usermod_lvgl INTERFACE lvgl_interface)
 
@@ -66,8 +66,62 @@ ALL_LVGL_SRC = $(shell find $(LVGL_DIR) -type f -name '*.h') $(LV_CONF_PATH)
 LVGL_PP = $(BUILD)/lvgl/lvgl.pp.c
 LVGL_MPY = $(BUILD)/lvgl/lv_mpy.c
 LVGL_MPY_METADATA = $(BUILD)/lvgl/lv_mpy.json
+LVGL_MPY_CACHE = $(BUILD)/lvgl/gen_cache
 CFLAGS_USERMOD += $(LV_CFLAGS)
 
+# Set LV_MPY_SHARDS to split the generated module into several C files,
+# which can be compiled in parallel (e.g. make LV_MPY_SHARDS=8 -j8)
+ifneq ($(LV_MPY_SHARDS),)
+LVGL_MPY_SHARD_PREFIX = $(BUILD)/lvgl/lv_mpy_shard
+LVGL_MPY_SHARDS = $(foreach i,$(shell seq 0 $$(($(LV_MPY_SHARDS) - 1))),$(LVGL_MPY_SHARD_PREFIX)_$(i).c)
+LVGL_MPY_GEN_OPTIONS = -S $(LV_MPY_SHARDS) -SP $(LVGL_MPY_SHARD_PREFIX)
+endif
+
+# Set LV_MPY_SHARED_RUNTIME=1 to generate the runtime helpers into their own C file, which is only
+# rewritten (and recompiled) when the generator changes, and can be shared with other generated modules
+ifeq ($(LV_MPY_SHARED_RUNTIME),1)
+LVGL_MPY_RUNTIME_PREFIX = $(BUILD)/lvgl/lv_mpy_runtime
+LVGL_MPY_RUNTIME = $(LVGL_MPY_RUNTIME_PREFIX).c
+LVGL_MPY_GEN_OPTIONS += -R shared -RP $(LVGL_MPY_RUNTIME_PREFIX)
+endif
+
+# Set LV_MPY_ALLOWLIST to a JSON allowlist, or to the application's Python files and directories,
+# to generate only the bindings used by the application (e.g. make LV_MPY_ALLOWLIST="app lib")
+ifneq ($(LV_MPY_ALLOWLIST),)
+LVGL_MPY_ALLOWLIST_SRC = $(shell find $(LV_MPY_ALLOWLIST) -type f \( -name '*.py' -o -name '*.json' \))
+LVGL_MPY_GEN_OPTIONS += $(foreach allowlist,$(LV_MPY_ALLOWLIST),-A $(allowlist)) -AR $(BUILD)/lvgl/lv_mpy_dropped.json
+endif
+
+# Set LV_MPY_FAST_CALL=0 to call all functions through the variable arguments entry point
+# (e.g. to compare with tests/bench/bench_calls.py)
+ifeq ($(LV_MPY_FAST_CALL),0)
+LVGL_MPY_GEN_OPTIONS += --no-fast-call
+endif
+
+# Set LV_MPY_REUSE_CALLBACK_ARGS to more callbacks which don't keep references to their arguments, to reuse
+# their argument objects between calls like flush_cb and read_cb (e.g. make LV_MPY_REUSE_CALLBACK_ARGS="lv_timer_t_timer_cb")
+LVGL_MPY_GEN_OPTIONS += $(foreach callback,$(LV_MPY_REUSE_CALLBACK_ARGS),--reuse-callback-args '$(callback)')
+
+# Set LV_MPY_RETAIN_CALLBACK_ARGS to the callbacks which keep references to their arguments,
+# to create new argument objects on every call instead of reusing them (e.g. make LV_MPY_RETAIN_CALLBACK_ARGS="lv_display_t_flush_cb")
+LVGL_MPY_GEN_OPTIONS += $(foreach callback,$(LV_MPY_RETAIN_CALLBACK_ARGS),--retain-callback-args '$(callback)')
+
+# Set LV_MPY_FLATTEN_ENUMS to the enums whose members are also module int constants,
+# found with a single lookup (e.g. make LV_MPY_FLATTEN_ENUMS="EVENT OBJ_FLAG" for lv.EVENT_CLICKED)
+LVGL_MPY_GEN_OPTIONS += $(foreach enum,$(LV_MPY_FLATTEN_ENUMS),--flatten-enums '$(enum)')
+
+# Set LV_MPY_BINDING_STATS=1 to count the calls and time of every binding, reported by lv._binding_stats()
+ifeq ($(LV_MPY_BINDING_STATS),1)
+CFLAGS_USERMOD += -DMP_LV_BINDING_STATS=1
+endif
+
+# Set LV_MPY_ARENA_SIZE to allocate LVGL memory from a dedicated arena of that many bytes instead of the
+# MicroPython heap, so the GC doesn't scan it (e.g. make LV_MPY_ARENA_SIZE=1048576).
+# MP_LV_PIN_REFS is detected by the module, but the shared runtime needs it explicitly
+ifneq ($(LV_MPY_ARENA_SIZE),)
+CFLAGS_USERMOD += -DLV_USE_STDLIB_MALLOC=LV_STDLIB_BUILTIN -DLV_MEM_SIZE=$(LV_MPY_ARENA_SIZE)U -DMP_LV_PIN_REFS=1
+endif
+
 # MAKE SURE LV_CONF_PATH is a STRING
 CFLAGS_USERMOD += -DLV_CONF_PATH='"$(LV_CONF_PATH)"' -Wno-deprecated-declarations
 # CFLAGS_USERMOD += -DLV_CONF_PATH=$(LV_CONF_PATH)
@@ -76,7 +130,7 @@ CFLAGS_USERMOD += -DLV_CONF_PATH='"$(LV_CONF_PATH)"' -Wno-deprecated-declaration
 # CFLAGS DEBUG
 $(info CFLAGS_USERMOD is $(CFLAGS_USERMOD))
 
-$(LVGL_MPY): $(ALL_LVGL_SRC) $(LVGL_BINDING_DIR)/gen/gen_mpy.py 
+$(LVGL_MPY): $(ALL_LVGL_SRC) $(LVGL_BINDING_DIR)/gen/gen_mpy.py $(LVGL_MPY_ALLOWLIST_SRC)
 	$(ECHO) "LVGL-GEN $@"
 	$(Q)mkdir -p $(dir $@)
 	$(Q)$(CPP) -DPYCPARSER -x c \
@@ -85,11 +139,20 @@ $(LVGL_MPY): $(ALL_LVGL_SRC) $(LVGL_BINDING_DIR)/gen/gen_mpy.py
 		-I $(LVGL_BINDING_DIR)/stubs/include \
 		$(CFLAGS_USERMOD) \
 		$(LVGL_DIR)/lvgl_private.h > $(LVGL_PP)
-	$(Q)$(PYTHON) $(LVGL_BINDING_DIR)/gen/gen_mpy.py -M lvgl -MP lv -MD $(LVGL_MPY_METADATA) -E $(LVGL_PP) $(LVGL_DIR)/lvgl.h > $@
+	$(Q)$(PYTHON) $(LVGL_BINDING_DIR)/gen/gen_mpy.py -M lvgl -MP lv -MD $(LVGL_MPY_METADATA) -C $(LVGL_MPY_CACHE) $(LVGL_MPY_GEN_OPTIONS) -E $(LVGL_PP) $(LVGL_DIR)/lvgl.h > $@
+
+# Shards and the shared runtime are generated together with $(LVGL_MPY), and only rewritten when their content changes
+$(LVGL_MPY_SHARDS) $(LVGL_MPY_RUNTIME): $(LVGL_MPY) ;
 
 .PHONY: LVGL_MPY
 LVGL_MPY: $(LVGL_MPY)
 
+# Benchmark the generator on the preprocessed headers (e.g. make LVGL_MPY_BENCH LV_MPY_BENCH_BUDGET=60)
+.PHONY: LVGL_MPY_BENCH
+LVGL_MPY_BENCH: $(LVGL_MPY)
+	$(ECHO) "LVGL-GEN-BENCH $(BUILD)/lvgl/gen_mpy_bench.json"
+	$(Q)$(PYTHON) $(LVGL_BINDING_DIR)/gen/gen_mpy_bench.py -L $(LVGL_DIR) -E $(LVGL_PP) -o $(BUILD)/lvgl/gen_mpy_bench.json $(if $(LV_MPY_BENCH_BUDGET),--budget $(LV_MPY_BENCH_BUDGET))
+
 CFLAGS_USERMOD += -Wno-unused-function
 CFLAGS_EXTRA += -Wno-unused-function
 
@@ -104,4 +167,4 @@ ifeq ($(LV_BUILD_EXAMPLES), 1)
 SRC_USERMOD_LIB_C += $(shell find $(LVGL_DIR)/examples -type f -name "*.c")
 endif
 
-SRC_USERMOD_C += $(LVGL_MPY)
+SRC_USERMOD_C += $(LVGL_MPY) $(LVGL_MPY_SHARDS) $(LVGL_MPY_RUNTIME)
@@ -4,12 +4,26 @@ find_program(AWK awk mawk gawk)
 
 set(LV_BINDINGS_DIR ${CMAKE_CURRENT_LIST_DIR})
 
+# List the shard files generated for OUTPUT, when it's split into SHARDS C files
+
+function(lv_shard_sources OUTPUT SHARDS RESULT)
+    set(_shard_sources)
+    if(SHARDS)
+        string(REGEX REPLACE "\\.c$" "_shard" _shard_prefix ${OUTPUT})
+        math(EXPR _last_shard "${SHARDS} - 1")
+        foreach(_i RANGE ${_last_shard})
+            list(APPEND _shard_sources ${_shard_prefix}_${_i}.c)
+        endforeach()
+    endif()
+    set(${RESULT} ${_shard_sources} PARENT_SCOPE)
+endfunction()
+
 # Common function for creating LV bindings
 
 function(lv_bindings)
     set(_options)
-    set(_one_value_args OUTPUT)
-    set(_multi_value_args INPUT DEPENDS COMPILE_OPTIONS PP_OPTIONS GEN_OPTIONS FILTER)
+    set(_one_value_args OUTPUT SHARDS RUNTIME)
+    set(_multi_value_args INPUT DEPENDS COMPILE_OPTIONS PP_OPTIONS GEN_OPTIONS FILTER ALLOWLIST)
     cmake_parse_arguments(
         PARSE_ARGV 0 LV
         "${_options}"
@@ -19,6 +33,41 @@ function(lv_bindings)
 
     set(LV_PP ${LV_OUTPUT}.pp)
     set(LV_MPY_METADATA ${LV_OUTPUT}.json)
+    set(LV_MPY_CACHE ${CMAKE_BINARY_DIR}/lv_gen_cache)
+
+    lv_shard_sources(${LV_OUTPUT} "${LV_SHARDS}" LV_SHARD_SOURCES)
+    if(LV_SHARDS)
+        string(REGEX REPLACE "\\.c$" "_shard" LV_SHARD_PREFIX ${LV_OUTPUT})
+        set(LV_SHARD_OPTIONS -S ${LV_SHARDS} -SP ${LV_SHARD_PREFIX})
+    endif()
+
+    # All the bindings with the same RUNTIME prefix share its runtime C file,
+    # which is listed as the output of the first of them only
+    set(LV_RUNTIME_OPTIONS)
+    set(LV_RUNTIME_SOURCES)
+    if(LV_RUNTIME)
+        set(LV_RUNTIME_OPTIONS -R shared -RP ${LV_RUNTIME})
+        get_property(_runtime_sources GLOBAL PROPERTY LV_RUNTIME_SOURCES)
+        if(NOT "${LV_RUNTIME}.c" IN_LIST _runtime_sources)
+            set(LV_RUNTIME_SOURCES ${LV_RUNTIME}.c)
+            set_property(GLOBAL APPEND PROPERTY LV_RUNTIME_SOURCES ${LV_RUNTIME}.c)
+        endif()
+    endif()
+
+    set(LV_ALLOWLIST_OPTIONS)
+    set(LV_ALLOWLIST_SOURCES)
+    foreach(_allowlist ${LV_ALLOWLIST})
+        list(APPEND LV_ALLOWLIST_OPTIONS -A ${_allowlist})
+        if(IS_DIRECTORY ${_allowlist})
+            file(GLOB_RECURSE _allowlist_sources ${_allowlist}/*.py)
+            list(APPEND LV_ALLOWLIST_SOURCES ${_allowlist_sources})
+        else()
+            list(APPEND LV_ALLOWLIST_SOURCES ${_allowlist})
+        endif()
+    endforeach()
+    if(LV_ALLOWLIST)
+        list(APPEND LV_ALLOWLIST_OPTIONS -AR ${LV_OUTPUT}.dropped.json)
+    endif()
 
     add_custom_command(
         OUTPUT 
@@ -102,11 +151,14 @@ function(lv_bindings)
     add_custom_command(
         OUTPUT
             ${LV_OUTPUT}
+            ${LV_SHARD_SOURCES}
+            ${LV_RUNTIME_SOURCES}
         COMMAND
-            ${Python3_EXECUTABLE} ${LV_BINDINGS_DIR}/gen/gen_mpy.py ${LV_GEN_OPTIONS} -MD ${LV_MPY_METADATA} -E ${LV_PP_FILTERED} -J ${LV_JSON} ${LV_INPUT} > ${LV_OUTPUT} || (rm -f ${LV_OUTPUT} && /bin/false)
+            ${Python3_EXECUTABLE} ${LV_BINDINGS_DIR}/gen/gen_mpy.py ${LV_GEN_OPTIONS} -MD ${LV_MPY_METADATA} -C ${LV_MPY_CACHE} ${LV_SHARD_OPTIONS} ${LV_RUNTIME_OPTIONS} ${LV_ALLOWLIST_OPTIONS} -E ${LV_PP_FILTERED} -J ${LV_JSON} ${LV_INPUT} > ${LV_OUTPUT} || (rm -f ${LV_OUTPUT} && /bin/false)
         DEPENDS
             ${LV_BINDINGS_DIR}/gen/gen_mpy.py
             ${LV_PP_FILTERED}
+            ${LV_ALLOWLIST_SOURCES}
             ${LV_JSON}
         COMMAND_EXPAND_LISTS
     )
@@ -118,6 +170,18 @@ endfunction()
 set(LVGL_DIR ${LV_BINDINGS_DIR}/lvgl)
 
 set(LV_MP ${CMAKE_BINARY_DIR}/lv_mp.c)
+
+# Set LV_MPY_SHARDS to split the LVGL bindings into several C files,
+# which can be compiled in parallel
+lv_shard_sources(${LV_MP} "${LV_MPY_SHARDS}" LV_MP_SHARDS)
+
+# Set LV_MPY_SHARED_RUNTIME to generate the runtime helpers once into their own C file,
+# shared by the LVGL bindings and the other bindings (espidf)
+if(LV_MPY_SHARED_RUNTIME)
+    set(LV_MPY_RUNTIME_PREFIX ${CMAKE_BINARY_DIR}/lv_mpy_runtime)
+    set(LV_MPY_RUNTIME ${LV_MPY_RUNTIME_PREFIX}.c)
+endif()
+
 if(ESP_PLATFORM)
     set(LV_ESPIDF ${CMAKE_BINARY_DIR}/lv_espidf.c)
 endif()
@@ -138,6 +202,14 @@ function(all_lv_bindings)
             ${LVGL_HEADERS}
         GEN_OPTIONS
             -M lvgl -MP lv
+        SHARDS
+            ${LV_MPY_SHARDS}
+        RUNTIME
+            ${LV_MPY_RUNTIME_PREFIX}
+        # Set LV_MPY_ALLOWLIST to a JSON allowlist, or to the application's Python files and directories,
+        # to generate only the LVGL bindings used by the application
+        ALLOWLIST
+            ${LV_MPY_ALLOWLIST}
     )
         
     # ESPIDF bindings
@@ -153,6 +225,8 @@ function(all_lv_bindings)
                 ${LV_ESPIDF_HEADERS}
             GEN_OPTIONS
                  -M espidf
+            RUNTIME
+                ${LV_MPY_RUNTIME_PREFIX}
             FILTER
                 i2s_ll.h
                 i2s_hal.h
@@ -177,6 +251,8 @@ set(LV_INCLUDE
 
 set(LV_SRC
     ${LV_MP}
+    ${LV_MP_SHARDS}
+    ${LV_MPY_RUNTIME}
 )
 
 if(ESP_PLATFORM)
@@ -0,0 +1,54 @@
+import lvgl as lv
+import array
+
+# This is a basic test of C arrays returned by functions:
+# slicing, len(), iteration and the buffer protocol.
+
+lv.init()
+display = lv.display_create(64, 64)
+scr = lv.obj()
+chart = lv.chart(scr)
+chart.set_point_count(8)
+ser = chart.add_series(lv.color_hex(0xFF0000), lv.chart.AXIS.PRIMARY_Y)
+
+ys = chart.get_y_array(ser)
+print(ys)
+
+# The length of the array is unknown, slices need an end index
+ys[0:8] = array.array("i", [-4, -3, -2, -1, 0, 1, 2, 3])
+print(list(ys[0:8]))
+print(ys[0], ys[7])
+
+ys.__set_len__(8)
+print(ys, len(ys))
+print(sum(ys))
+ys[2:4] = [20, 30]
+print(list(ys))
+print(ys[-1])
+print(len(memoryview(ys)), memoryview(ys)[2])
+
+try:
+    ys[::2]
+except NotImplementedError:
+    print("NotImplementedError")
+
+# Buffers of another element type are converted element by element
+ys[0:2] = array.array("h", [-5, 5])
+print(ys[0], ys[1])
+
+print(hash(ys) == hash(ys))
+
+ys = chart.get_y_array(ser)
+try:
+    ys[2:]
+except ValueError:
+    print("ValueError")
+
+# Arrays of structs can be given as a packed buffer, passed by pointer
+points = array.array("i", [5, 6, 10, 20])
+line = lv.line(scr)
+line.set_points(points, 2)
+point = line.get_points()
+print(point.x, point.y)
+points[0] = 7
+print(point.x)
@@ -0,0 +1,91 @@
+import lvgl as lv
+import gc
+
+# This is a basic test of the callbacks and arguments that LVGL keeps:
+# they survive a GC while LVGL holds them, and are released once LVGL frees their owner.
+# lv._pinned() only exists when LVGL memory is not on the MicroPython heap.
+
+pinned = getattr(lv, "_pinned", lambda: 0)
+
+lv.init()
+display = lv.display_create(64, 64)
+buf = bytearray(64 * 8 * 4)
+display.set_buffers(buf, None, len(buf), lv.DISPLAY_RENDER_MODE.PARTIAL)
+display.set_flush_cb(lambda disp, area, px_map: disp.flush_ready())
+scr = lv.screen_active()
+
+
+def run(ms):
+    for _ in range(ms // 10):
+        lv.tick_inc(10)
+        lv.timer_handler()
+
+
+run(50)
+base = pinned()
+
+# A timer deleted by LVGL after its last run
+timer = lv.timer_create(lambda t: print("timer"), 20, None)
+timer.set_repeat_count(1)
+timer = None
+gc.collect()
+run(50)
+print(pinned() == base)
+
+# An async call
+lv.async_call(lambda user_data: print("async"), None)
+gc.collect()
+run(20)
+print(pinned() == base)
+
+# An animation, copied by LVGL when it starts
+obj = lv.obj(scr)
+a = lv.anim_t()
+a.init()
+a.set_var(obj)
+a.set_values(0, 10)
+a.set_duration(30)
+a.set_custom_exec_cb(lambda a, value: None)
+a.set_completed_cb(lambda a: print("anim completed"))
+a.start()
+a = None
+gc.collect()
+run(100)
+obj.delete()
+obj = None
+print(pinned() == base)
+
+# An event callback of an object, released when the object is deleted
+obj = lv.obj(scr)
+obj.add_event_cb(lambda e: print("clicked"), lv.EVENT.CLICKED, None)
+gc.collect()
+obj.send_event(lv.EVENT.CLICKED, None)
+obj.delete()
+obj = None
+run(10)
+print(pinned() == base)
+
+# An event callback removed from its object, and a style kept by it
+obj = lv.obj(scr)
+obj.add_event_cb(lambda e: print("removed"), lv.EVENT.CLICKED, None)
+print(obj.remove_event(obj.get_event_count() - 1))
+obj.send_event(lv.EVENT.CLICKED, None)
+style = lv.style_t()
+style.init()
+style.set_bg_opa(lv.OPA.COVER)
+obj.add_style(style, 0)
+style = None
+gc.collect()
+print(obj.get_style_bg_opa(0))
+obj.delete()
+obj = None
+run(10)
+print(pinned() == base)
+
+# A timer deleted explicitly
+timer = lv.timer_create(lambda t: print("not called"), 1000, None)
+gc.collect()
+timer.delete()
+timer = None
+run(10)
+print(pinned() == base)
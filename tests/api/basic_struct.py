@@ -0,0 +1,30 @@
+import lvgl as lv
+import gc
+
+# This is a basic test of struct initialization from dicts and tuples.
+
+area = lv.area_t({"x1": 1, "y1": 2, "x2": 30, "y2": 40})
+print(area.x1, area.y1, area.x2, area.y2)
+
+# Tuples set the fields in declaration order
+area = lv.area_t((1, 2, 30, 40))
+print(area.get_width(), area.get_height())
+point = lv.point_t((5, -6))
+print(point.x, point.y)
+
+# Nested structs can be given as dicts or tuples as well
+data = lv.indev_data_t({"point": (3, 4), "state": lv.INDEV_STATE.PRESSED})
+print(data.point.x, data.point.y, data.state == lv.INDEV_STATE.PRESSED)
+
+# Nested structs are views of their parent, which they keep alive
+point = lv.indev_data_t({"point": (7, 8)}).point
+gc.collect()
+point.x += 1
+print(point.x, point.y, data.point is data.point)
+
+print(lv.area_t.__FIELDS__)
+
+try:
+    lv.point_t((1, 2, 3))
+except TypeError:
+    print("TypeError")
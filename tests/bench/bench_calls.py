@@ -0,0 +1,52 @@
+import lvgl as lv
+from bench_utils import BATCH, bench, print_results
+
+# Microbenchmark of the binding call overhead.
+# Measures how many calls per second are made to functions with 0 to 3 arguments
+# (fixed arity entry points) and with more arguments (variable arguments entry point).
+#
+# To compare with and without fixed arity entry points, run it on a unix port built
+# normally and on one built with LV_MPY_FAST_CALL=0, e.g. from micropython/tests:
+#   ../ports/unix/build-lvgl/micropython ../../user_modules/lv_binding_micropython/tests/bench/bench_calls.py
+
+lv.init()
+display = lv.display_create(64, 64)
+scr = lv.obj()
+obj = lv.obj(scr)
+area = lv.area_t()
+
+
+def call_0_args():
+    for _ in range(BATCH):
+        lv.tick_get()
+
+
+def call_1_arg():
+    for _ in range(BATCH):
+        obj.get_x()
+
+
+def call_2_args():
+    for _ in range(BATCH):
+        obj.set_x(10)
+
+
+def call_3_args():
+    for _ in range(BATCH):
+        obj.set_pos(10, 20)
+
+
+def call_5_args():
+    for _ in range(BATCH):
+        area.set(0, 0, 10, 20)
+
+
+results = {
+    "0 args": bench("tick_get()", call_0_args),
+    "1 arg": bench("obj.get_x()", call_1_arg),
+    "2 args": bench("obj.set_x(x)", call_2_args),
+    "3 args": bench("obj.set_pos(x, y)", call_3_args),
+    "5 args": bench("area.set(x1, y1, x2, y2)", call_5_args),
+}
+
+print_results(results)
@@ -0,0 +1,54 @@
+import lvgl as lv
+from bench_utils import BATCH, bench, print_results
+
+# Microbenchmark of constant lookups.
+# Measures how many lookups per second are made of enum members (lv.EVENT.CLICKED), of enum members
+# nested in a class (lv.obj.FLAG.HIDDEN), and of the same constants flattened into module int
+# constants (lv.EVENT_CLICKED), compared with a local variable.
+# Enum members are searched by binary search in a table sorted by name, so the cost grows slowly
+# with the size of the enum.
+#
+# Flattened constants are only generated for the enums listed in LV_MPY_FLATTEN_ENUMS, so run it
+# on a unix port built with make LV_MPY_FLATTEN_ENUMS="EVENT OBJ_FLAG", e.g. from micropython/tests:
+#   ../ports/unix/build-lvgl/micropython ../../user_modules/lv_binding_micropython/tests/bench/bench_enums.py
+# The flash used by each enum is reported by gen/gen_mpy_footprint.py.
+
+
+def local_constant():
+    clicked = 7
+    for _ in range(BATCH):
+        clicked
+
+
+def enum_member():
+    for _ in range(BATCH):
+        lv.EVENT.CLICKED
+
+
+def nested_enum_member():
+    for _ in range(BATCH):
+        lv.obj.FLAG.HIDDEN
+
+
+def flat_constant():
+    for _ in range(BATCH):
+        lv.EVENT_CLICKED
+
+
+def flat_nested_constant():
+    for _ in range(BATCH):
+        lv.OBJ_FLAG_HIDDEN
+
+
+results = {
+    "local": bench("local variable", local_constant, "lookups"),
+    "enum": bench("lv.EVENT.CLICKED", enum_member, "lookups"),
+    "nested_enum": bench("lv.obj.FLAG.HIDDEN", nested_enum_member, "lookups"),
+}
+if hasattr(lv, "EVENT_CLICKED"):
+    results["flat"] = bench("lv.EVENT_CLICKED", flat_constant, "lookups")
+if hasattr(lv, "OBJ_FLAG_HIDDEN"):
+    results["flat_nested"] = bench(
+        "lv.OBJ_FLAG_HIDDEN", flat_nested_constant, "lookups"
+    )
+print_results(results)
@@ -0,0 +1,112 @@
+import lvgl as lv
+import lv_utils
+import asyncio
+from bench_utils import print_results
+
+# Benchmark of the lv_utils event loop modes.
+# Measures how many passes the loop makes per second on an idle screen, and the latency from a press
+# of an input device to the flush of the pressed button, as recorded by the event loop telemetry:
+# - polled: periodic mode (waking up at freq) where the input is only polled by LVGL
+# - wake: periodic mode where the input wakes the loop, as an interrupt driven driver would
+# - deadline: deadline mode (sleeping until LVGL's next timer) where the input wakes the loop,
+#   and LVGL doesn't poll the input device if lv.INDEV_MODE.EVENT is available
+#
+# From micropython/tests:
+#   ../ports/unix/build-lvgl/micropython ../../user_modules/lv_binding_micropython/tests/bench/bench_event_loop.py
+
+IDLE_MS = 2000
+PRESSES = 20
+
+lv.init()
+display = lv.display_create(64, 64)
+buf = bytearray(64 * 8 * lv.color_format_get_size(display.get_color_format()))
+display.set_buffers(buf, None, len(buf), lv.DISPLAY_RENDER_MODE.PARTIAL)
+flushes = 0
+
+
+def flush_cb(disp, area, px_map):
+    global flushes
+    flushes += 1
+    disp.flush_ready()
+
+
+display.set_flush_cb(flush_cb)
+
+pressed = False
+
+
+def read_cb(indev, data):
+    data.point = lv.point_t({"x": 32, "y": 32})
+    data.state = lv.INDEV_STATE.PRESSED if pressed else lv.INDEV_STATE.RELEASED
+
+
+indev = lv.indev_create()
+indev.set_type(lv.INDEV_TYPE.POINTER)
+indev.set_read_cb(read_cb)
+
+button = lv.button(lv.screen_active())
+button.set_size(64, 64)
+passes = 0
+
+
+def count_pass():
+    global passes
+    passes += 1
+
+
+async def press(loop, state):
+    # Press or release the button, signal the input and wait until the display is flushed
+    global pressed
+    pressed = state
+    before = flushes
+    loop.wake(indev)
+    while flushes == before:
+        await asyncio.sleep_ms(0)
+
+
+async def bench(name, deadline, wake_on_input):
+    global passes
+    if hasattr(lv, "INDEV_MODE"):
+        indev.set_mode(lv.INDEV_MODE.EVENT if deadline else lv.INDEV_MODE.TIMER)
+    loop = lv_utils.event_loop(
+        asynchronous=True,
+        deadline=deadline,
+        wake_on_input=wake_on_input,
+        telemetry=True,
+        refresh_cb=count_pass,
+    )
+    await asyncio.sleep_ms(200)  # Let the first frame render
+
+    passes = 0
+    await asyncio.sleep_ms(IDLE_MS)
+    idle = passes * 1000 // IDLE_MS
+
+    telemetry = loop.telemetry
+    telemetry.reset()
+    for _ in range(PRESSES):
+        await press(loop, True)
+        await press(loop, False)
+        await asyncio.sleep_ms(50)
+
+    loop.deinit()
+    print(
+        "%-10s %6d passes/s idle %8d us input latency (max %d us)"
+        % (name, idle, telemetry.input_avg_us(), telemetry.input_max_us)
+    )
+    return {
+        "idle_passes_per_s": idle,
+        "latency_us": telemetry.input_avg_us(),
+        "latency_max_us": telemetry.input_max_us,
+    }
+
+
+async def main():
+    results = {
+        "polled": await bench("polled", False, False),
+        "wake": await bench("wake", False, True),
+        "deadline": await bench("deadline", True, True),
+    }
+    print_results(results)
+
+
+asyncio.run(main())
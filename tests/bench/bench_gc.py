@@ -0,0 +1,63 @@
+import lvgl as lv
+import time
+from bench_utils import print_results
+import gc
+
+# Benchmark of the GC pause with many LVGL widgets.
+# Creates N widgets with an event callback each, then measures how long gc.collect() takes,
+# compared with an empty screen. When LVGL memory is on the MicroPython heap, each collection
+# scans all the widgets. With a dedicated LVGL arena (make LV_MPY_ARENA_SIZE=...) it only scans
+# the Python objects of the widgets and their callbacks.
+#
+# Run it on a unix port built normally and on one built with an arena, e.g. from micropython/tests:
+#   ../ports/unix/build-lvgl/micropython -X heapsize=32M ../../user_modules/lv_binding_micropython/tests/bench/bench_gc.py
+
+N = 2000
+COLLECTIONS = 20
+WIDGETS = ["obj", "label", "button", "slider", "switch", "checkbox", "bar", "led"]
+
+lv.init()
+display = lv.display_create(64, 64)
+scr = lv.obj()
+widgets = [getattr(lv, name) for name in WIDGETS if hasattr(lv, name)]
+
+
+def on_event(e):
+    pass
+
+
+def gc_pause():
+    # Average and maximum time of gc.collect()
+    total = 0
+    worst = 0
+    for _ in range(COLLECTIONS):
+        start = time.ticks_us()
+        gc.collect()
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        total += elapsed
+        worst = max(worst, elapsed)
+    return total // COLLECTIONS, worst
+
+
+empty_us, empty_max_us = gc_pause()
+for i in range(N):
+    widget = widgets[i % len(widgets)](scr)
+    widget.add_event_cb(on_event, lv.EVENT.CLICKED, None)
+widget = None
+lv.timer_handler()
+full_us, full_max_us = gc_pause()
+gc.collect()
+
+print("%-24s %10d us (max %d us)" % ("gc, no widgets", empty_us, empty_max_us))
+print("%-24s %10d us (max %d us)" % ("gc, %d widgets" % N, full_us, full_max_us))
+print("%-24s %10d bytes" % ("heap used", gc.mem_alloc()))
+print_results(
+    {
+        "widgets": N,
+        "empty_gc_us": empty_us,
+        "empty_gc_max_us": empty_max_us,
+        "gc_us": full_us,
+        "gc_max_us": full_max_us,
+        "heap_bytes": gc.mem_alloc(),
+    }
+)
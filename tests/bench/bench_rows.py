@@ -0,0 +1,66 @@
+import lvgl as lv
+import time
+from bench_utils import print_results
+import gc
+
+# Benchmark of dynamic screens, which create and delete many objects with event callbacks.
+# Each round creates N rows (a button with a label and a click callback) in a list,
+# deletes them, and runs the timer handler. Reports the time of a round, the heap
+# allocated by a round, and the time of a garbage collection afterwards.
+#
+# The callback tables of deleted rows are reused by the rows of the next round,
+# up to MP_LV_CALLBACKS_POOL_SIZE (32) of them, so after the first round, rounds should allocate less.
+# From micropython/tests:
+#   ../ports/unix/build-lvgl/micropython ../../user_modules/lv_binding_micropython/tests/bench/bench_rows.py
+
+N = 30
+ROUNDS = 100
+
+lv.init()
+display = lv.display_create(64, 64)
+scr = lv.obj()
+rows = lv.obj(scr)
+clicks = 0
+
+
+def on_click(e):
+    global clicks
+    clicks += 1
+
+
+def run_round():
+    for i in range(N):
+        row = lv.button(rows)
+        row.add_event_cb(on_click, lv.EVENT.CLICKED, None)
+        lv.label(row).set_text("row %d" % i)
+    rows.clean()
+    lv.timer_handler()
+
+
+run_round()
+gc.collect()
+round_us = []
+alloc = []
+gc_us = []
+for _ in range(ROUNDS):
+    before = gc.mem_alloc()
+    start = time.ticks_us()
+    run_round()
+    round_us.append(time.ticks_diff(time.ticks_us(), start))
+    alloc.append(gc.mem_alloc() - before)
+    start = time.ticks_us()
+    gc.collect()
+    gc_us.append(time.ticks_diff(time.ticks_us(), start))
+
+print("%-24s %10d us" % ("round of %d rows" % N, sum(round_us) // ROUNDS))
+print("%-24s %10d bytes" % ("allocated per round", sum(alloc) // ROUNDS))
+print("%-24s %10d us" % ("gc.collect()", sum(gc_us) // ROUNDS))
+print_results(
+    {
+        "rows": N,
+        "rounds": ROUNDS,
+        "round_us": sum(round_us) // ROUNDS,
+        "alloc_bytes": sum(alloc) // ROUNDS,
+        "gc_us": sum(gc_us) // ROUNDS,
+    }
+)
@@ -0,0 +1,56 @@
+import lvgl as lv
+from bench_utils import BATCH, bench, print_results
+
+# Microbenchmark of method calls on Python subclasses of LVGL widgets.
+# Measures how many method calls per second are made on a plain lv.button, on an instance
+# of a Python subclass of it, and on an instance of a subclass of that subclass.
+# The native object of a subclass instance is found through a cache of the recently used subclasses,
+# so the subclasses should come close to the plain button. SUBCLASSES more subclasses are used in
+# turn, to include misses of that cache.
+#
+# From micropython/tests:
+#   ../ports/unix/build-lvgl/micropython ../../user_modules/lv_binding_micropython/tests/bench/bench_subclass.py
+
+SUBCLASSES = 8
+
+lv.init()
+display = lv.display_create(64, 64)
+scr = lv.obj()
+
+
+class SymbolButton(lv.button):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.label = lv.label(self)
+
+
+class ToggleButton(SymbolButton):
+    pass
+
+
+plain = lv.button(scr)
+subclass = SymbolButton(scr)
+nested = ToggleButton(scr)
+others = [type("Button%d" % i, (lv.button,), {})(scr) for i in range(SUBCLASSES)]
+
+
+def calls(obj):
+    def run():
+        for _ in range(BATCH):
+            obj.set_x(10)
+
+    return run
+
+
+def calls_mixed():
+    for i in range(BATCH):
+        others[i % SUBCLASSES].set_x(10)
+
+
+results = {
+    "plain": bench("lv.button", calls(plain)),
+    "subclass": bench("subclass", calls(subclass)),
+    "nested_subclass": bench("subclass of subclass", calls(nested)),
+    "mixed_subclasses": bench("%d subclasses" % SUBCLASSES, calls_mixed),
+}
+print_results(results)
@@ -0,0 +1,81 @@
+import lvgl as lv
+import lv_utils
+import asyncio
+import time
+from bench_utils import print_results
+
+# Stress test of the LVGL tick under CPU load.
+# Runs an ANIM_MS animation with the asyncio event loop while a coroutine keeps the CPU busy for
+# LOAD_MS at a time, which makes the event loop wake up late, and measures how long the animation
+# takes by the wall clock. The event loop advances the tick by the time that actually passed,
+# so the animation should take ANIM_MS at any load, give or take a frame.
+#
+# From micropython/tests:
+#   ../ports/unix/build-lvgl/micropython ../../user_modules/lv_binding_micropython/tests/bench/bench_tick.py
+
+ANIM_MS = 2000
+LOAD_MS = [0, 20, 50, 100]
+
+lv.init()
+display = lv.display_create(64, 64)
+obj = lv.obj(lv.screen_active())
+done = False
+
+
+def exec_cb(a, value):
+    obj.set_x(value)
+
+
+def completed_cb(a):
+    global done
+    done = True
+
+
+async def load(ms):
+    # Busy wait for ms, then let the other coroutines run
+    while not done:
+        start = time.ticks_ms()
+        while time.ticks_diff(time.ticks_ms(), start) < ms:
+            pass
+        await asyncio.sleep_ms(0)
+
+
+async def bench(load_ms, deadline):
+    global done
+    done = False
+    loop = lv_utils.event_loop(asynchronous=True, deadline=deadline)
+    a = lv.anim_t()
+    a.init()
+    a.set_var(obj)
+    a.set_values(0, 100)
+    if hasattr(a, "set_duration"):
+        a.set_duration(ANIM_MS)
+    else:
+        a.set_time(ANIM_MS)
+    a.set_custom_exec_cb(exec_cb)
+    a.set_completed_cb(completed_cb)
+    start = time.ticks_ms()
+    a.start()
+    if load_ms:
+        asyncio.create_task(load(load_ms))
+    while not done:
+        await asyncio.sleep_ms(1)
+    elapsed = time.ticks_diff(time.ticks_ms(), start)
+    loop.deinit()
+    error = (elapsed - ANIM_MS) * 100 // ANIM_MS
+    mode = "deadline" if deadline else "periodic"
+    print("%-8s load %3d ms %6d ms (%+d%%)" % (mode, load_ms, elapsed, error))
+    return elapsed
+
+
+async def main():
+    results = {}
+    for deadline in (False, True):
+        for load_ms in LOAD_MS:
+            key = "%s_load_%d" % ("deadline" if deadline else "periodic", load_ms)
+            results[key] = await bench(load_ms, deadline)
+    results["anim_ms"] = ANIM_MS
+    print_results(results)
+
+
+asyncio.run(main())
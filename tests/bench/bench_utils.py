@@ -0,0 +1,26 @@
+import time
+import json
+
+# Helpers shared by the benchmarks in this directory, which import it from the script's directory.
+
+DURATION_MS = 1000
+BATCH = 100
+
+
+def bench(name, func, unit="calls"):
+    # Warm up, then count batches of func (BATCH operations each) until DURATION_MS passes
+    func()
+    count = 0
+    start = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), start) < DURATION_MS:
+        func()
+        count += BATCH
+    elapsed = time.ticks_diff(time.ticks_ms(), start)
+    rate = count * 1000 // elapsed
+    print("%-24s %10d %s/s" % (name, rate, unit))
+    return rate
+
+
+def print_results(results):
+    # The last line of every benchmark is its results as JSON, to compare runs
+    print(json.dumps(results))
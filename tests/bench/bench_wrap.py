@@ -0,0 +1,66 @@
+import lvgl as lv
+import time
+from bench_utils import print_results
+
+# Benchmark of wrapping LVGL objects with Python objects.
+# Creates N children of several widget classes, clears their wrappers, and measures
+# how long it takes get_child() to wrap each child again (finding the child's type
+# from its lv_obj_class), compared with getting children that are already wrapped.
+#
+# Needs a large heap on the unix port, e.g. from micropython/tests:
+#   ../ports/unix/build-lvgl/micropython -X heapsize=32M ../../user_modules/lv_binding_micropython/tests/bench/bench_wrap.py
+
+N = 10000
+WIDGETS = [
+    "obj",
+    "label",
+    "button",
+    "slider",
+    "switch",
+    "checkbox",
+    "bar",
+    "arc",
+    "led",
+    "spinner",
+]
+
+lv.init()
+display = lv.display_create(64, 64)
+scr = lv.obj()
+widgets = [getattr(lv, name) for name in WIDGETS if hasattr(lv, name)]
+children = [widgets[i % len(widgets)](scr) for i in range(N)]
+
+
+def clear_wrappers():
+    # The next get_child() creates a new Python object for each child
+    for child in children:
+        child.set_user_data(None)
+
+
+def get_children():
+    start = time.ticks_us()
+    for i in range(N):
+        scr.get_child(i)
+    return time.ticks_diff(time.ticks_us(), start)
+
+
+clear_wrappers()
+wrap_us = get_children()
+cached_us = get_children()
+
+print(
+    "%-24s %10d us (%d ns/child)"
+    % ("wrap %d children" % N, wrap_us, wrap_us * 1000 // N)
+)
+print(
+    "%-24s %10d us (%d ns/child)"
+    % ("get %d wrapped" % N, cached_us, cached_us * 1000 // N)
+)
+print_results(
+    {
+        "children": N,
+        "classes": len(widgets),
+        "wrap_us": wrap_us,
+        "cached_us": cached_us,
+    }
+)